@@ -0,0 +1,226 @@
+import asyncio
+import logging
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, List, Optional
+
+import orjson
+from fastapi import APIRouter, Depends
+from pydantic import BaseModel
+from sqlalchemy import Column, DateTime, Index, Integer, String, Table, insert, select, update
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.auth.base_config import fastapi_users
+from app.config import AUDIT_BATCH_SIZE, AUDIT_FLUSH_INTERVAL, AUDIT_MAX_PENDING
+from app.database import engine, get_async_session, metadata
+from app.pagination import PageParams, paginate, next_after
+from app.responses import Envelope, dumps
+
+logger = logging.getLogger(__name__)
+
+# Таблица "Журнал изменений": кто, когда и что изменил через API управления.
+# actor_id и entity_id без внешних ключей, чтобы записи переживали удаление пользователя и объекта
+audit_log = Table(
+    "audit_log",
+    metadata,
+    Column("id", Integer, primary_key=True),
+    Column("occurred_at", DateTime, nullable=False),  # Время изменения, а не записи в журнал
+    Column("actor_id", Integer),  # None — запрос без авторизации
+    Column("entity", String(50), nullable=False),
+    Column("entity_id", Integer),
+    Column("action", String(50), nullable=False),
+    Column("before", JSONB),  # Для изменения — только изменившиеся поля
+    Column("after", JSONB)
+)
+
+Index("ix_audit_log_entity", audit_log.c.entity, audit_log.c.entity_id, audit_log.c.id)
+Index("ix_audit_log_actor", audit_log.c.actor_id, audit_log.c.id)
+
+# Пользователь текущего запроса; устанавливается зависимостью audit_actor у изменяющих маршрутов
+current_actor = ContextVar("current_actor", default=None)
+
+optional_user = fastapi_users.current_user(optional=True)
+
+
+async def audit_actor(user=Depends(optional_user)):
+    current_actor.set(user.id if user is not None else None)
+
+
+# Колонки прежней версии строки в RETURNING получают этот префикс
+PREVIOUS_PREFIX = "previous_"
+
+
+def update_returning_previous(table, where, values: dict):
+    # UPDATE ... FROM <table> AS previous: RETURNING отдаёт и новую строку, и значения до изменения,
+    # поэтому для журнала не нужен отдельный SELECT перед обновлением
+    previous = table.alias("previous")
+    return (
+        update(table)
+        .where(where, previous.c.id == table.c.id)
+        .values(**values)
+        .returning(*table.c, *(column.label(PREVIOUS_PREFIX + column.name) for column in previous.c))
+    )
+
+
+def split_previous(row):
+    # Строка результата update_returning_previous -> (до изменения, после изменения)
+    if row is None:
+        return None, None
+    row = dict(row)
+    before = {key[len(PREVIOUS_PREFIX):]: row.pop(key) for key in list(row) if key.startswith(PREVIOUS_PREFIX)}
+    return before, row
+
+
+def _diff(before, after):
+    if before is None or after is None:
+        return before, after
+    changed = [key for key in after if key in before and before[key] != after[key]]
+    return {key: before[key] for key in changed}, {key: after[key] for key in changed}
+
+
+class AuditTrail:
+    # Журнал пишется в фоне: обработчик кладёт запись в ограниченную очередь и не ждёт БД,
+    # фоновая задача вставляет записи одним многострочным INSERT, как только набралось
+    # AUDIT_BATCH_SIZE записей или прошло AUDIT_FLUSH_INTERVAL секунд. При переполнении
+    # очереди новые записи отбрасываются и учитываются в dropped
+    def __init__(self):
+        self._queue = None
+        self._task = None
+        self._batch = []
+        self._writing = None
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+
+    @property
+    def pending(self) -> int:
+        return (self._queue.qsize() if self._queue is not None else 0) + len(self._batch)
+
+    def record(self, entity: str, entity_id, action: str, before=None, after=None):
+        if self._queue is None:
+            return
+        before, after = _diff(dict(before) if before is not None else None,
+                              dict(after) if after is not None else None)
+        if before == after == {}:
+            return
+        entry = {
+            "occurred_at": datetime.utcnow(),
+            "actor_id": current_actor.get(),
+            "entity": entity,
+            "entity_id": entity_id,
+            "action": action,
+            "before": before,
+            "after": after,
+        }
+        try:
+            self._queue.put_nowait(entry)
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    async def _write(self, batch):
+        try:
+            # JSONB-значения проходят через orjson, чтобы даты и Decimal сериализовались как в ответах API
+            rows = [{**entry, "before": orjson.loads(dumps(entry["before"])),
+                     "after": orjson.loads(dumps(entry["after"]))} for entry in batch]
+            async with engine.begin() as conn:
+                await conn.execute(insert(audit_log).values(rows))
+            self.written += len(batch)
+        except Exception:
+            self.failed += len(batch)
+            logger.exception("Audit log flush of %d entries failed", len(batch))
+
+    async def _flush(self):
+        batch, self._batch = self._batch, []
+        if batch:
+            # Запись не прерывается остановкой приложения: stop() дожидается её завершения
+            self._writing = asyncio.ensure_future(self._write(batch))
+            await asyncio.shield(self._writing)
+            self._writing = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            self._batch.append(await self._queue.get())
+            deadline = loop.time() + AUDIT_FLUSH_INTERVAL
+            while len(self._batch) < AUDIT_BATCH_SIZE:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    self._batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            try:
+                await self._flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # Ошибка одной пачки не должна останавливать запись журнала до конца жизни процесса
+                logger.exception("Audit log batch failed")
+
+    async def _install(self):
+        # Таблица создаётся при старте, в том числе в уже существующей базе; при нескольких
+        # процессах одновременное создание может завершиться ошибкой у всех, кроме одного
+        try:
+            async with engine.begin() as conn:
+                await conn.run_sync(audit_log.create, checkfirst=True)
+        except Exception as e:
+            logger.warning("Audit log table check failed: %s", e)
+
+    async def start(self):
+        await self._install()
+        self._queue = asyncio.Queue(maxsize=AUDIT_MAX_PENDING)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        # Остаток очереди записывается до завершения процесса
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._writing is not None:
+            await asyncio.gather(self._writing, return_exceptions=True)
+            self._writing = None
+        queue, self._queue = self._queue, None
+        while queue is not None and not queue.empty():
+            self._batch.append(queue.get_nowait())
+            if len(self._batch) >= AUDIT_BATCH_SIZE:
+                await self._flush()
+        await self._flush()
+
+
+audit_trail = AuditTrail()
+
+router = APIRouter(
+    prefix="/management/audit",
+    tags=["Audit"]
+)
+
+
+class AuditEntry(BaseModel):
+    id: int
+    occurred_at: datetime
+    actor_id: Optional[int] = None
+    entity: str
+    entity_id: Optional[int] = None
+    action: str
+    before: Optional[Any] = None
+    after: Optional[Any] = None
+
+
+# Журнал изменений с фильтрами по объекту и пользователю, новые записи в конце
+@router.get("/", response_model=Envelope[List[AuditEntry]])
+async def get_audit_log(entity: Optional[str] = None, entity_id: Optional[int] = None,
+                        actor_id: Optional[int] = None, page: PageParams = Depends(),
+                        session: AsyncSession = Depends(get_async_session)):
+    query = select(audit_log)
+    if entity is not None:
+        query = query.where(audit_log.c.entity == entity)
+    if entity_id is not None:
+        query = query.where(audit_log.c.entity_id == entity_id)
+    if actor_id is not None:
+        query = query.where(audit_log.c.actor_id == actor_id)
+    result = await session.execute(paginate(query, audit_log.c.id, page))
+    entries = result.mappings().all()
+    return {"status": "success", "data": entries, "next_after": next_after(entries, page)}
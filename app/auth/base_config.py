@@ -1,9 +1,13 @@
-from fastapi_users import FastAPIUsers
+import jwt
+from fastapi_users import FastAPIUsers, exceptions
 from fastapi_users.authentication import CookieTransport, AuthenticationBackend
 from fastapi_users.authentication import JWTStrategy
+from fastapi_users.jwt import decode_jwt
+from sqlalchemy.orm import make_transient_to_detached
 
 from app.auth.manager import get_user_manager
 from app.auth.models import User
+from app.cache import user_cache
 from app.config import SECRET_AUTH
 
 cookie_transport = CookieTransport(
@@ -15,8 +19,40 @@ cookie_transport = CookieTransport(
 )
 
 
+class CachedJWTStrategy(JWTStrategy):
+    # Токен по-прежнему проверяется на каждом запросе, но пользователь берётся из кэша,
+    # и запрос к таблице user выполняется только при промахе
+    async def read_token(self, token, user_manager):
+        if token is None:
+            return None
+
+        try:
+            data = decode_jwt(token, self.decode_key, self.token_audience, algorithms=[self.algorithm])
+            user_id = data.get("sub")
+            if user_id is None:
+                return None
+            parsed_id = user_manager.parse_id(user_id)
+        except (jwt.PyJWTError, exceptions.InvalidID):
+            return None
+
+        async def load():
+            user = await user_manager.get(parsed_id)
+            return {column.key: getattr(user, column.key) for column in User.__table__.columns}
+
+        try:
+            values = await user_cache.get_or_load(parsed_id, load)
+        except exceptions.UserNotExists:
+            return None
+
+        # Каждый запрос получает свой экземпляр; detached-состояние позволяет
+        # обновлять его через сессию как уже существующую запись
+        user = User(**values)
+        make_transient_to_detached(user)
+        return user
+
+
 def get_jwt_strategy() -> JWTStrategy:
-    return JWTStrategy(secret=SECRET_AUTH, lifetime_seconds=3600)
+    return CachedJWTStrategy(secret=SECRET_AUTH, lifetime_seconds=3600)
 
 
 auth_backend = AuthenticationBackend(
@@ -1,14 +1,21 @@
-from typing import Optional
+from typing import Any, Dict, Optional
 
 from fastapi import Depends, Request, Response
 from fastapi_users import BaseUserManager, IntegerIDMixin, exceptions, models, schemas
 
 from app.auth.models import User
 from app.auth.utils import get_user_db
+from app.cache import user_cache
+from app.events import event_bus
 
 from app.config import SECRET_AUTH
 
 
+def forget_user(user_id: int):
+    user_cache.discard(user_id)
+    event_bus.publish("users", key=user_id, namespaces=("users",), action="changed")
+
+
 class UserManager(IntegerIDMixin, BaseUserManager[User, int]):
     reset_password_token_secret = SECRET_AUTH
     verification_token_secret = SECRET_AUTH
@@ -16,6 +23,20 @@ class UserManager(IntegerIDMixin, BaseUserManager[User, int]):
     async def on_after_register(self, user: User, request: Optional[Request] = None):
         print(f"User {user.id} has registered.")
 
+    # Любое изменение пользователя (в том числе деактивация) сбрасывает его запись в кэше
+    # этого процесса и, через событие, в остальных
+    async def on_after_update(self, user: User, update_dict: Dict[str, Any], request: Optional[Request] = None):
+        forget_user(user.id)
+
+    async def on_after_verify(self, user: User, request: Optional[Request] = None):
+        forget_user(user.id)
+
+    async def on_after_reset_password(self, user: User, request: Optional[Request] = None):
+        forget_user(user.id)
+
+    async def on_after_delete(self, user: User, request: Optional[Request] = None):
+        forget_user(user.id)
+
     async def create(
         self,
         user_create: schemas.UC,
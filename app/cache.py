@@ -0,0 +1,70 @@
+import time
+from collections import OrderedDict
+
+from app.config import HIERARCHY_CACHE_SIZE, HIERARCHY_CACHE_TTL, USER_CACHE_SIZE, USER_CACHE_TTL
+
+
+class VersionedCache:
+    # LRU-кэш в памяти процесса с версиями по пространствам имён.
+    # Запись действительна, пока не изменилась версия ни одной таблицы, от которой она зависит,
+    # и не истёк TTL (TTL страхует от изменений, сделанных другими процессами)
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._versions = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def version(self, namespace: str) -> int:
+        return self._versions.get(namespace, 0)
+
+    def bump(self, *namespaces: str):
+        for namespace in namespaces:
+            self._versions[namespace] = self.version(namespace) + 1
+
+    async def get_or_load(self, key, loader, depends=()):
+        # Версии запоминаются до загрузки: если данные изменятся во время запроса к БД,
+        # сохранённая запись сразу окажется устаревшей
+        versions = tuple(self.version(namespace) for namespace in depends)
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] == versions and entry[1] > time.monotonic():
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+        self.misses += 1
+        value = await loader()
+        self._entries[key] = (versions, time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+        return value
+
+    def discard(self, key):
+        self._entries.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self):
+        requests = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / requests if requests else 0.0,
+            "evictions": self.evictions,
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "versions": dict(self._versions),
+        }
+
+
+# Этажи, блоки, комнаты и типы общедоступных помещений
+hierarchy_cache = VersionedCache(maxsize=HIERARCHY_CACHE_SIZE, ttl=HIERARCHY_CACHE_TTL)
+
+# Пользователи по id из проверенного JWT; сбрасываются хуками UserManager
+user_cache = VersionedCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
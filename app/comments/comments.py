@@ -1,9 +1,17 @@
+from typing import List
+
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, delete, update, insert
+from app.audit import audit_actor, audit_trail
+from app.cache import hierarchy_cache
 from app.database import get_async_session
+from app.events import event_bus
+from app.etag import etag
+from app.pagination import PageParams, paginate, next_after, stream_ndjson
+from app.responses import Envelope, Message
 from app.comments.models import comments
-from app.comments.schemas import CommentCreate, CommentUpdate
+from app.comments.schemas import CommentCreate, CommentRead, CommentUpdate
 from app.auth.models import user
 from app.auth.base_config import current_user
 
@@ -13,7 +21,7 @@ router = APIRouter(
 )
 
 
-@router.get("/room/{room_id}")
+@router.get("/room/{room_id}", response_model=Envelope[List[CommentRead]], dependencies=[Depends(etag("comments"))])
 async def get_comments_for_room(room_id: int, session: AsyncSession = Depends(get_async_session)):
     result = await session.execute(
         select(comments).where(comments.c.room_id == room_id).order_by(comments.c.id)
@@ -22,14 +30,17 @@ async def get_comments_for_room(room_id: int, session: AsyncSession = Depends(ge
     return {"status": "success", "data": comments_data}
 
 # Получение всех комментариев
-@router.get("/")
-async def get_all_comments(session: AsyncSession = Depends(get_async_session)):
-    result = await session.execute(select(comments).order_by(comments.c.id))
+@router.get("/", response_model=Envelope[List[CommentRead]], dependencies=[Depends(etag("comments"))])
+async def get_all_comments(page: PageParams = Depends(), session: AsyncSession = Depends(get_async_session)):
+    query = paginate(select(comments), comments.c.id, page)
+    if page.stream:
+        return stream_ndjson(query)
+    result = await session.execute(query)
     comments_data = result.mappings().all()
-    return {"status": "success", "data": comments_data}
+    return {"status": "success", "data": comments_data, "next_after": next_after(comments_data, page)}
 
 # Получение комментария по ID
-@router.get("/{comment_id}")
+@router.get("/{comment_id}", response_model=Envelope[CommentRead], dependencies=[Depends(etag("comments"))])
 async def get_comment_by_id(comment_id: int, session: AsyncSession = Depends(get_async_session)):
     result = await session.execute(select(comments).where(comments.c.id == comment_id))
     comment_data = result.mappings().first()
@@ -38,21 +49,24 @@ async def get_comment_by_id(comment_id: int, session: AsyncSession = Depends(get
     return {"status": "success", "data": comment_data}
 
 
-@router.post("/")
+@router.post("/", response_model=Envelope[CommentRead], dependencies=[Depends(audit_actor)])
 async def create_comment(comment_data: CommentCreate, session: AsyncSession = Depends(get_async_session), user: user = Depends(current_user)):
     comment_data.user_id = user.id  # Автоматическая установка user_id текущего пользователя
     stmt = insert(comments).values(**comment_data.dict()).returning(*comments.c)
     result = await session.execute(stmt)
     await session.commit()
+    hierarchy_cache.bump("comments")
+    event_bus.publish("comments", namespaces=("comments",), action="created")
     created_comment = result.fetchone()  # Получаем данные созданного комментария
     if created_comment:
+        audit_trail.record("comment", created_comment.id, "created", after=created_comment._asdict())
         # Преобразуем результат в словарь, если результат не None
         return {"status": "success", "message": "Comment created successfully", "data": created_comment._asdict()}
     else:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to create comment")
 
 
-@router.patch("/{comment_id}")
+@router.patch("/{comment_id}", response_model=Envelope[CommentRead], dependencies=[Depends(audit_actor)])
 async def update_comment(comment_id: int, comment_data: CommentUpdate, session: AsyncSession = Depends(get_async_session), user: user = Depends(current_user)):
     # Получаем комментарий из базы данных
     result = await session.execute(select(comments).where(comments.c.id == comment_id))
@@ -71,11 +85,15 @@ async def update_comment(comment_id: int, comment_data: CommentUpdate, session:
     updated_comments = result.mappings().first()
     if not updated_comments:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Resident not found")
+    hierarchy_cache.bump("comments")
+    event_bus.publish("comments", key=comment_id, namespaces=("comments",), action="updated")
+    # Прежняя версия уже прочитана для проверки автора
+    audit_trail.record("comment", comment_id, "updated", before=comment_datas, after=updated_comments)
     return {"status": "success", "message": "Resident updated successfully", "data": updated_comments}
 
 
 # Удаление комментария
-@router.delete("/{comment_id}")
+@router.delete("/{comment_id}", response_model=Message, dependencies=[Depends(audit_actor)])
 async def delete_comment(comment_id: int, session: AsyncSession = Depends(get_async_session), user: user = Depends(current_user)):
     # Получаем комментарий из базы данных
     results = await session.execute(select(comments).where(comments.c.id == comment_id))
@@ -93,4 +111,7 @@ async def delete_comment(comment_id: int, session: AsyncSession = Depends(get_as
     if result.rowcount == 0:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Comment not found")
     await session.commit()
+    hierarchy_cache.bump("comments")
+    event_bus.publish("comments", key=comment_id, namespaces=("comments",), action="deleted")
+    audit_trail.record("comment", comment_id, "deleted", before=comment_datas)
     return {"status": "success", "message": "Comment deleted successfully"}
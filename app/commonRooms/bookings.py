@@ -1,10 +1,22 @@
-from fastapi import APIRouter, Depends, HTTPException
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
+from app.audit import audit_actor, audit_trail, split_previous, update_returning_previous
+from app.cache import hierarchy_cache
+from app.config import BOOKING_REPORT_MAX_DAYS
 from app.database import get_async_session
-from app.commonRooms.models import room_bookings
-from app.commonRooms.schemas import BookingCreate, BookingUpdate
+from app.events import event_bus
+from app.pagination import PageParams, paginate, next_after, stream_ndjson
+from app.responses import Envelope, Message, list_response
+from app.commonRooms.calendar import booking_calendar, booking_utilization
+from app.commonRooms.models import room_bookings, BOOKING_OVERLAP_CONSTRAINT
+from app.commonRooms.schemas import BookingCreate, BookingRead, BookingUpdate, CalendarBooking, UtilizationBucket
 from sqlalchemy.future import select
-from sqlalchemy import update, insert, delete
+from sqlalchemy import and_, insert, delete
 
 
 router = APIRouter(
@@ -13,43 +25,109 @@ router = APIRouter(
 )
 
 
-@router.get("/room/{room_id}")
+def _is_overlap(error: IntegrityError) -> bool:
+    return BOOKING_OVERLAP_CONSTRAINT in str(error.orig)
+
+
+async def _raise_booking_conflict(session: AsyncSession, room_id: int, start_time, end_time, booking_id: int = None):
+    # Пересечение уже отклонено ограничением в БД, здесь только ищем, с чем именно оно произошло
+    stmt = select(room_bookings).where(
+        room_bookings.c.room_id == room_id,
+        room_bookings.c.is_active.is_(True),
+        room_bookings.c.start_time < end_time,
+        room_bookings.c.end_time > start_time,
+    )
+    if booking_id is not None:
+        stmt = stmt.where(room_bookings.c.id != booking_id)
+    result = await session.execute(stmt.order_by(room_bookings.c.start_time).limit(1))
+    conflict = result.mappings().first()
+    raise HTTPException(status_code=409, detail=jsonable_encoder({
+        "message": "Room is already booked for this time",
+        "conflict": conflict,
+    }))
+
+
+@router.get("/room/{room_id}", response_model=Envelope[List[BookingRead]])
 async def get_bookings_by_room(room_id: int, session: AsyncSession = Depends(get_async_session)):
     try:
         stmt = select(room_bookings).where(room_bookings.c.room_id == room_id)
         result = await session.execute(stmt)
-        bookings_list = result.fetchall()
-        bookings = [booking._asdict() for booking in bookings_list]
+        bookings = result.mappings().all()
         return {"status": "success", "data": bookings}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.get("/")
-async def get_all_bookings(session: AsyncSession = Depends(get_async_session)):
+@router.get("/", response_model=Envelope[List[BookingRead]])
+async def get_all_bookings(page: PageParams = Depends(), session: AsyncSession = Depends(get_async_session)):
+    stmt = paginate(select(room_bookings), room_bookings.c.id, page)
+    if page.stream:
+        return stream_ndjson(stmt)
     try:
-        stmt = select(room_bookings)
         result = await session.execute(stmt)
-        bookings_list = result.fetchall()
-        bookings = [booking._asdict() for booking in bookings_list]
-        return {"status": "success", "data": bookings}
+        bookings = result.mappings().all()
+        return list_response(bookings, next_after=next_after(bookings, page))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.post("/", status_code=201)
+def _report_window(start: datetime, end: datetime):
+    # Время хранится без временной зоны, как при создании бронирования
+    start, end = start.replace(tzinfo=None), end.replace(tzinfo=None)
+    if end <= start:
+        raise HTTPException(status_code=400, detail="End time must be after start time")
+    if end - start > timedelta(days=BOOKING_REPORT_MAX_DAYS):
+        raise HTTPException(status_code=400, detail=f"Period must not exceed {BOOKING_REPORT_MAX_DAYS} days")
+    return start, end
+
+
+# Бронирования, пересекающие период, с фильтром по типу помещения и этажу
+@router.get("/calendar", response_model=Envelope[List[CalendarBooking]])
+async def get_booking_calendar(start: datetime, end: datetime, type_id: Optional[int] = None,
+                               floor_id: Optional[int] = None, include_inactive: bool = False,
+                               session: AsyncSession = Depends(get_async_session)):
+    start, end = _report_window(start, end)
+    bookings = await booking_calendar(session, start, end, type_id, floor_id, include_inactive)
+    return {"status": "success", "data": bookings, "details": {"start": start, "end": end}}
+
+
+# Загрузка помещений: минуты бронирования по комнатам за каждый час или день периода
+@router.get("/utilization", response_model=Envelope[List[UtilizationBucket]])
+async def get_booking_utilization(start: datetime, end: datetime, bucket: str = Query("day", regex="^(hour|day)$"),
+                                  type_id: Optional[int] = None, floor_id: Optional[int] = None,
+                                  session: AsyncSession = Depends(get_async_session)):
+    start, end = _report_window(start, end)
+    buckets = await booking_utilization(session, start, end, bucket, type_id, floor_id)
+    return {"status": "success", "data": buckets, "details": {"start": start, "end": end, "bucket": bucket}}
+
+
+@router.post("/", status_code=201, response_model=Envelope[BookingRead], dependencies=[Depends(audit_actor)])
 async def create_booking(booking_data: BookingCreate, session: AsyncSession = Depends(get_async_session)):
     # Преобразование времени к формату без временной зоны
     booking_data.start_time = booking_data.start_time.replace(tzinfo=None)
     booking_data.end_time = booking_data.end_time.replace(tzinfo=None)
+    if booking_data.end_time <= booking_data.start_time:
+        raise HTTPException(status_code=400, detail="End time must be after start time")
 
-    stmt = insert(room_bookings).values(**booking_data.dict())
-    result = await session.execute(stmt)
-    await session.commit()
-    return {"status": "success", "message": "Booking created successfully"}
-
-
-@router.patch("/{booking_id}")
+    # Проверка пересечений выполняется ограничением room_bookings_no_overlap в том же запросе
+    stmt = insert(room_bookings).values(**booking_data.dict()).returning(room_bookings)
+    try:
+        result = await session.execute(stmt)
+        new_booking = result.mappings().first()
+        await session.commit()
+    except IntegrityError as e:
+        await session.rollback()
+        if not _is_overlap(e):
+            raise
+        await _raise_booking_conflict(session, booking_data.room_id, booking_data.start_time, booking_data.end_time)
+    hierarchy_cache.bump("bookings")
+    event_bus.publish("bookings", key=new_booking["room_id"], namespaces=("bookings",), action="created",
+                      id=new_booking["id"])
+    audit_trail.record("booking", new_booking["id"], "created", after=new_booking)
+    return {"status": "success", "message": "Booking created successfully", "data": new_booking}
+
+
+@router.patch("/{booking_id}", response_model=Message, dependencies=[Depends(audit_actor)])
 async def update_booking(booking_id: int, booking_data: BookingUpdate,
                          session: AsyncSession = Depends(get_async_session)):
     # Если дата обновления предоставлена, убираем информацию о временной зоне
@@ -57,35 +135,73 @@ async def update_booking(booking_id: int, booking_data: BookingUpdate,
         booking_data.start_time = booking_data.start_time.replace(tzinfo=None)
     if booking_data.end_time:
         booking_data.end_time = booking_data.end_time.replace(tzinfo=None)
-
-    update_stmt = update(room_bookings).where(room_bookings.c.id == booking_id).values(
-        **booking_data.dict(exclude_unset=True))
-    result = await session.execute(update_stmt)
-    if result.rowcount == 0:
-        raise HTTPException(status_code=404, detail="Booking not found")
-    await session.commit()
+    if booking_data.start_time and booking_data.end_time and booking_data.end_time <= booking_data.start_time:
+        raise HTTPException(status_code=400, detail="End time must be after start time")
+
+    # Если меняется только одна граница, она сравнивается с сохранённой другой в том же UPDATE:
+    # иначе tsrange в ограничении room_bookings_no_overlap завершил бы запрос ошибкой DataError
+    condition = room_bookings.c.id == booking_id
+    if booking_data.start_time and not booking_data.end_time:
+        condition = and_(condition, room_bookings.c.end_time > booking_data.start_time)
+    if booking_data.end_time and not booking_data.start_time:
+        condition = and_(condition, room_bookings.c.start_time < booking_data.end_time)
+
+    values = booking_data.dict(exclude_unset=True)
+    if "is_active" in values:
+        # Активность задана вручную: бронирование больше не считается завершившимся само
+        values["expired_at"] = None
+    update_stmt = update_returning_previous(room_bookings, condition, values)
+    try:
+        result = await session.execute(update_stmt)
+        previous_booking, updated_booking = split_previous(result.mappings().first())
+        if updated_booking is None:
+            exists = await session.scalar(select(room_bookings.c.id).where(room_bookings.c.id == booking_id))
+            if exists is not None:
+                raise HTTPException(status_code=400, detail="End time must be after start time")
+            raise HTTPException(status_code=404, detail="Booking not found")
+        room_id = updated_booking["room_id"]
+        await session.commit()
+    except IntegrityError as e:
+        await session.rollback()
+        if not _is_overlap(e):
+            raise
+        current = (await session.execute(
+            select(room_bookings).where(room_bookings.c.id == booking_id)
+        )).mappings().first()
+        await _raise_booking_conflict(
+            session,
+            current["room_id"],
+            booking_data.start_time or current["start_time"],
+            booking_data.end_time or current["end_time"],
+            booking_id=booking_id,
+        )
+    hierarchy_cache.bump("bookings")
+    event_bus.publish("bookings", key=room_id, namespaces=("bookings",), action="updated", id=booking_id)
+    audit_trail.record("booking", booking_id, "updated", before=previous_booking, after=updated_booking)
     return {"status": "success", "message": "Booking updated successfully"}
 
 
-@router.get("/{booking_id}")
+@router.get("/{booking_id}", response_model=Envelope[BookingRead])
 async def get_booking(booking_id: int, session: AsyncSession = Depends(get_async_session)):
     stmt = select(room_bookings).where(room_bookings.c.id == booking_id)
     result = await session.execute(stmt)
-    booking_info = result.fetchone()  # Получаем одну запись
+    booking_info = result.mappings().first()  # Получаем одну запись
     if not booking_info:
         raise HTTPException(status_code=404, detail="Booking not found")
 
-    # Преобразуем RowProxy в словарь, если запись существует
-    booking_info_dict = booking_info._asdict() if booking_info else None
-
-    return {"status": "success", "data": booking_info_dict}
+    return {"status": "success", "data": booking_info}
 
 
-@router.delete("/{booking_id}")
+@router.delete("/{booking_id}", response_model=Message, dependencies=[Depends(audit_actor)])
 async def delete_booking(booking_id: int, session: AsyncSession = Depends(get_async_session)):
-    delete_stmt = delete(room_bookings).where(room_bookings.c.id == booking_id)
+    delete_stmt = delete(room_bookings).where(room_bookings.c.id == booking_id).returning(room_bookings)
     result = await session.execute(delete_stmt)
+    deleted_booking = result.mappings().first()
     await session.commit()
-    if result.rowcount == 0:
+    if deleted_booking is None:
         raise HTTPException(status_code=404, detail="Booking not found")
+    hierarchy_cache.bump("bookings")
+    event_bus.publish("bookings", key=deleted_booking["room_id"], namespaces=("bookings",), action="deleted",
+                      id=booking_id)
+    audit_trail.record("booking", booking_id, "deleted", before=deleted_booking)
     return {"status": "success", "message": "Booking deleted successfully"}
\ No newline at end of file
@@ -0,0 +1,95 @@
+from datetime import datetime
+
+from sqlalchemy import DateTime, Numeric, and_, cast, extract, func, literal_column, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.commonRooms.models import public_rooms, room_bookings, room_types
+
+# Длина интервала отчёта; значение подставляется в SQL только из этого словаря
+BUCKETS = {"hour": "interval '1 hour'", "day": "interval '1 day'"}
+BUCKET_MINUTES = {"hour": 60, "day": 24 * 60}
+
+
+def _in_window(start: datetime, end: datetime, type_id=None, floor_id=None, include_inactive: bool = False):
+    # Бронирования, пересекающие [start, end): верхняя граница start_time ограничивает скан
+    # по индексу (room_id, start_time), end_time отсекает закончившиеся до начала окна
+    conditions = [room_bookings.c.start_time < end, room_bookings.c.end_time > start]
+    if not include_inactive:
+        # Завершившиеся бронирования фоновая задача выключает, но в отчётах они остаются;
+        # исключаются только отменённые
+        conditions.append(or_(room_bookings.c.is_active.is_(True), room_bookings.c.expired_at.isnot(None)))
+    if type_id is not None:
+        conditions.append(public_rooms.c.type_id == type_id)
+    if floor_id is not None:
+        conditions.append(public_rooms.c.floor_id == floor_id)
+    return and_(*conditions)
+
+
+async def booking_calendar(session: AsyncSession, start: datetime, end: datetime, type_id=None, floor_id=None,
+                           include_inactive: bool = False):
+    stmt = (
+        select(
+            room_bookings,
+            public_rooms.c.room_name,
+            public_rooms.c.type_id,
+            room_types.c.type_name,
+            public_rooms.c.floor_id,
+        )
+        .select_from(
+            room_bookings
+            .join(public_rooms, public_rooms.c.id == room_bookings.c.room_id)
+            .outerjoin(room_types, room_types.c.id == public_rooms.c.type_id)
+        )
+        .where(_in_window(start, end, type_id, floor_id, include_inactive))
+        .order_by(room_bookings.c.start_time, room_bookings.c.room_id, room_bookings.c.id)
+    )
+    result = await session.execute(stmt)
+    return result.mappings().all()
+
+
+async def booking_utilization(session: AsyncSession, start: datetime, end: datetime, bucket: str,
+                              type_id=None, floor_id=None):
+    # Минуты бронирования по комнатам и интервалам считаются в SQL: каждое бронирование
+    # соединяется с интервалами, которые пересекает, и обрезается по их границам и границам окна.
+    # Возвращаются только интервалы, где комната была занята
+    step = literal_column(BUCKETS[bucket])
+    window_start, window_end = cast(start, DateTime), cast(end, DateTime)
+    # render_derived() даёт псевдониму список колонок: generate_series(...) AS anon_1(bucket_start),
+    # иначе единственная колонка функции называется по псевдониму и anon_1.bucket_start не существует
+    buckets = (
+        func.generate_series(func.date_trunc(bucket, window_start), window_end, step)
+        .table_valued("bucket_start")
+        .render_derived()
+    )
+    bucket_end = buckets.c.bucket_start + step
+
+    overlap_start = func.greatest(room_bookings.c.start_time, buckets.c.bucket_start, window_start)
+    overlap_end = func.least(room_bookings.c.end_time, bucket_end, window_end)
+    booked_minutes = func.sum(cast(extract("epoch", overlap_end - overlap_start), Numeric) / 60)
+
+    stmt = (
+        select(
+            room_bookings.c.room_id,
+            public_rooms.c.room_name,
+            buckets.c.bucket_start,
+            func.round(booked_minutes, 1).label("booked_minutes"),
+        )
+        .select_from(
+            room_bookings
+            .join(public_rooms, public_rooms.c.id == room_bookings.c.room_id)
+            .join(buckets, and_(room_bookings.c.start_time < bucket_end,
+                                room_bookings.c.end_time > buckets.c.bucket_start,
+                                buckets.c.bucket_start < window_end))
+        )
+        .where(_in_window(start, end, type_id, floor_id))
+        .group_by(room_bookings.c.room_id, public_rooms.c.room_name, buckets.c.bucket_start)
+        .order_by(room_bookings.c.room_id, buckets.c.bucket_start)
+    )
+    result = await session.execute(stmt)
+
+    minutes = BUCKET_MINUTES[bucket]
+    return [
+        {**row, "booked_minutes": float(row["booked_minutes"]),
+         "utilization": round(float(row["booked_minutes"]) / minutes * 100, 2)}
+        for row in result.mappings()
+    ]
@@ -1,28 +1,40 @@
+from typing import List
+
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.exc import NoResultFound
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy import delete, update, insert
+from sqlalchemy import delete, insert
+from app.audit import audit_actor, audit_trail, split_previous, update_returning_previous
+from app.cache import hierarchy_cache
 from app.database import get_async_session
+from app.events import event_bus
+from app.etag import etag
+from app.responses import Envelope, Message
 from app.commonRooms.models import public_rooms, room_types
 from app.room.models import blocks, floors
-from app.commonRooms.schemas import PublicRoomCreate, PublicRoomUpdate
+from app.commonRooms.schemas import (PublicRoomCreate, PublicRoomDetails, PublicRoomRead, PublicRoomUpdate,
+                                     RoomTypeRead)
 
 router = APIRouter(
     prefix="/management/public-rooms",
     tags=["Management Public Rooms"]
 )
 
-@router.get("/room_types/")
+@router.get("/room_types/", response_model=List[RoomTypeRead], dependencies=[Depends(etag("room_types"))])
 async def get_all_room_types(session: AsyncSession = Depends(get_async_session)):
-    stmt = select(room_types)  # Создаем SQL запрос для выбора всех записей
-    result = await session.execute(stmt)  # Выполняем запрос
-    room_types_list = result.mappings().all()  # Получаем все результаты
+    async def load():
+        stmt = select(room_types)  # Создаем SQL запрос для выбора всех записей
+        result = await session.execute(stmt)  # Выполняем запрос
+        return [dict(row) for row in result.mappings().all()]  # Получаем все результаты
+
+    room_types_list = await hierarchy_cache.get_or_load(("room_types",), load, depends=("room_types",))
     return room_types_list  # Возвращаем список типов комнат
 
 
 # Получение всех общедоступных комнат
-@router.get("/")
+@router.get("/", response_model=Envelope[List[PublicRoomRead]],
+            dependencies=[Depends(etag("public_rooms", "room_types", "blocks", "floors"))])
 async def get_all_public_rooms(session: AsyncSession = Depends(get_async_session)):
     stmt = select(
         public_rooms.c.id,
@@ -38,13 +50,20 @@ async def get_all_public_rooms(session: AsyncSession = Depends(get_async_session
         .outerjoin(blocks, blocks.c.id == public_rooms.c.block_id)
         .outerjoin(floors, floors.c.id == public_rooms.c.floor_id)  # Изменено для непосредственной связи с floors
     ).order_by(public_rooms.c.room_name)
-    result = await session.execute(stmt)
-    rooms_data = result.mappings().all()
-    return {"status": "success", "data": [dict(room) for room in rooms_data]}
+
+    async def load():
+        result = await session.execute(stmt)
+        return [dict(room) for room in result.mappings().all()]
+
+    rooms_data = await hierarchy_cache.get_or_load(
+        ("public_rooms",), load, depends=("public_rooms", "room_types", "blocks", "floors")
+    )
+    return {"status": "success", "data": rooms_data}
 
 
 # Получение общедоступной комнаты по ID
-@router.get("/{room_id}")
+@router.get("/{room_id}", response_model=Envelope[PublicRoomDetails],
+            dependencies=[Depends(etag("public_rooms", "room_types", "blocks", "floors"))])
 async def get_public_room_by_id(room_id: int, session: AsyncSession = Depends(get_async_session)):
     stmt = select(
         public_rooms,
@@ -61,10 +80,10 @@ async def get_public_room_by_id(room_id: int, session: AsyncSession = Depends(ge
     room_data = result.mappings().first()
     if not room_data:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Public room not found")
-    return {"status": "success", "data": dict(room_data)}
+    return {"status": "success", "data": room_data}
 
 
-@router.post("/")
+@router.post("/", response_model=Envelope[PublicRoomDetails], dependencies=[Depends(audit_actor)])
 async def create_public_room(room_data: PublicRoomCreate, session: AsyncSession = Depends(get_async_session)):
     # Inserting new room and returning its data
     stmt = insert(public_rooms).values(**room_data.dict()).returning(public_rooms)
@@ -87,21 +106,27 @@ async def create_public_room(room_data: PublicRoomCreate, session: AsyncSession
     new_room_data['floor_number'] = floor_number
 
     await session.commit()
+    hierarchy_cache.bump("public_rooms")
+    event_bus.publish("public_rooms", key=new_room["id"], namespaces=("public_rooms",), action="created")
+    audit_trail.record("public_room", new_room["id"], "created", after=new_room)
     return {"status": "success", "message": "Public room created successfully", "data": new_room_data}
 
 # Обновление данных общедоступной комнаты
-@router.patch("/{room_id}")
+@router.patch("/{room_id}", response_model=Envelope[PublicRoomRead], dependencies=[Depends(audit_actor)])
 async def update_public_room(room_id: int, room_data: PublicRoomUpdate,
                              session: AsyncSession = Depends(get_async_session)):
     # Обновление информации о комнате
-    update_stmt = update(public_rooms).where(public_rooms.c.id == room_id).values(
-        **room_data.dict(exclude_unset=True)).returning(*public_rooms.c)
+    update_stmt = update_returning_previous(public_rooms, public_rooms.c.id == room_id,
+                                           room_data.dict(exclude_unset=True))
     result = await session.execute(update_stmt)
     await session.commit()
-    updated_room = result.fetchone()
+    previous_room, updated_room = split_previous(result.mappings().first())
 
     if not updated_room:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Комната не найдена")
+    hierarchy_cache.bump("public_rooms")
+    event_bus.publish("public_rooms", key=room_id, namespaces=("public_rooms",), action="updated")
+    audit_trail.record("public_room", room_id, "updated", before=previous_room, after=updated_room)
 
     # Получаем полную информацию о комнате, включая тип, этаж и блок
     try:
@@ -132,11 +157,15 @@ async def update_public_room(room_id: int, room_data: PublicRoomUpdate,
 
 
 # Удаление общедоступной комнаты
-@router.delete("/{room_id}")
+@router.delete("/{room_id}", response_model=Message, dependencies=[Depends(audit_actor)])
 async def delete_public_room(room_id: int, session: AsyncSession = Depends(get_async_session)):
-    delete_stmt = delete(public_rooms).where(public_rooms.c.id == room_id)
+    delete_stmt = delete(public_rooms).where(public_rooms.c.id == room_id).returning(public_rooms)
     result = await session.execute(delete_stmt)
-    if result.rowcount == 0:
+    deleted_room = result.mappings().first()
+    if deleted_room is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Public room not found")
     await session.commit()
+    hierarchy_cache.bump("public_rooms")
+    event_bus.publish("public_rooms", key=room_id, namespaces=("public_rooms",), action="deleted")
+    audit_trail.record("public_room", room_id, "deleted", before=deleted_room)
     return {"status": "success", "message": "Public room deleted successfully"}
@@ -0,0 +1,44 @@
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from app.cache import hierarchy_cache
+from app.commonRooms.models import room_bookings
+from app.config import BOOKING_EXPIRY_BATCH_SIZE, BOOKING_EXPIRY_INTERVAL
+from app.events import event_bus
+from app.scheduler import PeriodicJob
+
+# Ключ advisory-блокировки задачи: один процесс снимает активность с бронирований за раз
+BOOKING_EXPIRY_LOCK = 720_001
+
+
+async def expire_bookings(conn: AsyncConnection, batch_size: int = BOOKING_EXPIRY_BATCH_SIZE):
+    # Одна порция завершившихся бронирований; PeriodicJob вызывает её в отдельных коротких транзакциях,
+    # пока порция не окажется неполной. SKIP LOCKED пропускает строки, которые сейчас изменяет
+    # обработчик запроса, — они попадут в следующий запуск
+    expired = (
+        select(room_bookings.c.id)
+        .where(room_bookings.c.is_active.is_(True), room_bookings.c.end_time < func.localtimestamp())
+        .order_by(room_bookings.c.end_time)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery()
+    )
+    result = await conn.execute(
+        update(room_bookings)
+        .where(room_bookings.c.id.in_(expired))
+        .values(is_active=False, expired_at=func.localtimestamp())
+        .returning(room_bookings.c.room_id)
+    )
+    return result.scalars().all()
+
+
+def publish_expired(room_ids):
+    # Версия "bookings" увеличивается здесь и, через событие, в остальных процессах
+    hierarchy_cache.bump("bookings")
+    for room_id in set(room_ids):
+        event_bus.publish("bookings", key=room_id, namespaces=("bookings",), action="expired")
+
+
+booking_expiry_job = PeriodicJob("booking_expiry", BOOKING_EXPIRY_INTERVAL, expire_bookings,
+                                 lock_key=BOOKING_EXPIRY_LOCK, batch_size=BOOKING_EXPIRY_BATCH_SIZE,
+                                 after_commit=publish_expired)
@@ -1,4 +1,5 @@
-from sqlalchemy import Table, Column, Integer, String, ForeignKey, DateTime, Boolean, func
+from sqlalchemy import DDL, Table, Column, Integer, String, ForeignKey, DateTime, Boolean, Index, event, func
+from sqlalchemy.dialects.postgresql import ExcludeConstraint
 
 from app.database import metadata
 
@@ -34,5 +35,29 @@ room_bookings = Table(
     Column("start_time", DateTime, nullable=False),
     Column("end_time", DateTime, nullable=False),
     Column("is_active", Boolean, default=True),  # Индикатор активного бронирования
+    # Когда фоновая задача сняла активность с завершившегося бронирования; у отменённых — None
+    Column("expired_at", DateTime),
     Column("created_at", DateTime, server_default=func.now())
 )
+
+# Календарь и отчёт о загрузке читают бронирования комнаты по диапазону начала
+Index("ix_room_bookings_room_start", room_bookings.c.room_id, room_bookings.c.start_time)
+
+# Поиск завершившихся, но ещё активных бронирований фоновой задачей
+Index("ix_room_bookings_active_end", room_bookings.c.end_time, postgresql_where=room_bookings.c.is_active)
+
+# Запрет пересекающихся активных бронирований одной комнаты на уровне БД.
+# Для оператора "=" по room_id внутри GiST-индекса нужно расширение btree_gist
+BOOKING_OVERLAP_CONSTRAINT = "room_bookings_no_overlap"
+
+room_bookings.append_constraint(
+    ExcludeConstraint(
+        (room_bookings.c.room_id, "="),
+        (func.tsrange(room_bookings.c.start_time, room_bookings.c.end_time), "&&"),
+        name=BOOKING_OVERLAP_CONSTRAINT,
+        using="gist",
+        where=room_bookings.c.is_active,
+    )
+)
+
+event.listen(metadata, "before_create", DDL("CREATE EXTENSION IF NOT EXISTS btree_gist"))
@@ -0,0 +1,82 @@
+import argparse
+import asyncio
+
+from sqlalchemy import text
+from sqlalchemy.schema import AddConstraint
+
+from app.commonRooms.models import room_bookings, BOOKING_OVERLAP_CONSTRAINT
+from app.database import engine
+
+# Активное бронирование, которое пересекается с более ранним (по created_at, id) активным бронированием
+# той же комнаты, у которого самого нет более ранних пересечений. Такие «корни» остаются,
+# пересекающиеся с ними снимаются; повтор до нуля строк разбирает цепочки пересечений
+_DEACTIVATE_OVERLAPS = text("""
+UPDATE room_bookings AS later SET is_active = false
+FROM room_bookings AS kept
+WHERE later.is_active AND kept.is_active
+  AND later.room_id = kept.room_id AND later.id <> kept.id
+  AND tsrange(later.start_time, later.end_time) && tsrange(kept.start_time, kept.end_time)
+  AND (coalesce(kept.created_at, '-infinity'), kept.id) < (coalesce(later.created_at, '-infinity'), later.id)
+  AND NOT EXISTS (
+      SELECT 1 FROM room_bookings AS earlier
+      WHERE earlier.is_active AND earlier.room_id = kept.room_id AND earlier.id <> kept.id
+        AND tsrange(earlier.start_time, earlier.end_time) && tsrange(kept.start_time, kept.end_time)
+        AND (coalesce(earlier.created_at, '-infinity'), earlier.id) < (coalesce(kept.created_at, '-infinity'), kept.id)
+  )
+RETURNING later.id
+""")
+
+
+async def install_overlap_constraint():
+    # Установка ограничения room_bookings_no_overlap в уже существующую базу (create_all делает это сам).
+    # Уже пересекающиеся активные бронирования не удаляются, а выключаются: остаётся созданное раньше
+    async with engine.begin() as conn:
+        # Колонка, которую заполняет снятие активности с завершившихся бронирований (app.commonRooms.expiry)
+        await conn.execute(text("ALTER TABLE room_bookings ADD COLUMN IF NOT EXISTS expired_at timestamp"))
+        await conn.execute(text("CREATE EXTENSION IF NOT EXISTS btree_gist"))
+        # Новые бронирования ждут конца установки, иначе пересечение могло бы появиться между шагами
+        await conn.execute(text("LOCK TABLE room_bookings IN SHARE ROW EXCLUSIVE MODE"))
+        installed = await conn.scalar(
+            text("SELECT 1 FROM pg_constraint WHERE conname = :name"), {"name": BOOKING_OVERLAP_CONSTRAINT}
+        )
+        if installed:
+            return False, []
+
+        # tsrange не строится для бронирований, которые заканчиваются раньше начала
+        result = await conn.execute(text(
+            "UPDATE room_bookings SET is_active = false WHERE is_active AND end_time < start_time RETURNING id"
+        ))
+        deactivated = list(result.scalars().all())
+        while True:
+            result = await conn.execute(_DEACTIVATE_OVERLAPS)
+            ids = result.scalars().all()
+            if not ids:
+                break
+            deactivated.extend(ids)
+
+        constraint = next(constraint for constraint in room_bookings.constraints
+                          if constraint.name == BOOKING_OVERLAP_CONSTRAINT)
+        await conn.execute(AddConstraint(constraint))
+    return True, sorted(deactivated)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Обслуживание схемы бронирований")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("install", help="Добавить колонку expired_at, выключить пересекающиеся бронирования "
+                                          "и добавить ограничение")
+    parser.parse_args()
+
+    installed, deactivated = await install_overlap_constraint()
+    await engine.dispose()
+
+    if not installed:
+        print(f"Constraint {BOOKING_OVERLAP_CONSTRAINT} already installed")
+        return
+    for booking_id in deactivated:
+        print(f"booking {booking_id} deactivated")
+    print(f"Constraint {BOOKING_OVERLAP_CONSTRAINT} installed, {len(deactivated)} overlapping booking(s) deactivated")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -32,4 +32,53 @@ class BookingCreate(BaseModel):
 class BookingUpdate(BaseModel):
     start_time: Optional[datetime] = None
     end_time: Optional[datetime] = None
-    is_active: Optional[bool] = None
\ No newline at end of file
+    is_active: Optional[bool] = None
+
+
+# Схемы ответов
+class RoomTypeRead(BaseModel):
+    id: int
+    type_name: str
+    description: Optional[str] = None
+
+
+class PublicRoomRead(BaseModel):
+    id: int
+    room_name: str
+    type_name: Optional[str] = None
+    block_name: Optional[str] = None
+    floor_number: Optional[int] = None
+    capacity: Optional[int] = None
+    description: Optional[str] = None
+
+
+class PublicRoomDetails(PublicRoomRead):
+    type_id: Optional[int] = None
+    floor_id: Optional[int] = None
+    block_id: Optional[int] = None
+
+
+class BookingRead(BaseModel):
+    id: int
+    room_id: Optional[int] = None
+    user_id: Optional[int] = None
+    start_time: datetime
+    end_time: datetime
+    is_active: Optional[bool] = None
+    expired_at: Optional[datetime] = None
+    created_at: Optional[datetime] = None
+
+
+class CalendarBooking(BookingRead):
+    room_name: str
+    type_id: Optional[int] = None
+    type_name: Optional[str] = None
+    floor_id: Optional[int] = None
+
+
+class UtilizationBucket(BaseModel):
+    room_id: int
+    room_name: str
+    bucket_start: datetime
+    booked_minutes: float
+    utilization: float
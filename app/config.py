@@ -9,4 +9,60 @@ DB_NAME = os.environ.get("DB_NAME")
 DB_USER = os.environ.get("DB_USER")
 DB_PASS = os.environ.get("DB_PASS")
 
-SECRET_AUTH = os.environ.get("SECRET_AUTH")
\ No newline at end of file
+SECRET_AUTH = os.environ.get("SECRET_AUTH")
+
+# Пул соединений с БД
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 5))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", 10))
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", 30))
+DB_POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", 1800))
+DB_POOL_PRE_PING = os.environ.get("DB_POOL_PRE_PING", "true").lower() == "true"
+DB_STATEMENT_CACHE_SIZE = int(os.environ.get("DB_STATEMENT_CACHE_SIZE", 100))
+# Режим совместимости с PgBouncer (transaction pooling): кэши подготовленных запросов отключены
+DB_PGBOUNCER = os.environ.get("DB_PGBOUNCER", "false").lower() == "true"
+# Доля занятых соединений, при которой /health/ready отвечает 503
+DB_POOL_READY_THRESHOLD = float(os.environ.get("DB_POOL_READY_THRESHOLD", 0.9))
+
+# Кэш иерархии здания (этажи, блоки, комнаты, типы помещений)
+HIERARCHY_CACHE_SIZE = int(os.environ.get("HIERARCHY_CACHE_SIZE", 512))
+HIERARCHY_CACHE_TTL = float(os.environ.get("HIERARCHY_CACHE_TTL", 300))
+
+# Пул процессов для формирования документов .docx
+DOCUMENT_RENDER_WORKERS = int(os.environ.get("DOCUMENT_RENDER_WORKERS", 2))
+
+# Время жизни кэша рейтинговой таблицы (секунды)
+RATING_RANKING_TTL = float(os.environ.get("RATING_RANKING_TTL", 600))
+
+# Кэш пользователей, определённых по JWT
+USER_CACHE_SIZE = int(os.environ.get("USER_CACHE_SIZE", 1024))
+USER_CACHE_TTL = float(os.environ.get("USER_CACHE_TTL", 60))
+
+# Поиск жителей: порог нечёткого совпадения pg_trgm и максимальный размер выдачи
+RESIDENT_SEARCH_THRESHOLD = float(os.environ.get("RESIDENT_SEARCH_THRESHOLD", 0.4))
+RESIDENT_SEARCH_MAX_LIMIT = int(os.environ.get("RESIDENT_SEARCH_MAX_LIMIT", 50))
+
+# Окно действия ETag (секунды): версии таблиц хранятся в памяти процесса, поэтому тег
+# дополнительно меняется раз в окно и изменения из других процессов видны не позже чем через него
+ETAG_WINDOW = float(os.environ.get("ETAG_WINDOW", 30))
+
+# Поток событий об изменениях (SSE): сколько различных событий копится для медленного клиента
+# до замены их на resync и как часто отправляется keep-alive
+EVENTS_MAX_PENDING = int(os.environ.get("EVENTS_MAX_PENDING", 256))
+EVENTS_HEARTBEAT = float(os.environ.get("EVENTS_HEARTBEAT", 15))
+
+# Наибольший период календаря и отчёта о загрузке общедоступных помещений (дни)
+BOOKING_REPORT_MAX_DAYS = int(os.environ.get("BOOKING_REPORT_MAX_DAYS", 366))
+
+# Фоновое снятие активности с завершившихся бронирований: период запуска (секунды) и размер порции
+BOOKING_EXPIRY_INTERVAL = float(os.environ.get("BOOKING_EXPIRY_INTERVAL", 60))
+BOOKING_EXPIRY_BATCH_SIZE = int(os.environ.get("BOOKING_EXPIRY_BATCH_SIZE", 1000))
+
+# Плановая сверка current_occupancy с таблицей жителей (секунды): выезды с датой в будущем
+# наступают без записи в residents, и триггеры их не видят
+OCCUPANCY_RECONCILE_INTERVAL = float(os.environ.get("OCCUPANCY_RECONCILE_INTERVAL", 24 * 60 * 60))
+
+# Журнал изменений: размер пачки многострочного INSERT, наибольшая задержка записи (секунды)
+# и предел очереди, после которого новые записи отбрасываются
+AUDIT_BATCH_SIZE = int(os.environ.get("AUDIT_BATCH_SIZE", 500))
+AUDIT_FLUSH_INTERVAL = float(os.environ.get("AUDIT_FLUSH_INTERVAL", 1))
+AUDIT_MAX_PENDING = int(os.environ.get("AUDIT_MAX_PENDING", 10000))
@@ -5,17 +5,35 @@ from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
-from app.config import DB_HOST, DB_NAME, DB_PASS, DB_PORT, DB_USER
+from app.config import (DB_HOST, DB_NAME, DB_PASS, DB_PORT, DB_USER, DB_POOL_SIZE, DB_MAX_OVERFLOW,
+                        DB_POOL_TIMEOUT, DB_POOL_RECYCLE, DB_POOL_PRE_PING, DB_STATEMENT_CACHE_SIZE, DB_PGBOUNCER)
+from app.pool import InstrumentedQueuePool
 
 DATABASE_URL = f"postgresql+asyncpg://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 Base = declarative_base()
 
 metadata = MetaData()
 
-engine = create_async_engine(DATABASE_URL)
+# За PgBouncer в режиме transaction pooling подготовленные запросы не переживают смену
+# серверного соединения, поэтому кэши asyncpg и SQLAlchemy отключаются
+if DB_PGBOUNCER:
+    connect_args = {"statement_cache_size": 0, "prepared_statement_cache_size": 0}
+else:
+    connect_args = {"statement_cache_size": DB_STATEMENT_CACHE_SIZE}
+
+engine = create_async_engine(
+    DATABASE_URL,
+    poolclass=InstrumentedQueuePool,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_recycle=DB_POOL_RECYCLE,
+    pool_pre_ping=DB_POOL_PRE_PING,
+    connect_args=connect_args,
+)
 async_session_maker = sessionmaker(engine, class_ =AsyncSession, expire_on_commit=False)
 
 
 async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
     async with async_session_maker() as session:
-        yield session
\ No newline at end of file
+        yield session
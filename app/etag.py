@@ -0,0 +1,62 @@
+import secrets
+import time
+
+from fastapi import Request
+from fastapi.responses import Response
+
+from app.cache import hierarchy_cache
+from app.config import ETAG_WINDOW
+
+# Версии таблиц начинаются с нуля при каждом запуске, идентификатор запуска не даёт
+# совпасть тегам, выданным до перезапуска или другим процессом
+BOOT_ID = secrets.token_hex(4)
+
+
+class NotModified(Exception):
+    def __init__(self, etag: str):
+        self.etag = etag
+
+
+def _matches(header: str, tag: str) -> bool:
+    candidates = {candidate.strip() for candidate in header.split(",")}
+    return "*" in candidates or tag in candidates
+
+
+def etag(*namespaces: str):
+    # Зависимость для GET-обработчика: тег строится из версий таблиц, которые увеличивают
+    # обработчики изменений. При совпадении с If-None-Match ответ 304 отдаётся до запроса к БД
+    async def check_etag(request: Request):
+        versions = ".".join(str(hierarchy_cache.version(namespace)) for namespace in namespaces)
+        tag = f'W/"{BOOT_ID}-{int(time.time() // ETAG_WINDOW)}-{versions}"'
+        header = request.headers.get("if-none-match")
+        if header and _matches(header, tag):
+            raise NotModified(tag)
+        request.state.etag = tag
+
+    return check_etag
+
+
+async def not_modified_handler(request: Request, exc: NotModified):
+    return Response(status_code=304, headers={"ETag": exc.etag, "Cache-Control": "no-cache"})
+
+
+class ETagMiddleware:
+    # Добавляет ETag, выставленный зависимостью etag(), к успешному ответу обработчика
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in ("GET", "HEAD"):
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_etag(message):
+            if message["type"] == "http.response.start" and message["status"] == 200:
+                tag = scope.get("state", {}).get("etag")
+                if tag is not None:
+                    message.setdefault("headers", [])
+                    message["headers"] = [*message["headers"], (b"etag", tag.encode("latin-1")),
+                                          (b"cache-control", b"no-cache")]
+            await send(message)
+
+        await self.app(scope, receive, send_with_etag)
@@ -0,0 +1,189 @@
+import asyncio
+import json
+import logging
+import secrets
+from typing import List
+
+import asyncpg
+from fastapi import APIRouter, Query, Request
+from fastapi.responses import StreamingResponse
+
+from app.cache import hierarchy_cache, user_cache
+from app.config import DB_HOST, DB_NAME, DB_PASS, DB_PORT, DB_USER, EVENTS_HEARTBEAT, EVENTS_MAX_PENDING
+from app.ratings.ranking import rating_ranking
+from app.responses import dumps
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "dorm_events"
+
+# Отличает собственные уведомления процесса от пришедших из других процессов
+PROCESS_ID = secrets.token_hex(4)
+
+
+class Subscription:
+    # Очередь событий одного клиента. События с одинаковыми (topic, key) схлопываются в последнее,
+    # поэтому медленный клиент получает актуальное состояние, а не весь поток изменений.
+    # При переполнении очередь заменяется одним событием resync на каждую тему
+    def __init__(self, topics):
+        self.topics = set(topics)
+        self._pending = {}
+        self._ready = asyncio.Event()
+        self.dropped = 0
+
+    def push(self, event: dict):
+        if event["topic"] not in self.topics:
+            return
+        key = (event["topic"], event.get("key"))
+        self._pending.pop(key, None)
+        self._pending[key] = event
+        if len(self._pending) > EVENTS_MAX_PENDING:
+            self.dropped += len(self._pending)
+            topics = {topic for topic, _ in self._pending}
+            self._pending = {(topic, None): {"topic": topic, "action": "resync"} for topic in topics}
+        self._ready.set()
+
+    async def next_batch(self, timeout: float):
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return []
+        self._ready.clear()
+        batch = list(self._pending.values())
+        self._pending = {}
+        return batch
+
+
+class EventBus:
+    # Рассылка событий об изменениях клиентам SSE всех процессов через LISTEN/NOTIFY PostgreSQL.
+    # Локальные подписчики получают событие сразу, остальные процессы — через канал CHANNEL;
+    # пришедшие извне события также увеличивают версии таблиц в hierarchy_cache, сбрасывают
+    # рейтинговую структуру rating_ranking (пространство имён "ratings") и записи user_cache ("users")
+    def __init__(self):
+        self._subscriptions = set()
+        self._outgoing = None
+        self._connection = None
+        self._tasks = []
+
+    def subscribe(self, topics) -> Subscription:
+        subscription = Subscription(topics)
+        self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        self._subscriptions.discard(subscription)
+
+    @property
+    def subscribers(self) -> int:
+        return len(self._subscriptions)
+
+    def _deliver(self, event: dict):
+        for subscription in self._subscriptions:
+            subscription.push(event)
+
+    def publish(self, topic: str, key=None, namespaces=(), **data):
+        # Не ждёт БД: уведомление уходит фоновой задачей, обработчик изменения не замедляется
+        event = {"topic": topic, "key": key, **data}
+        self._deliver(event)
+        if self._outgoing is not None:
+            self._outgoing.put_nowait({"origin": PROCESS_ID, "namespaces": list(namespaces), "event": event})
+
+    def _on_notification(self, connection, pid, channel, payload):
+        message = json.loads(payload)
+        if message["origin"] == PROCESS_ID:
+            return
+        hierarchy_cache.bump(*message["namespaces"])
+        if "ratings" in message["namespaces"]:
+            rating_ranking.invalidate()
+        if "users" in message["namespaces"]:
+            user_cache.discard(message["event"]["key"])
+        self._deliver(message["event"])
+
+    async def _connect(self):
+        connection = await asyncpg.connect(user=DB_USER, password=DB_PASS, host=DB_HOST, port=DB_PORT,
+                                           database=DB_NAME)
+        await connection.add_listener(CHANNEL, self._on_notification)
+        return connection
+
+    async def _listen(self):
+        # Переподключение с паузой; уведомления, пропущенные без соединения, восстановить нельзя,
+        # поэтому кэши сбрасываются, а клиенты получают resync
+        delay = 1
+        while True:
+            try:
+                self._connection = await self._connect()
+                delay = 1
+                closed = asyncio.Event()
+                self._connection.add_termination_listener(lambda connection: closed.set())
+                await closed.wait()
+            except (OSError, asyncio.TimeoutError, asyncpg.PostgresError) as e:
+                logger.warning("Event listener connection failed: %s", e)
+            self._connection = None
+            hierarchy_cache.bump(*hierarchy_cache.stats()["versions"])
+            rating_ranking.invalidate()
+            user_cache.clear()
+            for topic in {topic for subscription in self._subscriptions for topic in subscription.topics}:
+                self._deliver({"topic": topic, "action": "resync"})
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 30)
+
+    async def _send(self):
+        while True:
+            message = await self._outgoing.get()
+            if self._connection is None:
+                continue
+            try:
+                await self._connection.execute("SELECT pg_notify($1, $2)", CHANNEL, dumps(message).decode())
+            except (OSError, asyncpg.PostgresError) as e:
+                logger.warning("Event notification failed: %s", e)
+
+    async def start(self):
+        self._outgoing = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._listen()), asyncio.create_task(self._send())]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._outgoing = None
+        if self._connection is not None:
+            await self._connection.close()
+            self._connection = None
+
+
+event_bus = EventBus()
+
+
+TOPICS = ("rooms", "occupancy", "bookings", "floors", "blocks", "public_rooms", "comments", "ratings")
+
+router = APIRouter(
+    prefix="/events",
+    tags=["Events"]
+)
+
+
+# Поток изменений для панелей администратора вместо опроса summary, available_rooms и бронирований.
+# Событие говорит, что именно перечитать: {"topic": "bookings", "key": <room_id>, "action": "created", ...}
+@router.get("/")
+async def stream_events(request: Request, topics: List[str] = Query(list(TOPICS))):
+    subscription = event_bus.subscribe(topic for topic in topics if topic in TOPICS)
+
+    async def events():
+        try:
+            yield b"retry: 3000\n\n"
+            while not await request.is_disconnected():
+                batch = await subscription.next_batch(EVENTS_HEARTBEAT)
+                if not batch:
+                    yield b": keep-alive\n\n"
+                    continue
+                # Следующая порция формируется только после отправки предыдущей: пока клиент читает
+                # медленно, новые события копятся в подписке и схлопываются
+                yield b"".join(
+                    b"event: " + event["topic"].encode() + b"\ndata: " + dumps(event) + b"\n\n" for event in batch
+                )
+        finally:
+            event_bus.unsubscribe(subscription)
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
@@ -0,0 +1,41 @@
+from typing import Any, Dict
+
+from fastapi import APIRouter
+
+from app.config import DB_POOL_READY_THRESHOLD
+from app.pool import pool_stats
+from app.scheduler import scheduler
+from app.responses import Envelope, RowJSONResponse
+
+router = APIRouter(
+    prefix="/health",
+    tags=["Health"]
+)
+
+
+@router.get("/live", response_model=Envelope[Dict[str, Any]])
+async def liveness():
+    return {"status": "success"}
+
+
+# Готовность принимать трафик: 503, пока пул соединений почти исчерпан.
+# Состояние берётся из счётчиков пула, без запроса к БД, который сам ждал бы соединения
+@router.get("/ready", response_model=Envelope[Dict[str, Any]])
+async def readiness():
+    stats = pool_stats.snapshot()
+    if stats is not None and stats["saturation"] >= DB_POOL_READY_THRESHOLD:
+        return RowJSONResponse(status_code=503, content={"status": "error", "message": "Database pool saturated",
+                                                      "data": stats})
+    return {"status": "success", "data": stats}
+
+
+# Состояние пула соединений: занятые соединения, переполнение, гистограмма ожидания
+@router.get("/pool", response_model=Envelope[Dict[str, Any]])
+async def get_pool_stats():
+    return {"status": "success", "data": pool_stats.snapshot()}
+
+
+# Фоновые задачи: число запусков, обработанные строки и длительность последнего запуска
+@router.get("/scheduler", response_model=Envelope[Dict[str, Any]])
+async def get_scheduler_stats():
+    return {"status": "success", "data": {name: job.stats() for name, job in scheduler.jobs.items()}}
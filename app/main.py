@@ -1,3 +1,5 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from starlette.middleware.cors import CORSMiddleware
 
@@ -14,10 +16,44 @@ from app.comments.comments import router as comments
 from app.commonRooms.commonRooms import router as common_rooms
 from app.commonRooms.bookings import router as bookings
 from app.ratings.ratings import router as ratings
+from app.health import router as health
+from app.telemetry import MetricsMiddleware, router as metrics
+from app.responses import RowJSONResponse
+from app.etag import ETagMiddleware, NotModified, not_modified_handler
+from app.events import event_bus, router as events
+from app.audit import audit_trail, router as audit
+from app.scheduler import scheduler
+from app.commonRooms.expiry import booking_expiry_job
+from app.room.occupancy import occupancy_reconcile_job
+from app.room.documents import shutdown_executor
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Слушатель LISTEN/NOTIFY: события об изменениях из других процессов
+    await event_bus.start()
+    # Журнал изменений пишется фоновой задачей пачками
+    await audit_trail.start()
+    # Фоновые задачи; при нескольких процессах каждая выполняется не чаще раза за интервал во всём кластере
+    await scheduler.start()
+    yield
+    await scheduler.stop()
+    # Остаток очереди журнала записывается до остановки
+    await audit_trail.stop()
+    await event_bus.stop()
+    # Пул процессов рендера документов создаётся при первом запросе и сам не закрывается
+    shutdown_executor()
 
 
+scheduler.add(booking_expiry_job)
+scheduler.add(occupancy_reconcile_job)
+
+
+# Ответы кодируются orjson, строки результата SQLAlchemy — без промежуточных словарей
 app = FastAPI(
-    title="Diplom"
+    title="Diplom",
+    default_response_class=RowJSONResponse,
+    lifespan=lifespan
 )
 
 app.include_router(
@@ -48,6 +84,10 @@ app.include_router(comments)
 app.include_router(common_rooms)
 app.include_router(bookings)
 app.include_router(ratings)
+app.include_router(health)
+app.include_router(metrics)
+app.include_router(events)
+app.include_router(audit)
 
 origins = [
     "http://localhost:3000",
@@ -63,3 +103,9 @@ app.add_middleware(
                    "Authorization"],
 )
 
+# Условные GET: ETag по версиям таблиц, 304 при совпадении If-None-Match
+app.add_exception_handler(NotModified, not_modified_handler)
+app.add_middleware(ETagMiddleware)
+
+# Гистограммы задержек по шаблонам маршрутов и время SQL-запросов, /metrics
+app.add_middleware(MetricsMiddleware)
@@ -0,0 +1,102 @@
+import base64
+from collections.abc import Mapping
+from typing import Optional
+
+import orjson
+from fastapi import HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import and_, or_
+
+from app.database import async_session_maker
+from app.responses import dumps
+
+MAX_PAGE_SIZE = 1000
+STREAM_BATCH_SIZE = 500
+
+
+class PageParams:
+    # Параметры курсорной пагинации: ?after=<next_after предыдущей страницы>&limit=<размер страницы>&stream=true
+    def __init__(
+        self,
+        after: Optional[str] = Query(None, description="Курсор next_after предыдущей страницы"),
+        limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Размер страницы"),
+        stream: bool = Query(False, description="Вернуть все записи потоком в формате NDJSON"),
+    ):
+        self.after = after
+        self.limit = limit
+        self.stream = stream
+
+
+def _invalid_cursor():
+    return HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid pagination cursor")
+
+
+def _encode_cursor(value, row_id):
+    return base64.urlsafe_b64encode(orjson.dumps([value, row_id])).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str):
+    try:
+        value, row_id = orjson.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (ValueError, TypeError):
+        raise _invalid_cursor()
+    if not isinstance(row_id, int):
+        raise _invalid_cursor()
+    return value, row_id
+
+
+def paginate(query, id_column, page: PageParams, sort_column=None):
+    # Keyset-пагинация: вместо OFFSET продолжаем с позиции последней записи предыдущей страницы,
+    # поэтому стоимость страницы не зависит от её номера
+    if sort_column is None:
+        # Курсор — id последней записи
+        if page.after is not None:
+            try:
+                after = int(page.after)
+            except ValueError:
+                raise _invalid_cursor()
+            query = query.where(id_column > after)
+        query = query.order_by(id_column)
+    else:
+        # Курсор хранит сам ключ сортировки и id последней записи, поэтому не зависит от того,
+        # существует ли эта запись сейчас. Ключ сортировки не уникален, порядок дополняется id;
+        # NULL идут в конце
+        if page.after is not None:
+            value, after = _decode_cursor(page.after)
+            if value is None:
+                query = query.where(sort_column.is_(None), id_column > after)
+            else:
+                query = query.where(or_(
+                    sort_column > value,
+                    and_(sort_column == value, id_column > after),
+                    sort_column.is_(None),
+                ))
+        query = query.order_by(sort_column.asc().nulls_last(), id_column)
+
+    if page.limit is not None:
+        query = query.limit(page.limit)
+    return query
+
+
+def next_after(rows, page: PageParams, key: str = "id", sort_key: str = None):
+    # Курсор следующей страницы; None, если записей больше нет.
+    # Для страниц с sort_column в paginate нужно передать имя ключа сортировки в sort_key
+    if page.limit is None or len(rows) < page.limit:
+        return None
+    last = rows[-1]
+    get = last.get if isinstance(last, Mapping) else lambda name: getattr(last, name)
+    if sort_key is None:
+        return get(key)
+    return _encode_cursor(get(sort_key), get(key))
+
+
+def stream_ndjson(query):
+    # Чтение через серверный курсор: в памяти одновременно не больше STREAM_BATCH_SIZE строк.
+    # Сессия открывается внутри генератора, так как ответ отдаётся уже после выхода из обработчика
+    async def rows():
+        async with async_session_maker() as session:
+            result = await session.stream(query.execution_options(yield_per=STREAM_BATCH_SIZE))
+            async for row in result.mappings():
+                yield dumps(row) + b"\n"
+
+    return StreamingResponse(rows(), media_type="application/x-ndjson")
@@ -0,0 +1,57 @@
+import time
+
+from sqlalchemy import exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from app.metrics import Histogram
+
+
+class PoolStats:
+    def __init__(self):
+        self.pool = None
+        self.wait_time = Histogram()
+        self.overflow_events = 0
+        self.timeouts = 0
+
+    def snapshot(self):
+        pool = self.pool
+        if pool is None:
+            return None
+        capacity = pool.size() + max(pool._max_overflow, 0)
+        checked_out = pool.checkedout()
+        return {
+            "size": pool.size(),
+            "max_overflow": pool._max_overflow,
+            "checked_out": checked_out,
+            "idle": pool.checkedin(),
+            "overflow": max(pool.overflow(), 0),
+            "saturation": round(checked_out / capacity, 3) if capacity else 0.0,
+            "overflow_events": self.overflow_events,
+            "timeouts": self.timeouts,
+            "wait_seconds": self.wait_time.snapshot(),
+        }
+
+
+pool_stats = PoolStats()
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    # Очередь пула с замером времени ожидания соединения, подсчётом
+    # соединений сверх pool_size и таймаутов ожидания
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        pool_stats.pool = self
+
+    def _do_get(self):
+        started = time.perf_counter()
+        overflow = self.overflow()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            pool_stats.timeouts += 1
+            raise
+        finally:
+            pool_stats.wait_time.observe(time.perf_counter() - started)
+        if self.overflow() > max(overflow, 0):
+            pool_stats.overflow_events += 1
+        return connection
@@ -1,4 +1,4 @@
-from sqlalchemy import Table, Column, Integer, Float, Date, ForeignKey, MetaData
+from sqlalchemy import Table, Column, Integer, Float, Date, ForeignKey, Index, MetaData
 
 from app.database import metadata
 
@@ -12,4 +12,5 @@ residents_ratings = Table(
     Column("overall_score", Float, nullable=False),
 )
 
-
+# Индекс для рейтинговых таблиц: ORDER BY overall_score, id ... LIMIT читает только нужные строки
+Index("ix_residents_ratings_overall_score", residents_ratings.c.overall_score, residents_ratings.c.id)
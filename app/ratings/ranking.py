@@ -0,0 +1,156 @@
+import asyncio
+import math
+import time
+from bisect import bisect_left, bisect_right, insort
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import RATING_RANKING_TTL
+from app.ratings.models import residents_ratings
+from app.residents.models import residents
+from app.room.models import rooms, blocks
+
+ALL = ("all", None)
+
+
+class RatingRanking:
+    # Отсортированные списки (оценка, id рейтинга) в памяти процесса: общий и по каждому этажу и блоку.
+    # Место и процентиль жителя считаются бинарным поиском, лидеры этажа или блока берутся с концов
+    # списка, а изменения оценок применяются точечно, без перечитывания таблицы. Переселения и новые
+    # жители сбрасывают структуру, она загружается заново одним запросом при следующем обращении.
+    # Записи хранятся по id рейтинга: у жителя может быть несколько строк residents_ratings
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._entries = {}
+        self._resident_ratings = {}
+        self._scores = {}
+        self._expires_at = 0.0
+        # Меняется при каждом сбросе: загрузка, во время которой структура сбрасывалась,
+        # не считается свежей
+        self._generation = 0
+        self._lock = None
+
+    @staticmethod
+    def _scope_keys(floor_id, block_id):
+        keys = [ALL]
+        if floor_id is not None:
+            keys.append(("floor", floor_id))
+        if block_id is not None:
+            keys.append(("block", block_id))
+        return keys
+
+    @property
+    def loaded(self) -> bool:
+        return self._expires_at > time.monotonic()
+
+    async def ensure_loaded(self, session: AsyncSession):
+        if self.loaded:
+            return
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if self.loaded:
+                return
+            generation = self._generation
+            stmt = select(
+                residents_ratings.c.id,
+                residents_ratings.c.resident_id,
+                residents_ratings.c.overall_score,
+                blocks.c.floor_id,
+                blocks.c.id.label("block_id"),
+            ).select_from(
+                residents_ratings
+                .join(residents, residents.c.id == residents_ratings.c.resident_id)
+                .outerjoin(rooms, rooms.c.id == residents.c.room_id)
+                .outerjoin(blocks, blocks.c.id == rooms.c.block_id)
+            )
+            result = await session.execute(stmt)
+            self._entries = {}
+            self._resident_ratings = {}
+            self._scores = {}
+            for row in result.all():
+                self._entries[row.id] = (row.overall_score, row.resident_id, row.floor_id, row.block_id)
+                self._resident_ratings.setdefault(row.resident_id, set()).add(row.id)
+                for key in self._scope_keys(row.floor_id, row.block_id):
+                    self._scores.setdefault(key, []).append((row.overall_score, row.id))
+            for scores in self._scores.values():
+                scores.sort()
+            if generation == self._generation:
+                self._expires_at = time.monotonic() + self.ttl
+
+    def invalidate(self):
+        self._generation += 1
+        self._expires_at = 0.0
+
+    def _remove(self, rating_id):
+        entry = self._entries.pop(rating_id, None)
+        if entry is not None:
+            score, _, floor_id, block_id = entry
+            for key in self._scope_keys(floor_id, block_id):
+                scores = self._scores[key]
+                del scores[bisect_left(scores, (score, rating_id))]
+        return entry
+
+    def update_score(self, rating_id: int, score: float):
+        if not self.loaded:
+            # Структура могла загружаться в этот момент: снимок без этого изменения не должен стать свежим
+            self.invalidate()
+            return
+        entry = self._remove(rating_id)
+        if entry is None:
+            # Рейтинг неизвестен структуре, проще перечитать её
+            self.invalidate()
+            return
+        _, resident_id, floor_id, block_id = entry
+        self._entries[rating_id] = (score, resident_id, floor_id, block_id)
+        for key in self._scope_keys(floor_id, block_id):
+            insort(self._scores.setdefault(key, []), (score, rating_id))
+
+    def discard_resident(self, resident_id: int):
+        # Все рейтинги удалённого жителя
+        if not self.loaded:
+            self.invalidate()
+            return
+        for rating_id in self._resident_ratings.pop(resident_id, ()):
+            self._remove(rating_id)
+
+    def _scope(self, floor_id=None, block_id=None):
+        if block_id is not None:
+            return self._scores.get(("block", block_id), [])
+        if floor_id is not None:
+            return self._scores.get(("floor", floor_id), [])
+        return self._scores.get(ALL, [])
+
+    def count(self, floor_id=None, block_id=None) -> int:
+        return len(self._scope(floor_id, block_id))
+
+    def leaders(self, order: str, limit: int, floor_id=None, block_id=None):
+        # id рейтингов limit лучших (top) или худших (bottom) жителей в порядке (оценка, id),
+        # как в _leaderboard_query
+        scores = self._scope(floor_id, block_id)
+        selected = scores[-limit:][::-1] if order == "top" else scores[:limit]
+        return [rating_id for _, rating_id in selected]
+
+    def position(self, resident_id: int):
+        # Место (1 — лучший) и процентиль жителя среди всех, на своём этаже и в своём блоке;
+        # при нескольких рейтингах жителя берётся последний созданный
+        rating_ids = self._resident_ratings.get(resident_id)
+        if not rating_ids:
+            return None
+        score, _, floor_id, block_id = self._entries[max(rating_ids)]
+        positions = {"overall_score": score}
+        for key in self._scope_keys(floor_id, block_id):
+            scores = self._scores[key]
+            below = bisect_left(scores, (score, -math.inf))
+            equal = bisect_right(scores, (score, math.inf)) - below
+            positions[key[0]] = {
+                "id": key[1],
+                "rank": len(scores) - below - equal + 1,
+                "total": len(scores),
+                "percentile": round((below + equal / 2) / len(scores) * 100, 2),
+            }
+        return positions
+
+
+rating_ranking = RatingRanking(ttl=RATING_RANKING_TTL)
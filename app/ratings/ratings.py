@@ -1,9 +1,19 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+import math
+from typing import Any, Dict, List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, insert, update, delete
+from sqlalchemy import select, insert, delete, func, values, column, Integer, Float
+from app.audit import audit_actor, audit_trail, split_previous, update_returning_previous
 from app.database import get_async_session
+from app.events import event_bus
+from app.pagination import PageParams, paginate, next_after, stream_ndjson
 from app.ratings.models import residents_ratings
-from app.ratings.schemas import RatingCreate, RatingUpdate
+from app.ratings.ranking import rating_ranking
+from app.responses import Envelope, Message, list_response
+from app.residents.models import residents
+from app.room.models import rooms, blocks, floors
+from app.ratings.schemas import LeaderboardEntry, RatingCreate, RatingRead, RatingUpdate, RatingBatchAdjustment
 
 
 ACHIEVEMENT_INCREMENTS = {
@@ -25,14 +35,100 @@ router = APIRouter(
 )
 
 # Получение всех рейтингов
-@router.get("/ratings/")
-async def get_all_ratings(session: AsyncSession = Depends(get_async_session)):
-    result = await session.execute(select(residents_ratings))
-    return {"status": "success", "data": result.mappings().all()}
+@router.get("/ratings/", response_model=Envelope[List[RatingRead]])
+async def get_all_ratings(page: PageParams = Depends(), session: AsyncSession = Depends(get_async_session)):
+    query = paginate(select(residents_ratings), residents_ratings.c.id, page)
+    if page.stream:
+        return stream_ndjson(query)
+    result = await session.execute(query)
+    ratings_data = result.mappings().all()
+    return list_response(ratings_data, next_after=next_after(ratings_data, page))
+
+
+def _leaderboard_query(order: str, limit: int, floor_id: Optional[int], block_id: Optional[int], rating_ids=None):
+    # Сортировка совпадает с индексом (overall_score, id), поэтому читаются только первые limit строк
+    if order == "top":
+        ordering = (residents_ratings.c.overall_score.desc(), residents_ratings.c.id.desc())
+    else:
+        ordering = (residents_ratings.c.overall_score.asc(), residents_ratings.c.id.asc())
+    stmt = select(
+        residents_ratings.c.id.label("rating_id"),
+        residents.c.id.label("resident_id"),
+        residents.c.full_name,
+        residents_ratings.c.overall_score,
+        residents_ratings.c.achievement_score,
+        residents_ratings.c.infraction_score,
+        rooms.c.room_number,
+        blocks.c.block_name,
+        floors.c.floor_number
+    ).select_from(
+        residents_ratings
+        .join(residents, residents.c.id == residents_ratings.c.resident_id)
+        .outerjoin(rooms, rooms.c.id == residents.c.room_id)
+        .outerjoin(blocks, blocks.c.id == rooms.c.block_id)
+        .outerjoin(floors, floors.c.id == blocks.c.floor_id)
+    ).order_by(*ordering).limit(limit)
+    if floor_id is not None:
+        stmt = stmt.where(floors.c.id == floor_id)
+    if block_id is not None:
+        stmt = stmt.where(blocks.c.id == block_id)
+    if rating_ids is not None:
+        stmt = stmt.where(residents_ratings.c.id.in_(rating_ids))
+    return stmt
+
+
+async def _leaderboard(session: AsyncSession, order: str, limit: int, floor_id: Optional[int],
+                       block_id: Optional[int]):
+    # Этаж и блок находятся в других таблицах, и индекс по оценке для них не помогает: пришлось бы
+    # сортировать всех жителей этажа. Поэтому лидеры этажа или блока берутся из отсортированных
+    # списков rating_ranking, а из БД читаются только выбранные строки по первичному ключу
+    rating_ids = None
+    if floor_id is not None or block_id is not None:
+        await rating_ranking.ensure_loaded(session)
+        rating_ids = rating_ranking.leaders(order, limit, floor_id=floor_id, block_id=block_id)
+        if not rating_ids:
+            return []
+    result = await session.execute(_leaderboard_query(order, limit, floor_id, block_id, rating_ids))
+    return result.mappings().all()
+
+
+# Лучшие или худшие жители по общему рейтингу, с фильтром по этажу или блоку
+@router.get("/leaderboard/", response_model=Envelope[List[LeaderboardEntry]])
+async def get_leaderboard(limit: int = Query(50, ge=1, le=500), order: str = Query("top", regex="^(top|bottom)$"),
+                          floor_id: Optional[int] = None, block_id: Optional[int] = None,
+                          session: AsyncSession = Depends(get_async_session)):
+    data = await _leaderboard(session, order, limit, floor_id, block_id)
+    return {"status": "success", "data": data, "details": None}
+
+
+# Заданный процент лучших или худших жителей (например, нижние 10% на этаже)
+@router.get("/leaderboard/percent/", response_model=Envelope[List[LeaderboardEntry]])
+async def get_leaderboard_percent(percent: float = Query(..., gt=0, le=100),
+                                  order: str = Query("bottom", regex="^(top|bottom)$"),
+                                  floor_id: Optional[int] = None, block_id: Optional[int] = None,
+                                  session: AsyncSession = Depends(get_async_session)):
+    # Размер выборки берётся из кэшированной структуры, без подсчёта строк в БД
+    await rating_ranking.ensure_loaded(session)
+    total = rating_ranking.count(floor_id=floor_id, block_id=block_id)
+    limit = math.ceil(total * percent / 100)
+    if not limit:
+        return {"status": "success", "data": [], "details": {"total": total, "limit": 0}}
+    data = await _leaderboard(session, order, limit, floor_id, block_id)
+    return {"status": "success", "data": data, "details": {"total": total, "limit": limit}}
+
+
+# Место и процентиль жителя среди всех, на этаже и в блоке
+@router.get("/ratings/{resident_id}/percentile", response_model=Envelope[Dict[str, Any]])
+async def get_resident_percentile(resident_id: int, session: AsyncSession = Depends(get_async_session)):
+    await rating_ranking.ensure_loaded(session)
+    position = rating_ranking.position(resident_id)
+    if position is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Rating not found")
+    return {"status": "success", "data": position}
 
 
 # Получение рейтинга по ID жителя
-@router.get("/ratings/{resident_id}")
+@router.get("/ratings/{resident_id}", response_model=Envelope[RatingRead])
 async def get_rating_by_resident(resident_id: int, session: AsyncSession = Depends(get_async_session)):
     result = await session.execute(select(residents_ratings).where(residents_ratings.c.resident_id == resident_id))
     rating = result.mappings().first()
@@ -42,7 +138,7 @@ async def get_rating_by_resident(resident_id: int, session: AsyncSession = Depen
 
 
 # Создание нового рейтинга
-@router.post("/ratings/")
+@router.post("/ratings/", response_model=Message, dependencies=[Depends(audit_actor)])
 async def create_rating(rating_data: RatingCreate, session: AsyncSession = Depends(get_async_session)):
     overall_score = rating_data.achievement_score - rating_data.infraction_score
     stmt = insert(residents_ratings).values(
@@ -50,84 +146,127 @@ async def create_rating(rating_data: RatingCreate, session: AsyncSession = Depen
         achievement_score=rating_data.achievement_score,
         infraction_score=rating_data.infraction_score,
         overall_score=overall_score
-    )
+    ).returning(residents_ratings)
     result = await session.execute(stmt)
+    new_rating = result.mappings().first()
     await session.commit()
+    rating_ranking.invalidate()
+    event_bus.publish("ratings", key=new_rating["id"], namespaces=("ratings",), action="created")
+    audit_trail.record("rating", new_rating["id"], "created", after=new_rating)
 
     return {"status": "success", "message": "Rating created successfully"}
 
 
 # Удаление рейтинга
-@router.delete("/ratings/{rating_id}")
+@router.delete("/ratings/{rating_id}", response_model=Message, dependencies=[Depends(audit_actor)])
 async def delete_rating(rating_id: int, session: AsyncSession = Depends(get_async_session)):
-    delete_stmt = delete(residents_ratings).where(residents_ratings.c.id == rating_id)
+    delete_stmt = delete(residents_ratings).where(residents_ratings.c.id == rating_id).returning(residents_ratings)
     result = await session.execute(delete_stmt)
-    if result.rowcount == 0:
+    deleted_rating = result.mappings().first()
+    if deleted_rating is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Rating not found")
     await session.commit()
+    rating_ranking.invalidate()
+    event_bus.publish("ratings", key=rating_id, namespaces=("ratings",), action="deleted")
+    audit_trail.record("rating", rating_id, "deleted", before=deleted_rating)
     return {"status": "success", "message": "Rating deleted successfully"}
 
 
-@router.patch("/ratings/{rating_id}/increase_achievement/{change_type}")
+def _clamped_overall(delta):
+    # Общий рейтинг всегда остаётся в пределах от 1 до 5
+    return func.least(5, func.greatest(1, residents_ratings.c.overall_score + delta))
+
+
+@router.patch("/ratings/{rating_id}/increase_achievement/{change_type}", response_model=Envelope[RatingRead],
+              dependencies=[Depends(audit_actor)])
 async def increase_achievement(rating_id: int, change_type: str, session: AsyncSession = Depends(get_async_session)):
     increment = ACHIEVEMENT_INCREMENTS.get(change_type)
     if not increment:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid change type specified")
 
-    async with session.begin():
-        current_data = await session.execute(select(residents_ratings).where(residents_ratings.c.id == rating_id))
-        current_rating = current_data.mappings().first()
-
-        if not current_rating:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Rating not found")
-
-        # Получаем изначальный рейтинг
-        initial_overall_score = current_rating['overall_score']
-
-        # Увеличиваем achievement_score
-        new_achievement_score = current_rating['achievement_score'] + increment
-
-        # Пересчитываем общий рейтинг с учетом изначального значения
-        new_overall_score = max(1, min(5, initial_overall_score + increment))
-
-        await session.execute(
-            update(residents_ratings).where(residents_ratings.c.id == rating_id).values(
-                achievement_score=new_achievement_score,
-                overall_score=new_overall_score
-            )
-        )
+    # Пересчёт выполняется в одном UPDATE, поэтому параллельные изменения не теряются
+    stmt = update_returning_previous(residents_ratings, residents_ratings.c.id == rating_id, dict(
+        achievement_score=func.coalesce(residents_ratings.c.achievement_score, 0) + increment,
+        overall_score=_clamped_overall(increment)
+    ))
+    result = await session.execute(stmt)
+    previous_rating, rating = split_previous(result.mappings().first())
+    if not rating:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Rating not found")
+    await session.commit()
+    rating_ranking.update_score(rating["id"], rating["overall_score"])
+    event_bus.publish("ratings", key=rating_id, namespaces=("ratings",), action="updated")
+    audit_trail.record("rating", rating_id, f"achievement_{change_type}", before=previous_rating, after=rating)
 
-    return {"status": "success", "message": "Achievement score increased successfully"}
+    return {"status": "success", "message": "Achievement score increased successfully", "data": rating}
 
 
-@router.patch("/ratings/{rating_id}/decrease_infraction/{change_type}")
+@router.patch("/ratings/{rating_id}/decrease_infraction/{change_type}", response_model=Envelope[RatingRead],
+              dependencies=[Depends(audit_actor)])
 async def decrease_infraction(rating_id: int, change_type: str, session: AsyncSession = Depends(get_async_session)):
     decrement = INFRACTION_DECREMENTS.get(change_type)
     if not decrement:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid change type specified")
 
-    async with session.begin():
-        current_data = await session.execute(select(residents_ratings).where(residents_ratings.c.id == rating_id))
-        current_rating = current_data.mappings().first()
-
-        if not current_rating:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Rating not found")
-
-        # Получаем изначальный рейтинг
-        initial_overall_score = current_rating['overall_score']
-
-        # Уменьшаем infraction_score
-        new_infraction_score = max(0, current_rating['infraction_score'] + decrement)
-
-        # Пересчитываем общий рейтинг с учетом изначального значения
-        new_overall_score = max(1, min(5,  initial_overall_score - decrement))
-
-        await session.execute(
-            update(residents_ratings).where(residents_ratings.c.id == rating_id).values(
-                infraction_score=new_infraction_score,
-                overall_score=new_overall_score
-            )
-        )
-
-    return {"status": "success", "message": "Infraction score decreased successfully"}
-
+    stmt = update_returning_previous(residents_ratings, residents_ratings.c.id == rating_id, dict(
+        infraction_score=func.greatest(0, func.coalesce(residents_ratings.c.infraction_score, 0) + decrement),
+        overall_score=_clamped_overall(-decrement)
+    ))
+    result = await session.execute(stmt)
+    previous_rating, rating = split_previous(result.mappings().first())
+    if not rating:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Rating not found")
+    await session.commit()
+    rating_ranking.update_score(rating["id"], rating["overall_score"])
+    event_bus.publish("ratings", key=rating_id, namespaces=("ratings",), action="updated")
+    audit_trail.record("rating", rating_id, f"infraction_{change_type}", before=previous_rating, after=rating)
+
+    return {"status": "success", "message": "Infraction score decreased successfully", "data": rating}
+
+
+# Пакетное изменение рейтингов (например, итоги проверки этажа) одним запросом
+@router.post("/ratings/adjust", response_model=Envelope[List[RatingRead]], dependencies=[Depends(audit_actor)])
+async def adjust_ratings(batch: RatingBatchAdjustment, session: AsyncSession = Depends(get_async_session)):
+    invalid = sorted({item.change_type for item in batch.adjustments
+                      if item.change_type not in ACHIEVEMENT_INCREMENTS and item.change_type not in INFRACTION_DECREMENTS})
+    if invalid:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"Invalid change type specified: {', '.join(invalid)}")
+    if not batch.adjustments:
+        return {"status": "success", "message": "No adjustments", "data": [], "details": None}
+
+    # Несколько изменений одного рейтинга суммируются, ограничение 1..5 применяется к итогу
+    deltas = {}
+    for item in batch.adjustments:
+        achievement, infraction = deltas.get(item.rating_id, (0.0, 0.0))
+        achievement += ACHIEVEMENT_INCREMENTS.get(item.change_type, 0.0)
+        infraction += INFRACTION_DECREMENTS.get(item.change_type, 0.0)
+        deltas[item.rating_id] = (achievement, infraction)
+
+    adjustments = values(
+        column("rating_id", Integer),
+        column("achievement_delta", Float),
+        column("infraction_delta", Float),
+        name="adjustments",
+    ).data([(rating_id, achievement, infraction) for rating_id, (achievement, infraction) in deltas.items()])
+
+    stmt = update_returning_previous(residents_ratings, residents_ratings.c.id == adjustments.c.rating_id, dict(
+        achievement_score=func.coalesce(residents_ratings.c.achievement_score, 0) + adjustments.c.achievement_delta,
+        infraction_score=func.greatest(
+            0, func.coalesce(residents_ratings.c.infraction_score, 0) + adjustments.c.infraction_delta
+        ),
+        overall_score=_clamped_overall(adjustments.c.achievement_delta - adjustments.c.infraction_delta)
+    ))
+    result = await session.execute(stmt)
+    changes = [split_previous(row) for row in result.mappings().all()]
+    await session.commit()
+    updated = [rating for _, rating in changes]
+    for previous_rating, rating in changes:
+        rating_ranking.update_score(rating["id"], rating["overall_score"])
+        audit_trail.record("rating", rating["id"], "adjusted", before=previous_rating, after=rating)
+    if updated:
+        event_bus.publish("ratings", namespaces=("ratings",), action="adjusted")
+
+    not_found = sorted(set(deltas) - {rating["id"] for rating in updated})
+    return {"status": "success", "message": "Ratings adjusted successfully", "data": updated,
+            "details": {"not_found": not_found}}
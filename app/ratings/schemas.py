@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import List, Optional
 
 
 class RatingCreate(BaseModel):
@@ -11,3 +11,33 @@ class RatingCreate(BaseModel):
 class RatingUpdate(BaseModel):
     achievement_score: Optional[float] = Field(None, description="Score based on resident's achievements.")
     infraction_score: Optional[float] = Field(None, description="Score based on resident's infractions.")
+
+
+class RatingAdjustment(BaseModel):
+    rating_id: int = Field(description="The ID of the rating to adjust.")
+    change_type: str = Field(description="Achievement (small/medium/large) or infraction (minor/moderate/major) type.")
+
+
+class RatingBatchAdjustment(BaseModel):
+    adjustments: List[RatingAdjustment] = Field(description="Adjustments applied in a single statement.")
+
+
+# Схемы ответов
+class RatingRead(BaseModel):
+    id: int
+    resident_id: int
+    achievement_score: Optional[float] = None
+    infraction_score: Optional[float] = None
+    overall_score: float
+
+
+class LeaderboardEntry(BaseModel):
+    rating_id: int
+    resident_id: int
+    full_name: str
+    overall_score: float
+    achievement_score: Optional[float] = None
+    infraction_score: Optional[float] = None
+    room_number: Optional[int] = None
+    block_name: Optional[str] = None
+    floor_number: Optional[int] = None
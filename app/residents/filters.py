@@ -0,0 +1,61 @@
+from collections import defaultdict
+from typing import List, Optional
+
+from fastapi import Query
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.residents.models import residents
+
+FACET_COLUMNS = ("status", "faculty", "citizenship", "gender", "role")
+
+
+class ResidentFilters:
+    # Фильтры списка жителей: ?status=...&faculty=...&faculty=... (несколько значений — любое из них)
+    def __init__(
+        self,
+        status: Optional[List[str]] = Query(None),
+        faculty: Optional[List[str]] = Query(None),
+        citizenship: Optional[List[str]] = Query(None),
+        gender: Optional[List[str]] = Query(None),
+        role: Optional[List[str]] = Query(None),
+        facets: bool = Query(False, description="Вернуть количество жителей по значениям фильтров "
+                                                "(только для первой страницы)"),
+    ):
+        self.values = {
+            "status": status,
+            "faculty": faculty,
+            "citizenship": citizenship,
+            "gender": gender,
+            "role": role,
+        }
+        self.facets = facets
+
+    def apply(self, query):
+        for name, values in self.values.items():
+            if values:
+                query = query.where(residents.c[name].in_(values))
+        return query
+
+
+async def facet_counts(session: AsyncSession, filters: ResidentFilters):
+    # Счётчики по всем измерениям одним запросом: GROUPING SETS группирует по каждой колонке отдельно,
+    # а grouping() показывает, к какому измерению относится строка результата
+    columns = [residents.c[name] for name in FACET_COLUMNS]
+    stmt = filters.apply(
+        select(
+            *columns,
+            *(func.grouping(column).label(f"grouping_{column.name}") for column in columns),
+            func.count().label("residents"),
+        )
+        .group_by(func.grouping_sets(*columns))
+    )
+    result = await session.execute(stmt)
+
+    facets = defaultdict(list)
+    for row in result.mappings():
+        for name in FACET_COLUMNS:
+            if row[f"grouping_{name}"] == 0:
+                facets[name].append({"value": row[name], "count": row["residents"]})
+                break
+    return {name: sorted(facets[name], key=lambda facet: -facet["count"]) for name in FACET_COLUMNS}
@@ -0,0 +1,112 @@
+import argparse
+import asyncio
+from datetime import date
+
+from sqlalchemy import Date, and_, cast, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import engine
+from app.residents.models import residents, residency_history, HISTORY_TRIGGER_DDL
+from app.room.models import rooms, blocks, floors
+
+
+def _with_location(*columns):
+    return (
+        select(*columns, rooms.c.room_number, blocks.c.id.label("block_id"), blocks.c.block_name,
+               floors.c.id.label("floor_id"), floors.c.floor_number)
+        .select_from(
+            residency_history
+            .join(rooms, rooms.c.id == residency_history.c.room_id)
+            .join(blocks, blocks.c.id == rooms.c.block_id)
+            .join(floors, floors.c.id == blocks.c.floor_id)
+        )
+    )
+
+
+async def resident_history(session: AsyncSession, resident_id: int):
+    # Все комнаты жителя по порядку; индекс ix_residency_history_resident
+    stmt = (
+        _with_location(
+            residency_history.c.id,
+            residency_history.c.room_id,
+            residency_history.c.started_on,
+            residency_history.c.ended_on,
+            residency_history.c.opened_by,
+            residency_history.c.closed_by,
+            residency_history.c.is_current,
+        )
+        .where(residency_history.c.resident_id == resident_id)
+        .order_by(residency_history.c.id)
+    )
+    result = await session.execute(stmt)
+    return result.mappings().all()
+
+
+async def occupants_on(session: AsyncSession, on: date, room_id: int = None, block_id: int = None,
+                       floor_id: int = None):
+    # Кто жил в комнате, блоке или на этаже в день on: period @> on по GiST-индексу
+    # ix_residency_history_room_period. Удалённые жители остаются в ответе без ФИО
+    stmt = (
+        _with_location(
+            residency_history.c.resident_id,
+            residents.c.full_name,
+            residency_history.c.room_id,
+            residency_history.c.started_on,
+            residency_history.c.ended_on,
+        )
+        .outerjoin(residents, residents.c.id == residency_history.c.resident_id)
+        .where(residency_history.c.period.op("@>")(cast(on, Date)))
+        .order_by(floors.c.floor_number, blocks.c.block_name, rooms.c.room_number, residency_history.c.resident_id)
+    )
+    if room_id is not None:
+        stmt = stmt.where(residency_history.c.room_id == room_id)
+    if block_id is not None:
+        stmt = stmt.where(rooms.c.block_id == block_id)
+    if floor_id is not None:
+        stmt = stmt.where(blocks.c.floor_id == floor_id)
+    result = await session.execute(stmt)
+    return result.mappings().all()
+
+
+def previous_room_id(resident_id):
+    # Комната, из которой житель был переселён последний раз
+    return (
+        select(residency_history.c.room_id)
+        .where(and_(residency_history.c.resident_id == resident_id, residency_history.c.closed_by == "relocation"))
+        .order_by(residency_history.c.id.desc())
+        .limit(1)
+        .scalar_subquery()
+    )
+
+
+async def install_history():
+    # Установка в уже существующую базу: таблица, индексы, триггеры и текущие комнаты жителей
+    # как открытые периоды (прежние переселения восстановить нельзя)
+    async with engine.begin() as conn:
+        await conn.execute(text("CREATE EXTENSION IF NOT EXISTS btree_gist"))
+        await conn.run_sync(residency_history.create, checkfirst=True)
+        for ddl in HISTORY_TRIGGER_DDL:
+            await conn.execute(ddl)
+        result = await conn.execute(text(
+            "INSERT INTO residency_history (resident_id, room_id, started_on, ended_on, opened_by, closed_by) "
+            "SELECT id, room_id, date_of_check_in, residency_end(date_of_check_in, date_of_check_out), 'check_in', "
+            "CASE WHEN date_of_check_out IS NOT NULL THEN 'check_out' END "
+            "FROM residents WHERE room_id IS NOT NULL AND NOT EXISTS ("
+            "SELECT 1 FROM residency_history WHERE resident_id = residents.id AND is_current)"
+        ))
+    return result.rowcount
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Обслуживание истории проживания")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("install", help="Создать таблицу истории, триггеры и заполнить текущими комнатами")
+    parser.parse_args()
+
+    backfilled = await install_history()
+    print(f"Residency history installed, {backfilled} current period(s) recorded")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,192 @@
+import argparse
+import asyncio
+import csv
+import io
+import os
+import time
+import zipfile
+from itertools import islice
+from xml.etree.ElementTree import ParseError
+
+from pydantic import ValidationError
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import async_session_maker, engine
+from app.residents.models import residents
+from app.residents.schemas import ResidentCreate
+
+IMPORT_CHUNK_SIZE = 5000
+IMPORT_COLUMNS = [column.name for column in residents.columns if column.name != "id"]
+
+# Начальный рейтинг нового жителя, как в create_resident
+INITIAL_ACHIEVEMENT_SCORE = 0.0
+INITIAL_INFRACTION_SCORE = 0.0
+INITIAL_OVERALL_SCORE = 3.0
+
+
+def _clean(value):
+    return (value.strip() or None) if isinstance(value, str) else value
+
+
+class ImportFileError(ValueError):
+    # Файл нельзя прочитать: неверная кодировка, повреждённый CSV или XLSX
+    pass
+
+
+def _read_csv(content: bytes):
+    # Файл декодируется и заголовок читается сразу, чтобы ошибка кодировки была видна до загрузки
+    try:
+        reader = csv.DictReader(io.StringIO(content.decode("utf-8-sig")))
+        header = reader.fieldnames
+    except (UnicodeDecodeError, csv.Error) as e:
+        raise ImportFileError(f"Invalid CSV file: {e}")
+    if not header:
+        raise ImportFileError("CSV file has no header row")
+    return _csv_rows(reader)
+
+
+def _csv_rows(reader):
+    try:
+        for row in reader:
+            yield {key.strip(): _clean(value) for key, value in row.items() if key}
+    except csv.Error as e:
+        raise ImportFileError(f"Invalid CSV file at line {reader.line_num}: {e}")
+
+
+def _read_xlsx(content: bytes):
+    try:
+        from openpyxl import load_workbook
+        from openpyxl.utils.exceptions import InvalidFileException
+    except ImportError:
+        raise ImportFileError("XLSX import requires openpyxl to be installed")
+    # Книга открывается и заголовок читается сразу: повреждённый архив отклоняется до загрузки
+    try:
+        rows = load_workbook(io.BytesIO(content), read_only=True, data_only=True).active.iter_rows(values_only=True)
+        header = [str(cell).strip() if cell is not None else None for cell in next(rows, ())]
+    except (zipfile.BadZipFile, InvalidFileException, KeyError, ParseError) as e:
+        raise ImportFileError(f"Invalid XLSX file: {e}")
+    return _xlsx_rows(header, rows)
+
+
+def _xlsx_rows(header, rows):
+    try:
+        for values in rows:
+            yield {key: _clean(value) for key, value in zip(header, values) if key}
+    except (zipfile.BadZipFile, KeyError, ParseError) as e:
+        raise ImportFileError(f"Invalid XLSX file: {e}")
+
+
+def read_rows(filename: str, content: bytes):
+    # Строки файла в виде словарей "заголовок -> значение"; пустые ячейки превращаются в None.
+    # Ошибки формата — ImportFileError, в том числе при чтении строк после начала загрузки
+    extension = os.path.splitext(filename or "")[1].lower()
+    if extension == ".csv":
+        return _read_csv(content)
+    if extension == ".xlsx":
+        return _read_xlsx(content)
+    raise ImportFileError("Unsupported file format, expected .csv or .xlsx")
+
+
+def _validate(rows, first_line: int, errors: list):
+    # Номера строк совпадают с номерами в исходной таблице (строка 1 — заголовок)
+    records = []
+    for line, row in enumerate(rows, start=first_line):
+        try:
+            resident = ResidentCreate(**row)
+        except ValidationError as e:
+            errors.append({"row": line, "errors": e.errors()})
+            continue
+        values = resident.dict()
+        records.append((line, *(values[name] for name in IMPORT_COLUMNS)))
+    return records
+
+
+async def import_residents(session: AsyncSession, rows, chunk_size: int = IMPORT_CHUNK_SIZE):
+    # Строки проверяются схемой ResidentCreate порциями и загружаются через COPY во временную таблицу,
+    # затем жители и их начальные рейтинги вставляются одним запросом в той же транзакции
+    started = time.perf_counter()
+    errors = []
+    total = 0
+    columns = ", ".join(IMPORT_COLUMNS)
+
+    await session.execute(text(
+        f"CREATE TEMP TABLE residents_staging ON COMMIT DROP AS "
+        f"SELECT 0 AS row_number, {columns} FROM residents WITH NO DATA"
+    ))
+    connection = await session.connection()
+    driver = (await connection.get_raw_connection()).driver_connection
+
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+        records = _validate(chunk, total + 2, errors)
+        total += len(chunk)
+        if records:
+            await driver.copy_records_to_table(
+                "residents_staging", records=records, columns=["row_number", *IMPORT_COLUMNS]
+            )
+
+    # Ссылки на несуществующие комнаты и пользователей отсеиваются до вставки, а не роняют всю загрузку
+    for column, table in (("room_id", "rooms"), ("user_id", '"user"')):
+        result = await session.execute(text(
+            f"DELETE FROM residents_staging AS staging "
+            f"WHERE staging.{column} IS NOT NULL "
+            f"AND NOT EXISTS (SELECT 1 FROM {table} WHERE {table}.id = staging.{column}) "
+            f"RETURNING staging.row_number, staging.{column}"
+        ))
+        for line, value in result.all():
+            errors.append({"row": line, "errors": [{"loc": [column], "msg": f"{column} {value} does not exist"}]})
+
+    result = await session.execute(
+        text(
+            f"WITH inserted AS ("
+            f"INSERT INTO residents ({columns}) "
+            f"SELECT {columns} FROM residents_staging ORDER BY row_number RETURNING id) "
+            f"INSERT INTO residents_ratings (resident_id, achievement_score, infraction_score, overall_score) "
+            f"SELECT id, :achievement, :infraction, :overall FROM inserted"
+        ),
+        {
+            "achievement": INITIAL_ACHIEVEMENT_SCORE,
+            "infraction": INITIAL_INFRACTION_SCORE,
+            "overall": INITIAL_OVERALL_SCORE,
+        },
+    )
+    imported = result.rowcount
+    await session.commit()
+
+    elapsed = time.perf_counter() - started
+    return {
+        "total_rows": total,
+        "imported": imported,
+        "rejected": total - imported,
+        "errors": sorted(errors, key=lambda error: error["row"]),
+        "elapsed_seconds": round(elapsed, 3),
+        "rows_per_second": round(total / elapsed, 1) if elapsed else None,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Массовая загрузка жителей из CSV/XLSX")
+    parser.add_argument("path", help="Путь к файлу .csv или .xlsx")
+    parser.add_argument("--chunk-size", type=int, default=IMPORT_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    with open(args.path, "rb") as f:
+        content = f.read()
+    async with async_session_maker() as session:
+        report = await import_residents(session, read_rows(args.path, content), chunk_size=args.chunk_size)
+    await engine.dispose()
+
+    for error in report["errors"]:
+        print(f"row {error['row']}: " + "; ".join(
+            f"{'.'.join(str(part) for part in item['loc'])}: {item['msg']}" for item in error["errors"]
+        ))
+    print(f"{report['imported']} of {report['total_rows']} rows imported in {report['elapsed_seconds']}s "
+          f"({report['rows_per_second']} rows/s)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,4 +1,6 @@
-from sqlalchemy import Table, Column, Integer, String, Date, ForeignKey
+from sqlalchemy import (DDL, Table, Column, Integer, String, Date, DateTime, Boolean, Computed, ForeignKey, Index,
+                        event, func, true)
+from sqlalchemy.dialects.postgresql import DATERANGE
 
 from app.database import metadata
 
@@ -21,4 +23,203 @@ residents = Table(
     Column("status", String(100), nullable=False)
 )
 
+# Составные индексы под фильтры списка жителей; id в конце обслуживает keyset-пагинацию по фильтру
+Index("ix_residents_status_faculty", residents.c.status, residents.c.faculty, residents.c.id)
+Index("ix_residents_faculty_status", residents.c.faculty, residents.c.status, residents.c.id)
+Index("ix_residents_citizenship", residents.c.citizenship, residents.c.id)
+Index("ix_residents_gender_role", residents.c.gender, residents.c.role, residents.c.id)
 
+# Житель занимает место, если он заселён в комнату и дата выселения ещё не наступила
+OCCUPANT_CONDITION = "room_id IS NOT NULL AND (date_of_check_out IS NULL OR date_of_check_out > CURRENT_DATE)"
+
+# rooms.current_occupancy поддерживается триггерами уровня оператора: изменения
+# берутся из transition-таблиц и применяются к rooms одним UPDATE на оператор,
+# поэтому массовые вставки и переселения не пересчитывают комнаты построчно
+OCCUPANCY_TRIGGER_DDL = [
+    DDL(f"""
+CREATE OR REPLACE FUNCTION residents_sync_occupancy() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        UPDATE rooms SET current_occupancy = COALESCE(rooms.current_occupancy, 0) + delta.value
+        FROM (SELECT room_id, count(*) AS value FROM new_rows WHERE {OCCUPANT_CONDITION} GROUP BY room_id) AS delta
+        WHERE rooms.id = delta.room_id;
+    ELSIF TG_OP = 'DELETE' THEN
+        UPDATE rooms SET current_occupancy = COALESCE(rooms.current_occupancy, 0) - delta.value
+        FROM (SELECT room_id, count(*) AS value FROM old_rows WHERE {OCCUPANT_CONDITION} GROUP BY room_id) AS delta
+        WHERE rooms.id = delta.room_id;
+    ELSE
+        UPDATE rooms SET current_occupancy = COALESCE(rooms.current_occupancy, 0) + delta.value
+        FROM (
+            SELECT room_id, sum(value) AS value FROM (
+                SELECT room_id, 1 AS value FROM new_rows WHERE {OCCUPANT_CONDITION}
+                UNION ALL
+                SELECT room_id, -1 AS value FROM old_rows WHERE {OCCUPANT_CONDITION}
+            ) AS changes
+            GROUP BY room_id
+            HAVING sum(value) <> 0
+        ) AS delta
+        WHERE rooms.id = delta.room_id;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+"""),
+    DDL("DROP TRIGGER IF EXISTS residents_occupancy_insert ON residents"),
+    DDL("DROP TRIGGER IF EXISTS residents_occupancy_update ON residents"),
+    DDL("DROP TRIGGER IF EXISTS residents_occupancy_delete ON residents"),
+    DDL("CREATE TRIGGER residents_occupancy_insert AFTER INSERT ON residents "
+        "REFERENCING NEW TABLE AS new_rows "
+        "FOR EACH STATEMENT EXECUTE FUNCTION residents_sync_occupancy()"),
+    DDL("CREATE TRIGGER residents_occupancy_update AFTER UPDATE ON residents "
+        "REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows "
+        "FOR EACH STATEMENT EXECUTE FUNCTION residents_sync_occupancy()"),
+    DDL("CREATE TRIGGER residents_occupancy_delete AFTER DELETE ON residents "
+        "REFERENCING OLD TABLE AS old_rows "
+        "FOR EACH STATEMENT EXECUTE FUNCTION residents_sync_occupancy()"),
+]
+
+for ddl in OCCUPANCY_TRIGGER_DDL:
+    event.listen(residents, "after_create", ddl)
+
+# Поисковая строка жителя для триграммного индекса; запрос поиска использует то же выражение,
+# иначе планировщик не сопоставит его с индексом
+SEARCH_DOCUMENT = (
+    "lower(full_name || ' ' || email || ' ' || coalesce(faculty, '') || ' ' || coalesce(group_number, ''))"
+)
+
+SEARCH_INDEX_DDL = [
+    DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm"),
+    DDL(f"CREATE INDEX IF NOT EXISTS ix_residents_search_trgm ON residents USING gin (({SEARCH_DOCUMENT}) gin_trgm_ops)"),
+]
+
+for ddl in SEARCH_INDEX_DDL:
+    event.listen(residents, "after_create", ddl)
+
+# Таблица "История проживания": один период [started_on, ended_on) на каждую комнату жителя.
+# Строки только добавляются; у текущего периода позже проставляются дата окончания и причина закрытия.
+# resident_id без внешнего ключа, чтобы история переживала удаление жителя
+residency_history = Table(
+    "residency_history",
+    metadata,
+    Column("id", Integer, primary_key=True),
+    Column("resident_id", Integer, nullable=False),
+    Column("room_id", Integer, ForeignKey("rooms.id"), nullable=False),
+    Column("started_on", Date, nullable=False),
+    Column("ended_on", Date),  # Не включается в период, как date_of_check_out в OCCUPANT_CONDITION
+    Column("period", DATERANGE, Computed("daterange(started_on, ended_on)"), nullable=False),
+    Column("opened_by", String(50), nullable=False),  # check_in, relocation или correction
+    Column("closed_by", String(50)),  # check_out, relocation, removed или correction
+    Column("is_current", Boolean, nullable=False, server_default=true()),  # Совпадает с residents.room_id
+    Column("recorded_at", DateTime, nullable=False, server_default=func.now())
+)
+
+# «Кто жил в комнате (блоке, этаже) на дату X»: room_id = ANY(...) AND period @> X по GiST (нужен btree_gist)
+Index("ix_residency_history_room_period", residency_history.c.room_id, residency_history.c.period,
+      postgresql_using="gist")
+# «История комнат жителя Y» в хронологическом порядке
+Index("ix_residency_history_resident", residency_history.c.resident_id, residency_history.c.id)
+# У жителя не больше одного текущего периода; по этому индексу триггеры находят его при изменениях
+Index("ix_residency_history_current", residency_history.c.resident_id, unique=True,
+      postgresql_where=residency_history.c.is_current)
+
+# История ведётся триггерами уровня оператора на residents, как и заселённость комнат,
+# поэтому её пишут все пути изменения жителей: API, импорт, автоматическое распределение.
+# residency_end не даёт периоду закончиться раньше начала при ошибочных датах выселения
+HISTORY_TRIGGER_DDL = [
+    DDL("""
+CREATE OR REPLACE FUNCTION residency_end(started_on date, ended_on date) RETURNS date AS $$
+    SELECT CASE WHEN ended_on IS NULL THEN NULL ELSE greatest(started_on, ended_on) END
+$$ LANGUAGE sql IMMUTABLE
+"""),
+    DDL("""
+CREATE OR REPLACE FUNCTION residents_record_history() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO residency_history (resident_id, room_id, started_on, ended_on, opened_by, closed_by)
+        SELECT id, room_id, date_of_check_in, residency_end(date_of_check_in, date_of_check_out), 'check_in',
+               CASE WHEN date_of_check_out IS NOT NULL THEN 'check_out' END
+        FROM new_rows WHERE room_id IS NOT NULL;
+    ELSIF TG_OP = 'DELETE' THEN
+        UPDATE residency_history AS history
+        SET is_current = false, closed_by = coalesce(history.closed_by, 'removed'),
+            ended_on = residency_end(history.started_on, least(history.ended_on, CURRENT_DATE))
+        FROM old_rows
+        WHERE history.resident_id = old_rows.id AND history.is_current;
+    ELSE
+        -- Смена комнаты: текущий период закрывается сегодняшним днём
+        UPDATE residency_history AS history
+        SET is_current = false,
+            closed_by = CASE WHEN new_rows.room_id IS NULL THEN 'check_out' ELSE 'relocation' END,
+            ended_on = residency_end(history.started_on, least(history.ended_on, CURRENT_DATE))
+        FROM old_rows JOIN new_rows ON new_rows.id = old_rows.id
+        WHERE old_rows.room_id IS DISTINCT FROM new_rows.room_id
+          AND history.resident_id = old_rows.id AND history.is_current;
+
+        -- Первое заселение начинается с даты заселения, переселение — с сегодняшнего дня
+        INSERT INTO residency_history (resident_id, room_id, started_on, ended_on, opened_by, closed_by)
+        SELECT new_rows.id, new_rows.room_id, period.started_on,
+               residency_end(period.started_on, new_rows.date_of_check_out),
+               CASE WHEN old_rows.room_id IS NULL THEN 'check_in' ELSE 'relocation' END,
+               CASE WHEN new_rows.date_of_check_out IS NOT NULL THEN 'check_out' END
+        FROM old_rows JOIN new_rows ON new_rows.id = old_rows.id
+        CROSS JOIN LATERAL (
+            SELECT CASE WHEN old_rows.room_id IS NULL THEN new_rows.date_of_check_in
+                        ELSE greatest(new_rows.date_of_check_in, CURRENT_DATE) END AS started_on
+        ) AS period
+        WHERE old_rows.room_id IS DISTINCT FROM new_rows.room_id AND new_rows.room_id IS NOT NULL;
+
+        -- Та же комната, изменены даты: история только дополняется. Текущий период закрывается
+        -- (closed_by = 'correction') на сегодняшнем дне или раньше, если выезд наступил раньше,
+        -- и с этой даты открывается новый период по новым датам. Ещё не начавшийся период
+        -- заменяется целиком: закрытый остаётся пустым, новый начинается с новой даты заселения.
+        -- Изменение одной даты заселения у уже начавшегося периода историю не меняет
+        WITH closed AS (
+            UPDATE residency_history AS history
+            SET is_current = false, closed_by = 'correction',
+                ended_on = CASE WHEN history.started_on > CURRENT_DATE THEN history.started_on
+                                ELSE greatest(history.started_on,
+                                              least(CURRENT_DATE, coalesce(history.ended_on, CURRENT_DATE),
+                                                    coalesce(new_rows.date_of_check_out, CURRENT_DATE))) END
+            FROM old_rows JOIN new_rows ON new_rows.id = old_rows.id
+            WHERE old_rows.room_id IS NOT DISTINCT FROM new_rows.room_id
+              AND (old_rows.date_of_check_out IS DISTINCT FROM new_rows.date_of_check_out
+                   OR (old_rows.date_of_check_in IS DISTINCT FROM new_rows.date_of_check_in
+                       AND history.started_on > CURRENT_DATE))
+              AND history.resident_id = new_rows.id AND history.is_current
+            RETURNING history.resident_id, history.room_id, history.opened_by, history.ended_on AS split_on,
+                      history.started_on > CURRENT_DATE AS not_started,
+                      new_rows.date_of_check_in, new_rows.date_of_check_out
+        )
+        INSERT INTO residency_history (resident_id, room_id, started_on, ended_on, opened_by, closed_by)
+        SELECT closed.resident_id, closed.room_id, period.started_on,
+               residency_end(period.started_on, closed.date_of_check_out),
+               CASE WHEN closed.not_started THEN closed.opened_by ELSE 'correction' END,
+               CASE WHEN closed.date_of_check_out IS NOT NULL THEN 'check_out' END
+        FROM closed
+        CROSS JOIN LATERAL (
+            SELECT CASE WHEN NOT closed.not_started THEN closed.split_on
+                        WHEN closed.opened_by = 'check_in' THEN closed.date_of_check_in
+                        ELSE greatest(closed.date_of_check_in, CURRENT_DATE) END AS started_on
+        ) AS period;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+"""),
+    DDL("DROP TRIGGER IF EXISTS residents_history_insert ON residents"),
+    DDL("DROP TRIGGER IF EXISTS residents_history_update ON residents"),
+    DDL("DROP TRIGGER IF EXISTS residents_history_delete ON residents"),
+    DDL("CREATE TRIGGER residents_history_insert AFTER INSERT ON residents "
+        "REFERENCING NEW TABLE AS new_rows "
+        "FOR EACH STATEMENT EXECUTE FUNCTION residents_record_history()"),
+    DDL("CREATE TRIGGER residents_history_update AFTER UPDATE ON residents "
+        "REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows "
+        "FOR EACH STATEMENT EXECUTE FUNCTION residents_record_history()"),
+    DDL("CREATE TRIGGER residents_history_delete AFTER DELETE ON residents "
+        "REFERENCING OLD TABLE AS old_rows "
+        "FOR EACH STATEMENT EXECUTE FUNCTION residents_record_history()"),
+]
+
+# Триггеры ставятся после создания всех таблиц: residency_history может появиться раньше residents
+for ddl in HISTORY_TRIGGER_DDL:
+    event.listen(metadata, "after_create", ddl)
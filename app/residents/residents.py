@@ -1,10 +1,24 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from typing import List
+
+from fastapi import APIRouter, Depends, File, HTTPException, Query, UploadFile, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, delete, update, insert
+from sqlalchemy import select, delete, insert
+from app.audit import audit_actor, audit_trail, split_previous, update_returning_previous
+from app.cache import hierarchy_cache
+from app.config import RESIDENT_SEARCH_MAX_LIMIT
 from app.database import get_async_session
+from app.events import event_bus
+from app.pagination import PageParams, paginate, next_after, stream_ndjson
 from app.ratings.models import residents_ratings
+from app.ratings.ranking import rating_ranking
+from app.responses import Envelope, Message, list_response
+from app.residents.filters import ResidentFilters, facet_counts
+from app.residents.history import resident_history
+from app.residents.importer import ImportFileError, import_residents, read_rows
 from app.residents.models import residents
-from app.residents.schemas import ResidentCreate, ResidentUpdate
+from app.residents.schemas import (ImportReport, ResidencyPeriod, ResidentCreate, ResidentRead, ResidentSearchResult,
+                                   ResidentUpdate)
+from app.residents.search import SEARCH_MIN_QUERY_LENGTH, search_residents
 
 router = APIRouter(
     prefix="/management/residents",
@@ -12,7 +26,7 @@ router = APIRouter(
 )
 
 
-@router.get("/residents/no-room")
+@router.get("/residents/no-room", response_model=Envelope[List[ResidentRead]])
 async def get_residents_without_rooms(session: AsyncSession = Depends(get_async_session)):
     # Формируем SQL запрос для поиска всех записей, где room_id равно null
     query = select(residents).where(residents.c.room_id == None)
@@ -26,14 +40,30 @@ async def get_residents_without_rooms(session: AsyncSession = Depends(get_async_
     return {"status": "success", "data": residents_data}
 
 
-# Получение всех жителей
-@router.get("/residents/")
-async def get_all_residents(session: AsyncSession = Depends(get_async_session)):
-    result = await session.execute(select(residents).order_by(residents.c.id))
-    return {"status": "success", "data": result.mappings().all(), "details": None}
+# Поиск по ФИО, почте, факультету и группе с комнатой, блоком и этажом в том же запросе
+@router.get("/residents/search", response_model=Envelope[List[ResidentSearchResult]])
+async def search_residents_by_text(q: str = Query(..., min_length=SEARCH_MIN_QUERY_LENGTH, max_length=100),
+                                   limit: int = Query(10, ge=1, le=RESIDENT_SEARCH_MAX_LIMIT),
+                                   session: AsyncSession = Depends(get_async_session)):
+    residents_data = await search_residents(session, q, limit)
+    return {"status": "success", "data": residents_data, "details": None}
+
+
+# Получение всех жителей с фильтрами; по ?facets=true — счётчики по значениям фильтров в details
+@router.get("/residents/", response_model=Envelope[List[ResidentRead]])
+async def get_all_residents(page: PageParams = Depends(), filters: ResidentFilters = Depends(),
+                            session: AsyncSession = Depends(get_async_session)):
+    query = paginate(filters.apply(select(residents)), residents.c.id, page)
+    if page.stream:
+        return stream_ndjson(query)
+    result = await session.execute(query)
+    residents_data = result.mappings().all()
+    # Счётчики не зависят от страницы, поэтому считаются только для первой
+    details = {"facets": await facet_counts(session, filters)} if filters.facets and page.after is None else None
+    return list_response(residents_data, details=details, next_after=next_after(residents_data, page))
 
 # Получение жителя по ID
-@router.get("/residents/{resident_id}")
+@router.get("/residents/{resident_id}", response_model=Envelope[ResidentRead])
 async def get_resident_by_id(resident_id: int, session: AsyncSession = Depends(get_async_session)):
     result = await session.execute(select(residents).where(residents.c.id == resident_id))
     resident_data = result.mappings().first()
@@ -42,8 +72,14 @@ async def get_resident_by_id(resident_id: int, session: AsyncSession = Depends(g
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Resident not found")
     return {"status": "success", "data": resident_data, "details": None}
 
+# Комнаты жителя с датами заселения, переселений и выселения
+@router.get("/residents/{resident_id}/history", response_model=Envelope[List[ResidencyPeriod]])
+async def get_resident_history(resident_id: int, session: AsyncSession = Depends(get_async_session)):
+    history = await resident_history(session, resident_id)
+    return {"status": "success", "data": history, "details": None}
+
 # Создание нового жителя
-@router.post("/residents/")
+@router.post("/residents/", response_model=Envelope[ResidentRead], dependencies=[Depends(audit_actor)])
 async def create_resident(resident_data: ResidentCreate, session: AsyncSession = Depends(get_async_session)):
     # Создание записи жителя
     stmt = insert(residents).values(**resident_data.dict()).returning(residents)
@@ -65,6 +101,13 @@ async def create_resident(resident_data: ResidentCreate, session: AsyncSession =
     )
     await session.execute(rating_stmt)
     await session.commit()
+    # Заселённость комнаты изменилась триггером, кэш списка комнат устарел
+    if new_resident['room_id'] is not None:
+        hierarchy_cache.bump("rooms")
+        event_bus.publish("occupancy", key=new_resident['room_id'], namespaces=("rooms",), action="checked_in")
+    rating_ranking.invalidate()
+    event_bus.publish("ratings", namespaces=("ratings",), action="created")
+    audit_trail.record("resident", new_resident['id'], "created", after=new_resident)
 
     return {
         "status": "success",
@@ -72,29 +115,63 @@ async def create_resident(resident_data: ResidentCreate, session: AsyncSession =
         "data": new_resident
     }
 
+# Массовая загрузка жителей из CSV/XLSX с отчётом об ошибках по строкам
+@router.post("/residents/import", response_model=Envelope[ImportReport], dependencies=[Depends(audit_actor)])
+async def import_residents_file(file: UploadFile = File(...), session: AsyncSession = Depends(get_async_session)):
+    # Строки читаются по ходу загрузки, поэтому повреждённый файл может обнаружиться и внутри неё
+    try:
+        report = await import_residents(session, read_rows(file.filename, await file.read()))
+    except ImportFileError as e:
+        await session.rollback()
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    if report["imported"]:
+        hierarchy_cache.bump("rooms")
+        event_bus.publish("occupancy", namespaces=("rooms",), action="imported")
+        rating_ranking.invalidate()
+        event_bus.publish("ratings", namespaces=("ratings",), action="imported")
+        # Одна запись на загрузку: построчные записи переполнили бы очередь журнала
+        audit_trail.record("resident", None, "imported", after={"file": file.filename, "imported": report["imported"],
+                                                                "rejected": report["rejected"]})
+    return {"status": "success", "message": "Residents imported", "data": report}
+
 # Обновление данных жителя
-@router.patch("/residents/{resident_id}")
+@router.patch("/residents/{resident_id}", response_model=Envelope[ResidentRead], dependencies=[Depends(audit_actor)])
 async def update_resident(resident_id: int, resident_data: ResidentUpdate, session: AsyncSession = Depends(get_async_session)):
-    update_stmt = update(residents).where(residents.c.id == resident_id).values(**resident_data.dict(exclude_unset=True)).returning(residents)
+    changes = resident_data.dict(exclude_unset=True)
+    update_stmt = update_returning_previous(residents, residents.c.id == resident_id, changes)
     result = await session.execute(update_stmt)
     await session.commit()
-    updated_resident = result.mappings().first()
+    previous_resident, updated_resident = split_previous(result.mappings().first())
     if not updated_resident:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Resident not found")
+    if "room_id" in changes or "date_of_check_out" in changes:
+        hierarchy_cache.bump("rooms")
+        event_bus.publish("occupancy", namespaces=("rooms",), action="changed")
+    if "room_id" in changes:
+        rating_ranking.invalidate()
+        event_bus.publish("ratings", namespaces=("ratings",), action="relocated")
+    audit_trail.record("resident", resident_id, "updated", before=previous_resident, after=updated_resident)
     return {"status": "success", "message": "Resident updated successfully", "data": updated_resident}
 
 # Удаление жителя
-@router.delete("/residents/{resident_id}")
+@router.delete("/residents/{resident_id}", response_model=Message, dependencies=[Depends(audit_actor)])
 async def delete_resident(resident_id: int, session: AsyncSession = Depends(get_async_session)):
     # Удаление связанных рейтингов
     await session.execute(delete(residents_ratings).where(residents_ratings.c.resident_id == resident_id))
 
     # Удаление жителя
-    delete_stmt = delete(residents).where(residents.c.id == resident_id)
+    delete_stmt = delete(residents).where(residents.c.id == resident_id).returning(residents)
     result = await session.execute(delete_stmt)
-    if result.rowcount == 0:
+    deleted_resident = result.mappings().first()
+    if deleted_resident is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Resident not found")
 
     await session.commit()
+    hierarchy_cache.bump("rooms")
+    event_bus.publish("occupancy", namespaces=("rooms",), action="checked_out")
+    rating_ranking.discard_resident(resident_id)
+    event_bus.publish("ratings", namespaces=("ratings",), action="deleted")
+    audit_trail.record("resident", resident_id, "deleted", before=deleted_resident)
     return {"status": "success", "message": "Resident and related ratings deleted successfully"}
 
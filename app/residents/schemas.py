@@ -1,10 +1,44 @@
 from datetime import date
-from typing import Optional
-from pydantic import BaseModel
+from typing import Any, Dict, List, Optional
+from pydantic import BaseModel, Field
 
 
 # Схема для создания жителя
+# Наибольшая длина строк совпадает с размерами колонок таблицы residents: слишком длинное значение
+# отклоняется проверкой схемы (при импорте — одной строкой в отчёте), а не ошибкой БД
 class ResidentCreate(BaseModel):
+    user_id: Optional[int] = None
+    full_name: str = Field(max_length=255)
+    gender: str = Field(max_length=50)
+    citizenship: str = Field(max_length=100)
+    role: str = Field(max_length=100)
+    faculty: Optional[str] = Field(None, max_length=100)
+    group_number: Optional[str] = Field(None, max_length=50)
+    date_of_check_in: date = date.today()
+    date_of_check_out: Optional[date] = None
+    room_id: Optional[int] = None
+    email: str = Field(max_length=255)
+    status: str = Field(max_length=100)
+
+
+# Схема для обновления данных жителя
+class ResidentUpdate(BaseModel):
+    full_name: Optional[str] = Field(None, max_length=255)
+    gender: Optional[str] = Field(None, max_length=50)
+    citizenship: Optional[str] = Field(None, max_length=100)
+    role: Optional[str] = Field(None, max_length=100)
+    faculty: Optional[str] = Field(None, max_length=100)
+    group_number: Optional[str] = Field(None, max_length=50)
+    date_of_check_in: Optional[date] = None
+    date_of_check_out: Optional[date] = None
+    room_id: Optional[int] = None
+    email: Optional[str] = Field(None, max_length=255)
+    status: Optional[str] = Field(None, max_length=100)
+
+
+# Схемы ответов
+class ResidentRead(BaseModel):
+    id: int
     user_id: Optional[int] = None
     full_name: str
     gender: str
@@ -12,24 +46,78 @@ class ResidentCreate(BaseModel):
     role: str
     faculty: Optional[str] = None
     group_number: Optional[str] = None
-    date_of_check_in: date = date.today()
+    date_of_check_in: date
     date_of_check_out: Optional[date] = None
     room_id: Optional[int] = None
     email: str
     status: str
 
 
-# Схема для обновления данных жителя
-class ResidentUpdate(BaseModel):
-    full_name: Optional[str] = None
-    gender: Optional[str] = None
-    citizenship: Optional[str] = None
-    role: Optional[str] = None
+class RoomResident(BaseModel):
+    id: int
+    full_name: str
+    gender: str
+    role: str
+    citizenship: str
     faculty: Optional[str] = None
     group_number: Optional[str] = None
     date_of_check_in: Optional[date] = None
     date_of_check_out: Optional[date] = None
+    email: str
+    status: str
+    room_number: Optional[int] = None
+    max_capacity: Optional[int] = None
+    current_occupancy: Optional[int] = None
+    block_name: Optional[str] = None
+    floor_number: Optional[int] = None
+
+
+class ResidentSearchResult(BaseModel):
+    id: int
+    full_name: str
+    email: str
+    faculty: Optional[str] = None
+    group_number: Optional[str] = None
+    status: str
     room_id: Optional[int] = None
-    email: Optional[str] = None
-    status: Optional[str] = None
+    room_number: Optional[int] = None
+    block_name: Optional[str] = None
+    floor_number: Optional[int] = None
+    score: float
+
+
+class ImportReport(BaseModel):
+    total_rows: int
+    imported: int
+    rejected: int
+    errors: List[Dict[str, Any]]
+    elapsed_seconds: float
+    rows_per_second: Optional[float] = None
 
+
+class ResidencyPeriod(BaseModel):
+    id: int
+    room_id: int
+    room_number: Optional[int] = None
+    block_id: int
+    block_name: Optional[str] = None
+    floor_id: int
+    floor_number: Optional[int] = None
+    started_on: date
+    ended_on: Optional[date] = None
+    opened_by: str
+    closed_by: Optional[str] = None
+    is_current: bool
+
+
+class OccupantOnDate(BaseModel):
+    resident_id: int
+    full_name: Optional[str] = None
+    room_id: int
+    room_number: Optional[int] = None
+    block_id: int
+    block_name: Optional[str] = None
+    floor_id: int
+    floor_number: Optional[int] = None
+    started_on: date
+    ended_on: Optional[date] = None
@@ -0,0 +1,129 @@
+import argparse
+import asyncio
+
+from sqlalchemy import case, func, literal_column, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import RESIDENT_SEARCH_THRESHOLD
+from app.database import engine
+from app.residents.models import residents, SEARCH_DOCUMENT, SEARCH_INDEX_DDL
+from app.room.models import rooms, blocks, floors
+
+# Транслитерация для поиска «Ivanov» по «Иванов» и наоборот: триграммы разных алфавитов не пересекаются
+_CYRILLIC_TO_LATIN = {
+    "а": "a", "б": "b", "в": "v", "г": "g", "д": "d", "е": "e", "ё": "e", "ж": "zh", "з": "z", "и": "i",
+    "й": "y", "к": "k", "л": "l", "м": "m", "н": "n", "о": "o", "п": "p", "р": "r", "с": "s", "т": "t",
+    "у": "u", "ф": "f", "х": "kh", "ц": "ts", "ч": "ch", "ш": "sh", "щ": "shch", "ъ": "", "ы": "y", "ь": "",
+    "э": "e", "ю": "yu", "я": "ya",
+}
+_LATIN_TO_CYRILLIC = [
+    ("shch", "щ"), ("sch", "щ"), ("zh", "ж"), ("kh", "х"), ("ts", "ц"), ("ch", "ч"), ("sh", "ш"),
+    ("yu", "ю"), ("ya", "я"), ("yo", "ё"), ("a", "а"), ("b", "б"), ("v", "в"), ("g", "г"), ("d", "д"),
+    ("e", "е"), ("z", "з"), ("i", "и"), ("y", "й"), ("k", "к"), ("l", "л"), ("m", "м"), ("n", "н"),
+    ("o", "о"), ("p", "п"), ("r", "р"), ("s", "с"), ("t", "т"), ("u", "у"), ("f", "ф"), ("h", "х"),
+    ("c", "к"), ("w", "в"), ("x", "кс"), ("q", "к"), ("j", "дж"),
+]
+
+
+def to_latin(value: str) -> str:
+    return "".join(_CYRILLIC_TO_LATIN.get(char, char) for char in value)
+
+
+def to_cyrillic(value: str) -> str:
+    result = []
+    position = 0
+    while position < len(value):
+        for latin, cyrillic in _LATIN_TO_CYRILLIC:
+            if value.startswith(latin, position):
+                result.append(cyrillic)
+                position += len(latin)
+                break
+        else:
+            result.append(value[position])
+            position += 1
+    return "".join(result)
+
+
+def query_variants(query: str):
+    # Запрос как есть и в обоих алфавитах, без повторов
+    query = " ".join(query.lower().split())
+    variants = [query, to_latin(query), to_cyrillic(query)]
+    return [variant for index, variant in enumerate(variants) if variant and variant not in variants[:index]]
+
+
+# Строки короче триграммы не ищутся по ix_residents_search_trgm, и LIKE '%..%' для них читает всю таблицу
+SEARCH_MIN_QUERY_LENGTH = 3
+
+
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+async def search_residents(session: AsyncSession, query: str, limit: int):
+    # Подстрока (подсказки при наборе) и нечёткое совпадение слов (опечатки, транслит) —
+    # оба условия обслуживает GIN-индекс ix_residents_search_trgm по SEARCH_DOCUMENT
+    document = literal_column(SEARCH_DOCUMENT)
+    # Транслитерация может укоротить запрос («sha» -> «ша»), поэтому длина проверяется у каждого варианта
+    variants = [variant for variant in query_variants(query) if len(variant) >= SEARCH_MIN_QUERY_LENGTH]
+    if not variants:
+        return []
+    matches = []
+    prefixes = []
+    for variant in variants:
+        matches.append(document.like(f"%{_escape_like(variant)}%", escape="\\"))
+        matches.append(document.op("%>")(variant))
+        prefixes.append(func.lower(residents.c.full_name).like(f"{_escape_like(variant)}%", escape="\\"))
+    score = func.greatest(*(func.word_similarity(variant, document) for variant in variants))
+
+    stmt = (
+        select(
+            residents.c.id,
+            residents.c.full_name,
+            residents.c.email,
+            residents.c.faculty,
+            residents.c.group_number,
+            residents.c.status,
+            residents.c.room_id,
+            rooms.c.room_number,
+            blocks.c.block_name,
+            floors.c.floor_number,
+            score.label("score"),
+        )
+        .select_from(
+            residents
+            .outerjoin(rooms, rooms.c.id == residents.c.room_id)
+            .outerjoin(blocks, blocks.c.id == rooms.c.block_id)
+            .outerjoin(floors, floors.c.id == blocks.c.floor_id)
+        )
+        .where(or_(*matches))
+        # Совпадение с началом ФИО выше остальных, затем по близости
+        .order_by(case((or_(*prefixes), 0), else_=1), score.desc(), residents.c.full_name, residents.c.id)
+        .limit(limit)
+    )
+    # Порог действует только в текущей транзакции и не влияет на другие запросы соединения
+    await session.execute(select(func.set_config("pg_trgm.word_similarity_threshold",
+                                                 str(RESIDENT_SEARCH_THRESHOLD), True)))
+    result = await session.execute(stmt)
+    return result.mappings().all()
+
+
+async def install_search_index():
+    # Установка индекса в уже существующую базу (create_all делает это сам)
+    async with engine.begin() as conn:
+        for ddl in SEARCH_INDEX_DDL:
+            await conn.execute(ddl)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Обслуживание поиска жителей")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("install", help="Создать расширение pg_trgm и триграммный индекс")
+    parser.parse_args()
+
+    await install_search_index()
+    print("Resident search index installed")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,52 @@
+from collections.abc import Mapping
+from decimal import Decimal
+from typing import Any, Generic, Optional, TypeVar, Union
+
+import orjson
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel
+from pydantic.generics import GenericModel
+
+DataT = TypeVar("DataT")
+
+
+def _default(value):
+    # Строки результата SQLAlchemy кодируются orjson напрямую, без jsonable_encoder
+    if isinstance(value, Mapping):
+        return dict(value)
+    if hasattr(value, "_asdict"):
+        return value._asdict()
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError
+
+
+def dumps(content) -> bytes:
+    return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+class RowJSONResponse(ORJSONResponse):
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def list_response(data, details=None, next_after=None) -> RowJSONResponse:
+    # Конверт Envelope для больших списков строк: строки результата кодируются orjson напрямую,
+    # без проверки по response_model и jsonable_encoder. response_model маршрута остаётся для
+    # документации, поэтому выбранные колонки должны совпадать с полями его схемы
+    return RowJSONResponse({"status": "success", "message": None, "data": data, "details": details,
+                            "next_after": next_after})
+
+
+# Общий конверт ответов API: {"status": ..., "message": ..., "data": ..., "details": ...}
+class Envelope(GenericModel, Generic[DataT]):
+    status: str = "success"
+    message: Optional[str] = None
+    data: Optional[DataT] = None
+    details: Optional[Any] = None
+    next_after: Optional[Union[int, str]] = None  # id или закодированный курсор сортированной страницы
+
+
+class Message(BaseModel):
+    status: str = "success"
+    message: str
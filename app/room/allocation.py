@@ -0,0 +1,203 @@
+import argparse
+import asyncio
+import time
+from collections import Counter, defaultdict, deque
+
+from sqlalchemy import func, or_, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import async_session_maker, engine
+from app.residents.models import residents
+from app.room.models import rooms, blocks, floors
+
+
+def _is_occupant():
+    return or_(residents.c.date_of_check_out.is_(None), residents.c.date_of_check_out > func.current_date())
+
+
+class _Pool:
+    # Очередь нерасселённых жителей одного пола, упорядоченная по факультету и группе,
+    # с индексами по группе и факультету; выбранные жители вычёркиваются лениво
+    def __init__(self, members):
+        self.queue = deque(members)
+        self.by_group = defaultdict(deque)
+        self.by_faculty = defaultdict(deque)
+        for member in members:
+            self.by_group[(member[1], member[2])].append(member)
+            self.by_faculty[member[1]].append(member)
+        self.taken = set()
+        self.remaining = len(members)
+
+    def _pop(self, candidates):
+        while candidates:
+            member = candidates.popleft()
+            if member[0] not in self.taken:
+                self.taken.add(member[0])
+                self.remaining -= 1
+                return member
+        return None
+
+    def take(self, faculty=None, group_number=None):
+        # Сначала одногруппник, затем однокурсник по факультету, затем следующий по очереди
+        member = None
+        if group_number is not None:
+            member = self._pop(self.by_group.get((faculty, group_number), deque()))
+        if member is None and faculty is not None:
+            member = self._pop(self.by_faculty.get(faculty, deque()))
+        return member or self._pop(self.queue)
+
+
+async def _load(session: AsyncSession, lock: bool):
+    unassigned = await session.execute(
+        select(residents.c.id, residents.c.gender, residents.c.faculty, residents.c.group_number)
+        .where(residents.c.room_id.is_(None), _is_occupant())
+        .order_by(residents.c.gender, residents.c.faculty, residents.c.group_number, residents.c.id)
+    )
+
+    free_rooms = (
+        select(rooms.c.id, rooms.c.block_id, rooms.c.room_number, floors.c.floor_number, blocks.c.block_name,
+               (func.coalesce(rooms.c.max_capacity, 0) - func.coalesce(rooms.c.current_occupancy, 0)).label("free"),
+               (func.coalesce(rooms.c.current_occupancy, 0) == 0).label("is_empty"))
+        .select_from(rooms.join(blocks, blocks.c.id == rooms.c.block_id).join(floors, floors.c.id == blocks.c.floor_id))
+        .where(func.coalesce(rooms.c.max_capacity, 0) > func.coalesce(rooms.c.current_occupancy, 0))
+    )
+    if lock:
+        # Триггеры заселённости и другие распределения ждут конца транзакции
+        free_rooms = free_rooms.with_for_update(of=rooms)
+    free_rooms = (await session.execute(free_rooms)).all()
+
+    block_fill = await session.execute(
+        select(rooms.c.block_id,
+               func.sum(func.coalesce(rooms.c.current_occupancy, 0)).label("occupancy"),
+               func.sum(func.coalesce(rooms.c.max_capacity, 0)).label("capacity"))
+        .group_by(rooms.c.block_id)
+    )
+
+    # Состав уже заселённых комнат: пол и группы текущих жильцов
+    occupants = await session.execute(
+        select(residents.c.room_id, rooms.c.block_id, residents.c.gender, residents.c.faculty,
+               residents.c.group_number, func.count().label("residents"))
+        .select_from(residents.join(rooms, rooms.c.id == residents.c.room_id))
+        .where(_is_occupant(), func.coalesce(rooms.c.max_capacity, 0) > func.coalesce(rooms.c.current_occupancy, 0))
+        .group_by(residents.c.room_id, rooms.c.block_id, residents.c.gender, residents.c.faculty,
+                  residents.c.group_number)
+    )
+    return unassigned.all(), free_rooms, block_fill.all(), occupants.all()
+
+
+def plan_allocation(unassigned, free_rooms, block_fill, occupants):
+    # Один проход по свободным местам: сначала доселяются частично занятые комнаты, затем
+    # открываются пустые, в порядке заполненности блока, этажа и номера комнаты
+    by_gender = defaultdict(list)
+    for resident_id, gender, faculty, group_number in unassigned:
+        by_gender[gender].append((resident_id, faculty, group_number))
+    pools = {gender: _Pool(members) for gender, members in by_gender.items()}
+
+    room_genders = defaultdict(set)
+    room_groups = defaultdict(Counter)
+    block_genders = defaultdict(Counter)
+    for room_id, block_id, gender, faculty, group_number, count in occupants:
+        room_genders[room_id].add(gender)
+        room_groups[room_id][(faculty, group_number)] += count
+        block_genders[block_id][gender] += count
+    fill = {block_id: (occupancy or 0) / capacity if capacity else 0 for block_id, occupancy, capacity in block_fill}
+
+    ordered = sorted(free_rooms, key=lambda room: (
+        room.is_empty, -fill.get(room.block_id, 0), room.floor_number, room.block_name, room.room_number,
+    ))
+
+    assignments = []
+    skipped_rooms = []
+    for room in ordered:
+        genders = room_genders.get(room.id)
+        if genders and len(genders) > 1:
+            # Комната уже смешанная, доселение только нарушило бы ограничение
+            skipped_rooms.append(room.id)
+            continue
+        if genders:
+            gender = next(iter(genders))
+        else:
+            # Пустая комната получает преобладающий в блоке пол, иначе пол самой длинной очереди
+            candidates = [gender for gender, pool in pools.items() if pool.remaining]
+            if not candidates:
+                break
+            in_block = block_genders[room.block_id]
+            gender = max(candidates, key=lambda gender: (in_block[gender], pools[gender].remaining))
+        pool = pools.get(gender)
+        if pool is None or not pool.remaining:
+            continue
+
+        faculty, group_number = (room_groups[room.id].most_common(1)[0][0] if room.id in room_groups
+                                 else (None, None))
+        for _ in range(room.free):
+            member = pool.take(faculty, group_number)
+            if member is None:
+                break
+            if group_number is None:
+                # Первый житель пустой комнаты задаёт группу для остальных мест
+                faculty, group_number = member[1], member[2]
+            assignments.append((member[0], room.id))
+            block_genders[room.block_id][gender] += 1
+
+    unassigned_left = {gender: pool.remaining for gender, pool in pools.items() if pool.remaining}
+    return assignments, unassigned_left, skipped_rooms
+
+
+async def allocate_rooms(session: AsyncSession, dry_run: bool = False):
+    # Распределение всех жителей без комнаты по свободным местам; без dry_run результат
+    # применяется одним UPDATE, а заселённость комнат пересчитывают триггеры уровня оператора
+    started = time.perf_counter()
+    unassigned, free_rooms, block_fill, occupants = await _load(session, lock=not dry_run)
+    assignments, unassigned_left, skipped_rooms = plan_allocation(unassigned, free_rooms, block_fill, occupants)
+
+    applied = 0
+    if not dry_run and assignments:
+        result = await session.execute(
+            text(
+                "UPDATE residents SET room_id = allocation.room_id "
+                "FROM unnest(CAST(:resident_ids AS integer[]), CAST(:room_ids AS integer[])) "
+                "AS allocation(resident_id, room_id) "
+                "WHERE residents.id = allocation.resident_id AND residents.room_id IS NULL"
+            ),
+            {
+                "resident_ids": [resident_id for resident_id, _ in assignments],
+                "room_ids": [room_id for _, room_id in assignments],
+            },
+        )
+        applied = result.rowcount
+        await session.commit()
+    elif not dry_run:
+        await session.commit()
+
+    elapsed = time.perf_counter() - started
+    return {
+        "dry_run": dry_run,
+        "residents": len(unassigned),
+        "assigned": len(assignments) if dry_run else applied,
+        "unassigned": unassigned_left,
+        "rooms_used": len({room_id for _, room_id in assignments}),
+        "skipped_rooms": skipped_rooms,
+        "assignments": [{"resident_id": resident_id, "room_id": room_id} for resident_id, room_id in assignments],
+        "elapsed_seconds": round(elapsed, 3),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Автоматическое распределение жителей без комнаты")
+    parser.add_argument("--dry-run", action="store_true", help="Только показать распределение")
+    args = parser.parse_args()
+
+    async with async_session_maker() as session:
+        report = await allocate_rooms(session, dry_run=args.dry_run)
+    await engine.dispose()
+
+    for assignment in report["assignments"]:
+        print(f"resident {assignment['resident_id']} -> room {assignment['room_id']}")
+    for gender, count in report["unassigned"].items():
+        print(f"{count} resident(s) of gender {gender} left without a room")
+    print(f"{report['assigned']} of {report['residents']} residents {'planned' if args.dry_run else 'assigned'} "
+          f"to {report['rooms_used']} room(s) in {report['elapsed_seconds']}s")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,155 @@
+import asyncio
+import io
+import multiprocessing
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+from docx import Document
+from fastapi.responses import Response, StreamingResponse
+
+from app.config import DOCUMENT_RENDER_WORKERS
+
+DOCX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+
+_executor = None
+_slots = None
+
+
+@lru_cache(maxsize=None)
+def _template(heading: str) -> bytes:
+    # Скелет документа с заголовком собирается один раз на процесс и хранится в памяти,
+    # каждый рендер только загружает его и дописывает данные жителя
+    doc = Document()
+    doc.add_heading(heading, level=1)
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    return buffer.getvalue()
+
+
+def _render(heading: str, lines) -> bytes:
+    doc = Document(io.BytesIO(_template(heading)))
+    paragraph = doc.add_paragraph()
+    for label, value in lines:
+        paragraph.add_run(label).bold = True
+        paragraph.add_run(f'{value}\n')
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    return buffer.getvalue()
+
+
+def render_check_in(data: dict) -> bytes:
+    return _render('Check-In Notification', [
+        ('Resident Name: ', data['full_name']),
+        ('Room Number: ', f"{data['room_number']} (Block: {data['block_name']}, Floor: {data['floor_number']})"),
+        ('Date of Check-In: ', data['date_of_check_in']),
+        ('Date of Check-Out: ', data['date_of_check_out']),
+    ])
+
+
+def render_relocation(data: dict) -> bytes:
+    return _render('Notification of Relocation', [
+        ('Resident Name: ', data['full_name']),
+        ('From Room: ', f"{data['old_room_number']} (Block: {data['old_block_name']}, Floor: {data['old_floor_number']})"),
+        ('To Room: ', f"{data['current_room_number']} (Block: {data['current_block_name']}, Floor: {data['current_floor_number']})"),
+    ])
+
+
+def get_executor() -> ProcessPoolExecutor:
+    # spawn вместо fork: рабочие процессы не наследуют сокеты и соединения с БД сервера
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=DOCUMENT_RENDER_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _executor
+
+
+def shutdown_executor():
+    # Рабочие процессы завершаются вместе с приложением; задания в очереди отменяются
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True, cancel_futures=True)
+        _executor = None
+
+
+async def render(renderer, data: dict) -> bytes:
+    # Рендер выполняется вне цикла событий; очередь ожидания ограничена,
+    # чтобы всплеск запросов не копил задания в пуле без предела
+    global _slots
+    if _slots is None:
+        _slots = asyncio.Semaphore(DOCUMENT_RENDER_WORKERS * 2)
+    async with _slots:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(get_executor(), renderer, data)
+
+
+def document_response(content: bytes, filename: str) -> Response:
+    return Response(
+        content=content,
+        media_type=DOCX_MEDIA_TYPE,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+class _ZipStream(io.RawIOBase):
+    # Приёмник для ZipFile без поддержки seek: записанные байты забираются порциями через drain()
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+async def _render_entry(renderer, filename: str, data: dict):
+    return filename, await render(renderer, data)
+
+
+async def _zip_entries(renderer, entries):
+    # Одновременно в работе не больше документов, чем слотов пула, поэтому память
+    # ограничена размером пула, а не числом жителей. Записи попадают в архив по мере готовности
+    limit = DOCUMENT_RENDER_WORKERS * 2
+    entries = iter(entries)
+    pending = set()
+    buffer = _ZipStream()
+
+    def refill():
+        for filename, data in entries:
+            pending.add(asyncio.ensure_future(_render_entry(renderer, filename, data)))
+            if len(pending) >= limit:
+                break
+
+    try:
+        # .docx уже сжат, повторное сжатие только тратит CPU
+        with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_STORED) as archive:
+            refill()
+            while pending:
+                done, pending_left = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                pending.intersection_update(pending_left)
+                for task in done:
+                    filename, content = task.result()
+                    archive.writestr(filename, content)
+                    yield buffer.drain()
+                refill()
+        yield buffer.drain()
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+def zip_response(renderer, entries, filename: str) -> StreamingResponse:
+    return StreamingResponse(
+        _zip_entries(renderer, entries),
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
@@ -1,10 +1,17 @@
+from typing import List
+
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy import delete, update, insert
+from sqlalchemy import delete, insert
+from app.audit import audit_actor, audit_trail, split_previous, update_returning_previous
+from app.cache import hierarchy_cache
 from app.database import get_async_session
+from app.events import event_bus
+from app.etag import etag
+from app.responses import Envelope, Message
 from app.room.models import blocks, rooms
-from app.room.schemas import BlockCreate, BlockUpdate
+from app.room.schemas import BlockCreate, BlockRead, BlockUpdate, RoomRead
 
 router = APIRouter(
     prefix="/management/blocks",
@@ -12,24 +19,32 @@ router = APIRouter(
 )
 
 
-@router.get("/blocks/{block_id}/rooms/")
+@router.get("/blocks/{block_id}/rooms/", response_model=Envelope[List[RoomRead]],
+            dependencies=[Depends(etag("rooms"))])
 async def get_blocks_by_floor_id(block_id: int, session: AsyncSession = Depends(get_async_session)):
-    query = select(rooms).where(rooms.c.block_id == block_id).order_by(rooms.c.room_number)
-    result = await session.execute(query)
-    blocks_data = result.mappings().all()
+    async def load():
+        query = select(rooms).where(rooms.c.block_id == block_id).order_by(rooms.c.room_number)
+        result = await session.execute(query)
+        return [dict(row) for row in result.mappings().all()]
+
+    blocks_data = await hierarchy_cache.get_or_load(("block_rooms", block_id), load, depends=("rooms",))
 
     return {"status": "success", "data": blocks_data, "details": None}
 
 # Получить все блоки, отсортированные по названию блока
-@router.get("/blocks/")
+@router.get("/blocks/", response_model=Envelope[List[BlockRead]], dependencies=[Depends(etag("blocks"))])
 async def get_all_blocks(session: AsyncSession = Depends(get_async_session)):
-    query = select(blocks).order_by(blocks.c.block_name)
-    result = await session.execute(query)
-    return {"status": "success", "data": result.mappings().all(), "details": None}
+    async def load():
+        query = select(blocks).order_by(blocks.c.block_name)
+        result = await session.execute(query)
+        return [dict(row) for row in result.mappings().all()]
+
+    blocks_data = await hierarchy_cache.get_or_load(("blocks",), load, depends=("blocks",))
+    return {"status": "success", "data": blocks_data, "details": None}
 
 
 # Получить блок по ID
-@router.get("/blocks/{block_id}")
+@router.get("/blocks/{block_id}", response_model=Envelope[BlockRead], dependencies=[Depends(etag("blocks"))])
 async def get_block_by_id(block_id: int, session: AsyncSession = Depends(get_async_session)):
     result = await session.execute(select(blocks).where(blocks.c.id == block_id))
     block_data = result.mappings().first()
@@ -40,32 +55,43 @@ async def get_block_by_id(block_id: int, session: AsyncSession = Depends(get_asy
 
 
 # Создать новый блок
-@router.post("/blocks/")
+@router.post("/blocks/", response_model=Envelope[BlockRead], dependencies=[Depends(audit_actor)])
 async def create_block(block_data: BlockCreate, session: AsyncSession = Depends(get_async_session)):
     stmt = insert(blocks).values(**block_data.dict()).returning(blocks)
     result = await session.execute(stmt)
+    new_block = result.mappings().first()
     await session.commit()
-    return {"status": "success", "message": "Block created successfully", "data": result.mappings().first()}
+    hierarchy_cache.bump("blocks")
+    event_bus.publish("blocks", namespaces=("blocks",), action="created")
+    audit_trail.record("block", new_block["id"], "created", after=new_block)
+    return {"status": "success", "message": "Block created successfully", "data": new_block}
 
 
 # Обновить блок
-@router.patch("/blocks/{block_id}")
+@router.patch("/blocks/{block_id}", response_model=Envelope[BlockRead], dependencies=[Depends(audit_actor)])
 async def update_block(block_id: int, block_data: BlockUpdate, session: AsyncSession = Depends(get_async_session)):
-    update_stmt = update(blocks).where(blocks.c.id == block_id).values(**block_data.dict(exclude_unset=True)).returning(blocks)
+    update_stmt = update_returning_previous(blocks, blocks.c.id == block_id, block_data.dict(exclude_unset=True))
     result = await session.execute(update_stmt)
     await session.commit()
-    updated_block = result.mappings().first()
+    previous_block, updated_block = split_previous(result.mappings().first())
     if not updated_block:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Block not found")
+    hierarchy_cache.bump("blocks")
+    event_bus.publish("blocks", key=block_id, namespaces=("blocks",), action="updated")
+    audit_trail.record("block", block_id, "updated", before=previous_block, after=updated_block)
     return {"status": "success", "message": "Block updated successfully", "data": updated_block}
 
 
 # Удалить блок
-@router.delete("/blocks/{block_id}")
+@router.delete("/blocks/{block_id}", response_model=Message, dependencies=[Depends(audit_actor)])
 async def delete_block(block_id: int, session: AsyncSession = Depends(get_async_session)):
-    delete_stmt = delete(blocks).where(blocks.c.id == block_id)
+    delete_stmt = delete(blocks).where(blocks.c.id == block_id).returning(blocks)
     result = await session.execute(delete_stmt)
-    if result.rowcount == 0:
+    deleted_block = result.mappings().first()
+    if deleted_block is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Block not found")
     await session.commit()
+    hierarchy_cache.bump("blocks")
+    event_bus.publish("blocks", key=block_id, namespaces=("blocks",), action="deleted")
+    audit_trail.record("block", block_id, "deleted", before=deleted_block)
     return {"status": "success", "message": "Block deleted successfully"}
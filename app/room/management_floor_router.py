@@ -1,34 +1,62 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, insert, update, delete, func
+from sqlalchemy import select, insert, delete, func
+from app.audit import audit_actor, audit_trail, split_previous, update_returning_previous
+from app.cache import hierarchy_cache
 from app.database import get_async_session
+from app.events import event_bus
+from app.etag import etag
+from app.responses import Envelope, Message
 from app.room.models import floors, rooms, blocks
-from app.room.schemas import FloorCreate, FloorUpdate
+from app.room.schemas import BlockRead, BuildingTree, FloorCreate, FloorRead, FloorUpdate
+from app.room.tree import load_building_tree, shape_tree
 
 router = APIRouter(
     prefix="/management/floors",
     tags=["Management Floors"]
 )
 
-@router.get("/floors/{floor_id}/blocks/")
+
+# Всё здание одним ответом: этажи -> блоки -> комнаты с суммами вместимости и заселённости.
+# depth=1 — только этажи, 2 — с блоками, 3 — с комнатами; floor_id можно повторять
+@router.get("/tree", response_model=Envelope[BuildingTree], dependencies=[Depends(etag("floors", "blocks", "rooms"))])
+async def get_building_tree(depth: int = Query(3, ge=1, le=3), floor_id: Optional[List[int]] = Query(None),
+                            session: AsyncSession = Depends(get_async_session)):
+    tree = await hierarchy_cache.get_or_load(
+        ("building_tree",), lambda: load_building_tree(session), depends=("floors", "blocks", "rooms")
+    )
+    return {"status": "success", "data": shape_tree(tree, depth, set(floor_id or ())), "details": None}
+
+
+@router.get("/floors/{floor_id}/blocks/", response_model=Envelope[List[BlockRead]],
+            dependencies=[Depends(etag("blocks"))])
 async def get_blocks_by_floor_id(floor_id: int, session: AsyncSession = Depends(get_async_session)):
-    query = select(blocks).where(blocks.c.floor_id == floor_id).order_by(blocks.c.block_name)
-    result = await session.execute(query)
-    blocks_data = result.mappings().all()
+    async def load():
+        query = select(blocks).where(blocks.c.floor_id == floor_id).order_by(blocks.c.block_name)
+        result = await session.execute(query)
+        return [dict(row) for row in result.mappings().all()]
+
+    blocks_data = await hierarchy_cache.get_or_load(("floor_blocks", floor_id), load, depends=("blocks",))
 
     return {"status": "success", "data": blocks_data, "details": None}
 
 
 # Получение всех этажей, отсортировано по номеру этажа
-@router.get("/floors/")
+@router.get("/floors/", response_model=Envelope[List[FloorRead]], dependencies=[Depends(etag("floors"))])
 async def get_all_floors(session: AsyncSession = Depends(get_async_session)):
-    query = select(floors).order_by(floors.c.floor_number)
-    result = await session.execute(query)
-    return {"status": "success", "data": result.mappings().all(), "details": None}
+    async def load():
+        query = select(floors).order_by(floors.c.floor_number)
+        result = await session.execute(query)
+        return [dict(row) for row in result.mappings().all()]
+
+    floors_data = await hierarchy_cache.get_or_load(("floors",), load, depends=("floors",))
+    return {"status": "success", "data": floors_data, "details": None}
 
 
 # Получение конкретного этажа по ID
-@router.get("/floors/{floor_id}")
+@router.get("/floors/{floor_id}", response_model=Envelope[FloorRead], dependencies=[Depends(etag("floors"))])
 async def get_floor_by_id(floor_id: int, session: AsyncSession = Depends(get_async_session)):
     query = select(floors).where(floors.c.id == floor_id)
     result = await session.execute(query)
@@ -40,33 +68,44 @@ async def get_floor_by_id(floor_id: int, session: AsyncSession = Depends(get_asy
 
 
 # Создание нового этажа
-@router.post("/floors/")
+@router.post("/floors/", response_model=Envelope[FloorRead], dependencies=[Depends(audit_actor)])
 async def create_floor(floor_data: FloorCreate, session: AsyncSession = Depends(get_async_session)):
     stmt = insert(floors).values(**floor_data.dict()).returning(floors)
     result = await session.execute(stmt)
+    new_floor = result.mappings().first()
     await session.commit()
-    return {"status": "success", "data": result.mappings().first(), "details": None}
+    hierarchy_cache.bump("floors")
+    event_bus.publish("floors", namespaces=("floors",), action="created")
+    audit_trail.record("floor", new_floor["id"], "created", after=new_floor)
+    return {"status": "success", "data": new_floor, "details": None}
 
 
 # Обновление данных этажа
-@router.patch("/floors/{floor_id}")
+@router.patch("/floors/{floor_id}", response_model=Envelope[FloorRead], dependencies=[Depends(audit_actor)])
 async def update_floor(floor_id: int, floor_data: FloorUpdate, session: AsyncSession = Depends(get_async_session)):
-    update_stmt = update(floors).where(floors.c.id == floor_id).values(**floor_data.dict(exclude_unset=True)).returning(floors)
+    update_stmt = update_returning_previous(floors, floors.c.id == floor_id, floor_data.dict(exclude_unset=True))
     result = await session.execute(update_stmt)
     await session.commit()
-    updated_floor = result.mappings().first()
+    previous_floor, updated_floor = split_previous(result.mappings().first())
     if not updated_floor:
         raise HTTPException(status_code=404, detail="Этаж не найден")
+    hierarchy_cache.bump("floors")
+    event_bus.publish("floors", key=floor_id, namespaces=("floors",), action="updated")
+    audit_trail.record("floor", floor_id, "updated", before=previous_floor, after=updated_floor)
     return {"status": "success", "data": updated_floor, "details": None}
 
 
 # Удаление этажа
-@router.delete("/floors/{floor_id}")
+@router.delete("/floors/{floor_id}", response_model=Message, dependencies=[Depends(audit_actor)])
 async def delete_floor(floor_id: int, session: AsyncSession = Depends(get_async_session)):
-    delete_stmt = delete(floors).where(floors.c.id == floor_id)
+    delete_stmt = delete(floors).where(floors.c.id == floor_id).returning(floors)
     result = await session.execute(delete_stmt)
-    if result.rowcount == 0:
+    deleted_floor = result.mappings().first()
+    if deleted_floor is None:
         raise HTTPException(status_code=404, detail="Этаж не найден")
     await session.commit()
+    hierarchy_cache.bump("floors")
+    event_bus.publish("floors", key=floor_id, namespaces=("floors",), action="deleted")
+    audit_trail.record("floor", floor_id, "deleted", before=deleted_floor)
     return {"status": "success", "message": "Этаж удален успешно"}
 
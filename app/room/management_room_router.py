@@ -1,10 +1,18 @@
+from typing import List
+
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy import delete, update, insert
+from sqlalchemy import delete, insert
+from app.audit import audit_actor, audit_trail, split_previous, update_returning_previous
+from app.cache import hierarchy_cache
 from app.database import get_async_session
-from app.room.models import rooms, blocks, floors
-from app.room.schemas import RoomCreate, RoomUpdate
+from app.events import event_bus
+from app.etag import etag
+from app.pagination import PageParams, paginate, next_after, stream_ndjson
+from app.responses import Envelope, Message
+from app.responses import Envelope, Message, list_response
+from app.room.schemas import RoomCreate, RoomDetails, RoomRead, RoomUpdate
 
 router = APIRouter(
     prefix="/management/rooms",
@@ -13,8 +21,9 @@ router = APIRouter(
 
 
 # Получение всех комнат с информацией о блоке и этаже, отсортировано по номеру комнаты
-@router.get("/rooms/")
-async def get_all_rooms(session: AsyncSession = Depends(get_async_session)):
+@router.get("/rooms/", response_model=Envelope[List[RoomDetails]],
+            dependencies=[Depends(etag("rooms", "blocks", "floors"))])
+async def get_all_rooms(page: PageParams = Depends(), session: AsyncSession = Depends(get_async_session)):
     stmt = select(
         rooms.c.id,
         rooms.c.room_number,
@@ -24,23 +33,24 @@ async def get_all_rooms(session: AsyncSession = Depends(get_async_session)):
         floors.c.floor_number
     ).select_from(
         rooms.join(blocks).join(floors)
-    ).order_by(rooms.c.room_number)
-    result = await session.execute(stmt)
-    rooms_data = result.fetchall()
-    return {"status": "success", "data": [
-        {
-            "id": room.id,
-            "room_number": room.room_number,
-            "max_capacity": room.max_capacity,
-            "current_occupancy": room.current_occupancy,
-            "block_name": room.block_name,
-            "floor_number": room.floor_number
-        } for room in rooms_data
-    ], "details": None}
+    )
+    stmt = paginate(stmt, rooms.c.id, page, sort_column=rooms.c.room_number)
+    if page.stream:
+        return stream_ndjson(stmt)
+
+    async def load():
+        result = await session.execute(stmt)
+        return [dict(row) for row in result.mappings().all()]
+
+    rooms_data = await hierarchy_cache.get_or_load(
+        ("rooms", page.after, page.limit), load, depends=("rooms", "blocks", "floors")
+    )
+    return list_response(rooms_data, next_after=next_after(rooms_data, page, sort_key="room_number"))
 
 
 # Получение комнаты по ID с информацией о блоке и этаже, отсортировано по номеру комнаты
-@router.get("/rooms/{room_id}")
+@router.get("/rooms/{room_id}", response_model=Envelope[RoomDetails],
+            dependencies=[Depends(etag("rooms", "blocks", "floors"))])
 async def get_room_by_id(room_id: int, session: AsyncSession = Depends(get_async_session)):
     stmt = select(
         rooms.c.id,
@@ -53,45 +63,49 @@ async def get_room_by_id(room_id: int, session: AsyncSession = Depends(get_async
         rooms.join(blocks).join(floors)
     ).where(rooms.c.id == room_id).order_by(rooms.c.room_number)
     result = await session.execute(stmt)
-    room_data = result.fetchone()
+    room_data = result.mappings().first()
     if not room_data:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Room not found")
-    return {"status": "success", "data": {
-        "id": room_data.id,
-        "room_number": room_data.room_number,
-        "max_capacity": room_data.max_capacity,
-        "current_occupancy": room_data.current_occupancy,
-        "block_name": room_data.block_name,
-        "floor_number": room_data.floor_number
-    }, "details": None}
+    return {"status": "success", "data": room_data, "details": None}
 
 # Создание новой комнаты
-@router.post("/rooms/")
+@router.post("/rooms/", response_model=Envelope[RoomRead], dependencies=[Depends(audit_actor)])
 async def create_room(room_data: RoomCreate, session: AsyncSession = Depends(get_async_session)):
-    stmt = insert(rooms).values(**room_data.dict()).returning(rooms)
+    stmt = insert(rooms).values(**room_data.dict(), current_occupancy=0).returning(rooms)
     result = await session.execute(stmt)
+    new_room = result.mappings().first()
     await session.commit()
-    return {"status": "success", "message": "Room created successfully", "data": result.mappings().first()}
+    hierarchy_cache.bump("rooms")
+    event_bus.publish("rooms", key=new_room["id"], namespaces=("rooms",), action="created")
+    audit_trail.record("room", new_room["id"], "created", after=new_room)
+    return {"status": "success", "message": "Room created successfully", "data": new_room}
 
 
 # Обновление данных комнаты
-@router.patch("/rooms/{room_id}")
+@router.patch("/rooms/{room_id}", response_model=Envelope[RoomRead], dependencies=[Depends(audit_actor)])
 async def update_room(room_id: int, room_data: RoomUpdate, session: AsyncSession = Depends(get_async_session)):
-    update_stmt = update(rooms).where(rooms.c.id == room_id).values(**room_data.dict(exclude_unset=True)).returning(rooms)
+    update_stmt = update_returning_previous(rooms, rooms.c.id == room_id, room_data.dict(exclude_unset=True))
     result = await session.execute(update_stmt)
     await session.commit()
-    updated_room = result.mappings().first()
+    previous_room, updated_room = split_previous(result.mappings().first())
     if not updated_room:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Room not found")
+    hierarchy_cache.bump("rooms")
+    event_bus.publish("rooms", key=room_id, namespaces=("rooms",), action="updated")
+    audit_trail.record("room", room_id, "updated", before=previous_room, after=updated_room)
     return {"status": "success", "message": "Room updated successfully", "data": updated_room}
 
 
 # Удаление комнаты
-@router.delete("/rooms/{room_id}")
+@router.delete("/rooms/{room_id}", response_model=Message, dependencies=[Depends(audit_actor)])
 async def delete_room(room_id: int, session: AsyncSession = Depends(get_async_session)):
-    delete_stmt = delete(rooms).where(rooms.c.id == room_id)
+    delete_stmt = delete(rooms).where(rooms.c.id == room_id).returning(rooms)
     result = await session.execute(delete_stmt)
-    if result.rowcount == 0:
+    deleted_room = result.mappings().first()
+    if deleted_room is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Room not found")
     await session.commit()
+    hierarchy_cache.bump("rooms")
+    event_bus.publish("rooms", key=room_id, namespaces=("rooms",), action="deleted")
+    audit_trail.record("room", room_id, "deleted", before=deleted_room)
     return {"status": "success", "message": "Room deleted successfully"}
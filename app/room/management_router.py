@@ -1,11 +1,24 @@
-from fastapi import APIRouter, Depends, HTTPException
+from datetime import date
+from typing import Any, Dict, List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, join, func, alias
+from sqlalchemy import select, join, alias
+from app.audit import audit_actor, audit_trail
+from app.cache import hierarchy_cache, user_cache
 from app.database import get_async_session
+from app.events import event_bus
+from app.etag import etag
+from app.responses import Envelope
+from app.ratings.ranking import rating_ranking
+from app.room.allocation import allocate_rooms
+from app.room.documents import render, render_check_in, render_relocation, document_response, zip_response
 from app.room.models import rooms, blocks, floors
+from app.room.occupancy import load_occupancy_summary, reconcile_occupancy, publish_reconciled
+from app.room.schemas import AllocationReport, AvailableRoom, FloorsSummary, OccupancyDrift
+from app.residents.history import occupants_on, previous_room_id
 from app.residents.models import residents
-from docx import Document
-from fastapi.responses import FileResponse
+from app.residents.schemas import OccupantOnDate, RoomResident
 
 
 router = APIRouter(
@@ -13,143 +26,170 @@ router = APIRouter(
     tags=["Management"]
 )
 
-@router.get("/residents/{resident_id}/check-in-document")
+@router.get("/residents/{resident_id}/check-in-document", response_class=Response)
 async def create_check_in_document(resident_id: int, session: AsyncSession = Depends(get_async_session)):
-    async with session.begin():
-        # Подготовка запроса для загрузки информации о жителе и его текущей комнате
-        stmt = select(
-            residents.c.full_name,
-            residents.c.date_of_check_in,
-            residents.c.date_of_check_out,
-            rooms.c.room_number,
-            blocks.c.block_name,
-            floors.c.floor_number
-        ).select_from(
-            residents
-            .join(rooms, rooms.c.id == residents.c.room_id)
-            .join(blocks, blocks.c.id == rooms.c.block_id)
-            .join(floors, floors.c.id == blocks.c.floor_id)
-        ).where(residents.c.id == resident_id)
-
-        result = await session.execute(stmt)
-        data = result.first()
-
-        if not data:
-            raise HTTPException(status_code=404, detail="Resident not found")
-
-        # Создание документа
-        doc = Document()
-        doc.add_heading('Check-In Notification', level=1)
-        paragraph = doc.add_paragraph()
-        paragraph.add_run('Resident Name: ').bold = True
-        paragraph.add_run(f'{data.full_name}\n')
-        paragraph.add_run('Room Number: ').bold = True
-        paragraph.add_run(f'{data.room_number} (Block: {data.block_name}, Floor: {data.floor_number})\n')
-        paragraph.add_run('Date of Check-In: ').bold = True
-        paragraph.add_run(f'{data.date_of_check_in}\n')
-        paragraph.add_run('Date of Check-Out: ').bold = True
-        paragraph.add_run(f'{data.date_of_check_out}\n')
-
-        # Сохранение документа
-        file_path = f'check_in_notice_{resident_id}.docx'
-        doc.save(file_path)
-
-        return FileResponse(path=file_path, filename=file_path)
-
-@router.get("/residents/{resident_id}/relocation-document")
-async def create_relocation_document(resident_id: int, old_room_id: int, session: AsyncSession = Depends(get_async_session)):
-    async with session.begin():
-        # Создание псевдонимов для таблиц для использования в запросе
-        old_rooms = alias(rooms)
-        old_blocks = alias(blocks)
-        old_floors = alias(floors)
-
-        # Подготовка запроса для загрузки информации о жителе и его текущей и старой комнате
-        resident_info = select(
-            residents.c.full_name,
-            rooms.c.room_number.label("current_room_number"),
-            blocks.c.block_name.label("current_block_name"),
-            floors.c.floor_number.label("current_floor_number"),
-            old_rooms.c.room_number.label("old_room_number"),
-            old_blocks.c.block_name.label("old_block_name"),
-            old_floors.c.floor_number.label("old_floor_number")
-        ).select_from(
-            residents
-            .join(rooms, rooms.c.id == residents.c.room_id)
-            .join(blocks, blocks.c.id == rooms.c.block_id)
-            .join(floors, floors.c.id == blocks.c.floor_id)
-            .join(old_rooms, old_rooms.c.id == old_room_id, isouter=True)
-            .join(old_blocks, old_blocks.c.id == old_rooms.c.block_id, isouter=True)
-            .join(old_floors, old_floors.c.id == old_blocks.c.floor_id, isouter=True)
-        ).where(
-            residents.c.id == resident_id
-        )
+    # Подготовка запроса для загрузки информации о жителе и его текущей комнате
+    stmt = select(
+        residents.c.full_name,
+        residents.c.date_of_check_in,
+        residents.c.date_of_check_out,
+        rooms.c.room_number,
+        blocks.c.block_name,
+        floors.c.floor_number
+    ).select_from(
+        residents
+        .join(rooms, rooms.c.id == residents.c.room_id)
+        .join(blocks, blocks.c.id == rooms.c.block_id)
+        .join(floors, floors.c.id == blocks.c.floor_id)
+    ).where(residents.c.id == resident_id)
+
+    result = await session.execute(stmt)
+    data = result.mappings().first()
+
+    if not data:
+        raise HTTPException(status_code=404, detail="Resident not found")
+
+    # Документ формируется в пуле процессов и отдаётся из памяти, без файла на диске
+    content = await render(render_check_in, dict(data))
+    return document_response(content, f'check_in_notice_{resident_id}.docx')
+
+# Уведомления о заселении для этажа, блока или списка жителей одним ZIP-архивом
+@router.get("/documents/check-in", response_class=Response)
+async def export_check_in_documents(floor_id: Optional[int] = None, block_id: Optional[int] = None,
+                                    resident_ids: Optional[List[int]] = Query(None),
+                                    session: AsyncSession = Depends(get_async_session)):
+    if floor_id is None and block_id is None and not resident_ids:
+        raise HTTPException(status_code=400, detail="Specify floor_id, block_id or resident_ids")
+
+    # Все жители выбираются одним запросом вместо отдельного запроса на каждый документ
+    stmt = select(
+        residents.c.id,
+        residents.c.full_name,
+        residents.c.date_of_check_in,
+        residents.c.date_of_check_out,
+        rooms.c.room_number,
+        blocks.c.block_name,
+        floors.c.floor_number
+    ).select_from(
+        residents
+        .join(rooms, rooms.c.id == residents.c.room_id)
+        .join(blocks, blocks.c.id == rooms.c.block_id)
+        .join(floors, floors.c.id == blocks.c.floor_id)
+    ).order_by(floors.c.floor_number, blocks.c.block_name, rooms.c.room_number, residents.c.id)
+    if floor_id is not None:
+        stmt = stmt.where(floors.c.id == floor_id)
+    if block_id is not None:
+        stmt = stmt.where(blocks.c.id == block_id)
+    if resident_ids:
+        stmt = stmt.where(residents.c.id.in_(resident_ids))
+
+    result = await session.execute(stmt)
+    rows = result.mappings().all()
+    if not rows:
+        raise HTTPException(status_code=404, detail="No residents found")
+
+    entries = [(f"check_in_notice_{row['id']}.docx", dict(row)) for row in rows]
+    return zip_response(render_check_in, entries, "check_in_notices.zip")
+
+
+@router.get("/residents/{resident_id}/relocation-document", response_class=Response)
+async def create_relocation_document(resident_id: int, old_room_id: Optional[int] = None,
+                                     session: AsyncSession = Depends(get_async_session)):
+    # Без old_room_id прежняя комната берётся из истории проживания
+    old_room = old_room_id if old_room_id is not None else previous_room_id(resident_id)
+
+    # Создание псевдонимов для таблиц для использования в запросе
+    old_rooms = alias(rooms)
+    old_blocks = alias(blocks)
+    old_floors = alias(floors)
+
+    # Подготовка запроса для загрузки информации о жителе и его текущей и старой комнате
+    resident_info = select(
+        residents.c.full_name,
+        rooms.c.room_number.label("current_room_number"),
+        blocks.c.block_name.label("current_block_name"),
+        floors.c.floor_number.label("current_floor_number"),
+        old_rooms.c.room_number.label("old_room_number"),
+        old_blocks.c.block_name.label("old_block_name"),
+        old_floors.c.floor_number.label("old_floor_number")
+    ).select_from(
+        residents
+        .join(rooms, rooms.c.id == residents.c.room_id)
+        .join(blocks, blocks.c.id == rooms.c.block_id)
+        .join(floors, floors.c.id == blocks.c.floor_id)
+        .join(old_rooms, old_rooms.c.id == old_room, isouter=True)
+        .join(old_blocks, old_blocks.c.id == old_rooms.c.block_id, isouter=True)
+        .join(old_floors, old_floors.c.id == old_blocks.c.floor_id, isouter=True)
+    ).where(
+        residents.c.id == resident_id
+    )
 
-        result = await session.execute(resident_info)
-        data = result.first()
+    result = await session.execute(resident_info)
+    data = result.mappings().first()
 
-        if not data:
-            raise HTTPException(status_code=404, detail="Resident or room not found")
+    if not data:
+        raise HTTPException(status_code=404, detail="Resident or room not found")
 
-        # Создание документа
-        doc = Document()
-        doc.add_heading('Notification of Relocation', level=1)
-        paragraph = doc.add_paragraph()
-        paragraph.add_run('Resident Name: ').bold = True
-        paragraph.add_run(f'{data.full_name}\n')
-        paragraph.add_run('From Room: ').bold = True
-        paragraph.add_run(f'{data.old_room_number} (Block: {data.old_block_name}, Floor: {data.old_floor_number})\n')
-        paragraph.add_run('To Room: ').bold = True
-        paragraph.add_run(f'{data.current_room_number} (Block: {data.current_block_name}, Floor: {data.current_floor_number})\n')
+    content = await render(render_relocation, dict(data))
+    return document_response(content, f'relocation_notice_{resident_id}.docx')
 
-        # Сохранение документа
-        file_path = f'relocation_notice_{resident_id}.docx'
-        doc.save(file_path)
 
-        return FileResponse(path=file_path, filename=file_path)
 
+# Жители комнаты, блока, этажа или всего общежития на дату по истории проживания
+@router.get("/occupancy/on", response_model=Envelope[List[OccupantOnDate]])
+async def get_occupants_on_date(on: date, room_id: Optional[int] = None, block_id: Optional[int] = None,
+                                floor_id: Optional[int] = None, session: AsyncSession = Depends(get_async_session)):
+    occupants = await occupants_on(session, on, room_id=room_id, block_id=block_id, floor_id=floor_id)
+    return {"status": "success", "data": occupants, "details": {"on": on, "occupancy": len(occupants)}}
 
 
-@router.get("/summary/all/")
+@router.get("/summary/all/", response_model=FloorsSummary, dependencies=[Depends(etag("rooms", "blocks", "floors"))])
 async def get_floors_summary(session: AsyncSession = Depends(get_async_session)):
-    # Запрос для получения суммарного количества живущих на всех этажах
-    occupancy_query = (
-        select(func.sum(rooms.c.current_occupancy))
-        .select_from(
-            rooms.join(blocks, rooms.c.block_id == blocks.c.id)
-            .join(floors, blocks.c.floor_id == floors.c.id)
-        )
+    # Итоги по этажам, блокам и по зданию одним запросом с GROUPING SETS; результат кэшируется
+    # до изменения комнат (в том числе заселённости через жителей), блоков или этажей
+    summary = await hierarchy_cache.get_or_load(
+        ("floors_summary",), lambda: load_occupancy_summary(session), depends=("rooms", "blocks", "floors")
     )
-
-    capacity_query = (
-        select(func.sum(rooms.c.max_capacity))
-        .select_from(
-            rooms.join(blocks, rooms.c.block_id == blocks.c.id)
-            .join(floors, blocks.c.floor_id == floors.c.id)
-        )
-    )
-
-    # Выполнение запросов
-    result_occupancy = await session.execute(occupancy_query)
-    result_capacity = await session.execute(capacity_query)
-
-    # Получение результатов
-    total_occupancy = result_occupancy.scalar()
-    total_capacity = result_capacity.scalar()
-
-    if total_occupancy is None:
-        total_occupancy = 0
-
-    if total_capacity is None:
-        total_capacity = 0
-
-    return {
-        "total_occupancy": total_occupancy,
-        "total_capacity": total_capacity
-    }
-
-
-@router.get("/available_rooms/")
+    return summary
+
+
+# Пересчёт заселённости комнат по таблице жителей с отчётом о расхождениях
+@router.post("/occupancy/reconcile", response_model=Envelope[List[OccupancyDrift]],
+             dependencies=[Depends(audit_actor)])
+async def reconcile_rooms_occupancy(dry_run: bool = False, session: AsyncSession = Depends(get_async_session)):
+    drift = await reconcile_occupancy(session, dry_run=dry_run)
+    if drift and not dry_run:
+        publish_reconciled(drift)
+    return {"status": "success", "data": drift, "details": {"dry_run": dry_run, "drifted_rooms": len(drift)}}
+
+
+# Автоматическое распределение всех жителей без комнаты: пол в комнате один, одногруппники
+# и однокурсники селятся вместе, частично занятые комнаты и блоки доселяются первыми
+@router.post("/allocation", response_model=Envelope[AllocationReport], dependencies=[Depends(audit_actor)])
+async def allocate_unassigned_residents(dry_run: bool = True, session: AsyncSession = Depends(get_async_session)):
+    report = await allocate_rooms(session, dry_run=dry_run)
+    if report["assigned"] and not dry_run:
+        hierarchy_cache.bump("rooms")
+        event_bus.publish("occupancy", namespaces=("rooms",), action="allocated")
+        rating_ranking.invalidate()
+        event_bus.publish("ratings", namespaces=("ratings",), action="allocated")
+        audit_trail.record("resident", None, "allocated", after={
+            assignment["resident_id"]: assignment["room_id"] for assignment in report["assignments"]
+        })
+    return {"status": "success", "data": report, "details": None}
+
+
+# Счётчики попаданий и промахов кэшей иерархии здания и пользователей
+@router.get("/cache/stats", response_model=Envelope[Dict[str, Dict[str, Any]]])
+async def get_cache_stats():
+    return {"status": "success", "data": {
+        "hierarchy": hierarchy_cache.stats(),
+        "users": user_cache.stats(),
+    }, "details": None}
+
+
+@router.get("/available_rooms/", response_model=Envelope[List[AvailableRoom]],
+            dependencies=[Depends(etag("rooms", "blocks", "floors"))])
 async def get_available_rooms(session: AsyncSession = Depends(get_async_session)):
     # Запрос для получения доступных комнат с информацией о номере этажа и названии блока
     query = (
@@ -171,7 +211,7 @@ async def get_available_rooms(session: AsyncSession = Depends(get_async_session)
     return {"status": "success", "data": available_rooms, "details": None}
 
 
-@router.get("/rooms/{room_id}/residents")
+@router.get("/rooms/{room_id}/residents", response_model=Envelope[List[RoomResident]])
 async def get_residents_by_room_id(room_id: int, session: AsyncSession = Depends(get_async_session)):
     result = await session.execute(
         select(
@@ -198,38 +238,6 @@ async def get_residents_by_room_id(room_id: int, session: AsyncSession = Depends
         .join(floors, floors.c.id == blocks.c.floor_id)
         .where(rooms.c.id == room_id)
     )
-    residents_data = result.mappings().all()
-
-    # Изменим поведение для случая отсутствия жителей, возвращая пустой массив вместо ошибки
-    if not residents_data:
-        return {
-            "status": "success",
-            "data": []
-        }
-
-    # Возвращаем данные жителей, если они есть
-    return {
-        "status": "success",
-        "data": [
-            {
-                "id": resident.id,
-                "full_name": resident.full_name,
-                "gender": resident.gender,
-                "role": resident.role,
-                "citizenship": resident.citizenship,
-                "faculty": resident.faculty,
-                "group_number": resident.group_number,
-                "date_of_check_in": resident.date_of_check_in.isoformat() if resident.date_of_check_in else None,
-                "date_of_check_out": resident.date_of_check_out.isoformat() if resident.date_of_check_out else None,
-                "email": resident.email,
-                "status": resident.status,
-                "room_number": resident.room_number,
-                "max_capacity": resident.max_capacity,
-                "current_occupancy": resident.current_occupancy,
-                "block_name": resident.block_name,
-                "floor_number": resident.floor_number
-
-            } for resident in residents_data
-        ]
-    }
+    # Для комнаты без жителей возвращается пустой массив вместо ошибки; строки кодируются orjson как есть
+    return {"status": "success", "data": result.mappings().all()}
 
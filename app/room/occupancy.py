@@ -0,0 +1,175 @@
+import argparse
+import asyncio
+
+from sqlalchemy import and_, func, literal_column, or_, select, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+
+from app.audit import audit_trail
+from app.cache import hierarchy_cache
+from app.config import OCCUPANCY_RECONCILE_INTERVAL
+from app.database import async_session_maker, engine
+from app.events import event_bus
+from app.residents.models import residents, OCCUPANCY_TRIGGER_DDL
+from app.room.models import rooms, blocks, floors
+from app.scheduler import PeriodicJob
+
+# Ключ advisory-блокировки плановой сверки заселённости
+OCCUPANCY_RECONCILE_LOCK = 720_002
+
+
+def _actual_occupancy():
+    # Фактическое число жильцов в каждой комнате, посчитанное по таблице residents
+    is_occupant = and_(
+        residents.c.room_id == rooms.c.id,
+        or_(residents.c.date_of_check_out.is_(None), residents.c.date_of_check_out > func.current_date()),
+    )
+    return (
+        select(rooms.c.id.label("room_id"), func.count(residents.c.id).label("occupancy"))
+        .select_from(rooms.outerjoin(residents, is_occupant))
+        .group_by(rooms.c.id)
+        .cte("actual")
+    )
+
+
+def _totals(row):
+    occupancy, capacity = row.occupancy or 0, row.capacity or 0
+    return {
+        "occupancy": occupancy,
+        "capacity": capacity,
+        "free_beds": max(capacity - occupancy, 0),
+        "utilization": round(occupancy / capacity * 100, 2) if capacity else 0.0,
+        "rooms_count": row.rooms_count,
+    }
+
+
+async def load_occupancy_summary(session: AsyncSession):
+    # Один проход по комнатам: GROUPING SETS даёт строки по блокам, по этажам и общую,
+    # grouping() отличает уровень строки (1 — колонка в этой строке свёрнута)
+    floor_key = (floors.c.id, floors.c.floor_number)
+    block_key = (blocks.c.id, blocks.c.block_name)
+    stmt = (
+        select(
+            floors.c.id.label("floor_id"),
+            floors.c.floor_number,
+            blocks.c.id.label("block_id"),
+            blocks.c.block_name,
+            func.sum(func.coalesce(rooms.c.current_occupancy, 0)).label("occupancy"),
+            func.sum(func.coalesce(rooms.c.max_capacity, 0)).label("capacity"),
+            func.count(rooms.c.id).label("rooms_count"),
+            func.grouping(floors.c.id).label("floor_rollup"),
+            func.grouping(blocks.c.id).label("block_rollup"),
+        )
+        .select_from(
+            rooms.join(blocks, rooms.c.block_id == blocks.c.id)
+            .join(floors, blocks.c.floor_id == floors.c.id)
+        )
+        .group_by(func.grouping_sets(tuple_(*floor_key, *block_key), tuple_(*floor_key), literal_column("()")))
+        .order_by(floors.c.floor_number, floors.c.id, blocks.c.block_name, blocks.c.id)
+    )
+    result = await session.execute(stmt)
+
+    summary = {"total_occupancy": 0, "total_capacity": 0, "free_beds": 0, "utilization": 0.0,
+               "floors": [], "blocks": []}
+    for row in result:
+        totals = _totals(row)
+        if row.floor_rollup:
+            summary.update(total_occupancy=totals["occupancy"], total_capacity=totals["capacity"],
+                           free_beds=totals["free_beds"], utilization=totals["utilization"])
+        elif row.block_rollup:
+            summary["floors"].append({"floor_id": row.floor_id, "floor_number": row.floor_number, **totals})
+        else:
+            summary["blocks"].append({"floor_id": row.floor_id, "floor_number": row.floor_number,
+                                      "block_id": row.block_id, "block_name": row.block_name, **totals})
+    return summary
+
+
+async def reconcile_occupancy(session: AsyncSession, dry_run: bool = False):
+    # Пересчёт current_occupancy всех комнат одним запросом; возвращает комнаты, где счётчик расходился
+    actual = _actual_occupancy()
+    if dry_run:
+        stmt = (
+            select(
+                rooms.c.id.label("room_id"),
+                rooms.c.current_occupancy.label("previous_occupancy"),
+                actual.c.occupancy.label("current_occupancy"),
+            )
+            .select_from(rooms.join(actual, actual.c.room_id == rooms.c.id))
+            .where(rooms.c.current_occupancy.is_distinct_from(actual.c.occupancy))
+            .order_by(rooms.c.id)
+        )
+        result = await session.execute(stmt)
+        return result.mappings().all()
+
+    result = await session.execute(_reconcile_statement(actual))
+    drift = result.mappings().all()
+    await session.commit()
+    return sorted(drift, key=lambda row: row["room_id"])
+
+
+def _reconcile_statement(actual):
+    # Самосоединение с previous нужно, чтобы RETURNING вернул значение до обновления
+    previous = rooms.alias("previous")
+    return (
+        update(rooms)
+        .where(
+            rooms.c.id == actual.c.room_id,
+            previous.c.id == rooms.c.id,
+            previous.c.current_occupancy.is_distinct_from(actual.c.occupancy),
+        )
+        .values(current_occupancy=actual.c.occupancy)
+        .returning(
+            rooms.c.id.label("room_id"),
+            previous.c.current_occupancy.label("previous_occupancy"),
+            rooms.c.current_occupancy,
+        )
+    )
+
+
+async def reconcile_occupancy_batch(conn: AsyncConnection):
+    # Триггеры пересчитывают счётчик только при изменении residents, а выезд с датой в будущем
+    # наступает без записи в таблицу. Поэтому пересчёт запускается ещё и по расписанию
+    result = await conn.execute(_reconcile_statement(_actual_occupancy()))
+    return result.mappings().all()
+
+
+def publish_reconciled(drift):
+    hierarchy_cache.bump("rooms")
+    event_bus.publish("occupancy", namespaces=("rooms",), action="reconciled")
+    audit_trail.record("room", None, "reconciled",
+                       before={row["room_id"]: row["previous_occupancy"] for row in drift},
+                       after={row["room_id"]: row["current_occupancy"] for row in drift})
+
+
+occupancy_reconcile_job = PeriodicJob("occupancy_reconcile", OCCUPANCY_RECONCILE_INTERVAL, reconcile_occupancy_batch,
+                                      lock_key=OCCUPANCY_RECONCILE_LOCK, after_commit=publish_reconciled)
+
+
+async def install_occupancy_triggers():
+    # Установка триггеров в уже существующую базу (create_all делает это сам)
+    async with engine.begin() as conn:
+        for ddl in OCCUPANCY_TRIGGER_DDL:
+            await conn.execute(ddl)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Обслуживание счётчиков заселённости комнат")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("install", help="Установить триггеры пересчёта заселённости")
+    reconcile_parser = subparsers.add_parser("reconcile", help="Пересчитать заселённость всех комнат")
+    reconcile_parser.add_argument("--dry-run", action="store_true", help="Только показать расхождения")
+    args = parser.parse_args()
+
+    if args.command == "install":
+        await install_occupancy_triggers()
+        print("Occupancy triggers installed")
+    else:
+        async with async_session_maker() as session:
+            drift = await reconcile_occupancy(session, dry_run=args.dry_run)
+        for row in drift:
+            print(f"room {row['room_id']}: {row['previous_occupancy']} -> {row['current_occupancy']}")
+        print(f"{len(drift)} room(s) {'drifted' if args.dry_run else 'reconciled'}")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import Dict, List, Optional
 from pydantic import BaseModel
 
 
@@ -23,15 +23,129 @@ class BlockUpdate(BaseModel):
 
 
 # Схемы для комнат
+# current_occupancy не принимается от клиента: счётчик ведут триггеры таблицы residents
 class RoomCreate(BaseModel):
     block_id: int
     room_number: int
     max_capacity: int
-    current_occupancy: int
 
 
 class RoomUpdate(BaseModel):
     block_id: Optional[int] = None
     room_number: Optional[int] = None
     max_capacity: Optional[int] = None
+
+
+# Схемы ответов
+class FloorRead(BaseModel):
+    id: int
+    floor_number: Optional[int] = None
+
+
+class BlockRead(BaseModel):
+    id: int
+    floor_id: Optional[int] = None
+    block_name: Optional[str] = None
+
+
+class RoomRead(BaseModel):
+    id: int
+    block_id: Optional[int] = None
+    room_number: Optional[int] = None
+    max_capacity: Optional[int] = None
+    current_occupancy: Optional[int] = None
+
+
+class RoomDetails(BaseModel):
+    id: int
+    room_number: Optional[int] = None
+    max_capacity: Optional[int] = None
     current_occupancy: Optional[int] = None
+    block_name: Optional[str] = None
+    floor_number: Optional[int] = None
+
+
+class AvailableRoom(RoomDetails):
+    block_id: Optional[int] = None
+
+
+class OccupancyDrift(BaseModel):
+    room_id: int
+    previous_occupancy: Optional[int] = None
+    current_occupancy: int
+
+
+class OccupancyTotals(BaseModel):
+    occupancy: int
+    capacity: int
+    free_beds: int
+    utilization: float
+    rooms_count: int
+
+
+class FloorOccupancy(OccupancyTotals):
+    floor_id: int
+    floor_number: Optional[int] = None
+
+
+class BlockOccupancy(FloorOccupancy):
+    block_id: int
+    block_name: Optional[str] = None
+
+
+class FloorsSummary(BaseModel):
+    total_occupancy: int
+    total_capacity: int
+    free_beds: int
+    utilization: float
+    floors: List[FloorOccupancy]
+    blocks: List[BlockOccupancy]
+
+
+class Allocation(BaseModel):
+    resident_id: int
+    room_id: int
+
+
+class AllocationReport(BaseModel):
+    dry_run: bool
+    residents: int
+    assigned: int
+    unassigned: Dict[str, int]
+    rooms_used: int
+    skipped_rooms: List[int]
+    assignments: List[Allocation]
+    elapsed_seconds: float
+
+
+# Дерево здания: этажи -> блоки -> комнаты с суммарной вместимостью и заселённостью
+class RoomNode(BaseModel):
+    id: int
+    room_number: Optional[int] = None
+    max_capacity: int
+    current_occupancy: int
+
+
+class BlockNode(BaseModel):
+    id: int
+    block_name: Optional[str] = None
+    capacity: int
+    occupancy: int
+    rooms_count: int
+    rooms: Optional[List[RoomNode]] = None
+
+
+class FloorNode(BaseModel):
+    id: int
+    floor_number: Optional[int] = None
+    capacity: int
+    occupancy: int
+    rooms_count: int
+    blocks: Optional[List[BlockNode]] = None
+
+
+class BuildingTree(BaseModel):
+    capacity: int
+    occupancy: int
+    rooms_count: int
+    floors: List[FloorNode]
@@ -0,0 +1,71 @@
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.room.models import rooms, blocks, floors
+
+
+async def load_building_tree(session: AsyncSession):
+    # Всё здание одним запросом с LEFT JOIN (этажи без блоков и блоки без комнат тоже попадают в дерево),
+    # строки упорядочены, поэтому дерево собирается за один проход
+    stmt = (
+        select(
+            floors.c.id.label("floor_id"),
+            floors.c.floor_number,
+            blocks.c.id.label("block_id"),
+            blocks.c.block_name,
+            rooms.c.id.label("room_id"),
+            rooms.c.room_number,
+            func.coalesce(rooms.c.max_capacity, 0).label("max_capacity"),
+            func.coalesce(rooms.c.current_occupancy, 0).label("current_occupancy"),
+        )
+        .select_from(
+            floors
+            .outerjoin(blocks, blocks.c.floor_id == floors.c.id)
+            .outerjoin(rooms, rooms.c.block_id == blocks.c.id)
+        )
+        .order_by(floors.c.floor_number, floors.c.id, blocks.c.block_name, blocks.c.id, rooms.c.room_number, rooms.c.id)
+    )
+    result = await session.execute(stmt)
+
+    tree = {"capacity": 0, "occupancy": 0, "rooms_count": 0, "floors": []}
+    floor = block = None
+    for row in result:
+        if floor is None or floor["id"] != row.floor_id:
+            floor = {"id": row.floor_id, "floor_number": row.floor_number,
+                     "capacity": 0, "occupancy": 0, "rooms_count": 0, "blocks": []}
+            tree["floors"].append(floor)
+            block = None
+        if row.block_id is None:
+            continue
+        if block is None or block["id"] != row.block_id:
+            block = {"id": row.block_id, "block_name": row.block_name,
+                     "capacity": 0, "occupancy": 0, "rooms_count": 0, "rooms": []}
+            floor["blocks"].append(block)
+        if row.room_id is None:
+            continue
+        block["rooms"].append({"id": row.room_id, "room_number": row.room_number,
+                               "max_capacity": row.max_capacity, "current_occupancy": row.current_occupancy})
+        for node in (block, floor, tree):
+            node["capacity"] += row.max_capacity
+            node["occupancy"] += row.current_occupancy
+            node["rooms_count"] += 1
+    return tree
+
+
+def shape_tree(tree, depth: int, floor_ids=None):
+    # Срез закэшированного дерева: только нужные этажи и уровни вложенности, без изменения самого кэша
+    selected = [floor for floor in tree["floors"] if not floor_ids or floor["id"] in floor_ids]
+    if floor_ids:
+        totals = {key: sum(floor[key] for floor in selected) for key in ("capacity", "occupancy", "rooms_count")}
+    else:
+        totals = {key: tree[key] for key in ("capacity", "occupancy", "rooms_count")}
+
+    if depth >= 3:
+        floors_data = selected
+    elif depth == 2:
+        floors_data = [
+            {**floor, "blocks": [{**block, "rooms": None} for block in floor["blocks"]]} for floor in selected
+        ]
+    else:
+        floors_data = [{**floor, "blocks": None} for floor in selected]
+    return {**totals, "floors": floors_data}
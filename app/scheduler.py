@@ -0,0 +1,158 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import Column, DateTime, String, Table, func, select
+from sqlalchemy.dialects.postgresql import insert
+
+from app.database import engine, metadata
+
+logger = logging.getLogger(__name__)
+
+# Время последнего запуска каждой задачи во всём кластере: каждый процесс просыпается раз в interval,
+# но задача выполняется, только если с прошлого запуска в любом процессе прошло не меньше interval
+scheduled_jobs = Table(
+    "scheduled_jobs",
+    metadata,
+    Column("name", String(100), primary_key=True),
+    Column("last_run_at", DateTime, nullable=False)
+)
+
+
+class PeriodicJob:
+    # Задача, которая запускается в процессе приложения раз в interval секунд. job(conn) выполняет
+    # одну порцию работы в уже открытой транзакции и возвращает список обработанных строк;
+    # after_commit(rows) вызывается после фиксации порции (например, для рассылки событий).
+    # При заданном batch_size порции повторяются, пока очередная не окажется неполной.
+    # Если задан lock_key, каждая транзакция сначала берёт pg_try_advisory_xact_lock: при нескольких
+    # процессах uvicorn остальные пропускают запуск. Блокировка уровня транзакции снимается при
+    # COMMIT на том же серверном соединении, поэтому работает и за PgBouncer в режиме transaction pooling.
+    # Первая порция запуска ещё и занимает строку задачи в scheduled_jobs; если задача уже выполнялась
+    # в этом интервале (в том числе другим процессом), запуск пропускается. При ошибке первой порции
+    # отметка откатывается вместе с ней
+    def __init__(self, name: str, interval: float, job, lock_key: int = None, batch_size: int = None,
+                 after_commit=None):
+        self.name = name
+        self.interval = interval
+        self.job = job
+        self.lock_key = lock_key
+        self.batch_size = batch_size
+        self.after_commit = after_commit
+        self.runs = 0
+        self.skipped = 0
+        self.failures = 0
+        self.rows_total = 0
+        self.last_rows = 0
+        self.last_duration = 0.0
+        self.last_run_at = None
+        self._task = None
+
+    async def _claim(self, conn):
+        now = func.localtimestamp()
+        stmt = (
+            insert(scheduled_jobs)
+            .values(name=self.name, last_run_at=now)
+            .on_conflict_do_update(
+                index_elements=[scheduled_jobs.c.name],
+                set_={"last_run_at": now},
+                where=scheduled_jobs.c.last_run_at <= now - timedelta(seconds=self.interval),
+            )
+            .returning(scheduled_jobs.c.name)
+        )
+        return await conn.scalar(stmt) is not None
+
+    async def _run_batch(self, claim: bool):
+        async with engine.begin() as conn:
+            if self.lock_key is not None:
+                locked = await conn.scalar(select(func.pg_try_advisory_xact_lock(self.lock_key)))
+                if not locked:
+                    return None
+            if claim and not await self._claim(conn):
+                return None
+            rows = await self.job(conn)
+        if rows and self.after_commit is not None:
+            self.after_commit(rows)
+        return len(rows)
+
+    async def run_once(self):
+        started = time.perf_counter()
+        rows = 0
+        first = True
+        while True:
+            batch = await self._run_batch(claim=first)
+            if batch is None:
+                if first:
+                    self.skipped += 1
+                    return None
+                break
+            first = False
+            rows += batch
+            if self.batch_size is None or batch < self.batch_size:
+                break
+        self.runs += 1
+        self.last_rows = rows
+        self.rows_total += rows
+        self.last_duration = time.perf_counter() - started
+        self.last_run_at = datetime.utcnow()
+        return rows
+
+    async def _loop(self):
+        while True:
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self.failures += 1
+                logger.exception("Scheduled job %s failed", self.name)
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def stats(self):
+        return {
+            "runs": self.runs,
+            "skipped": self.skipped,
+            "failures": self.failures,
+            "rows_total": self.rows_total,
+            "last_rows": self.last_rows,
+            "last_duration_seconds": round(self.last_duration, 6),
+            "last_run_at": self.last_run_at,
+            "interval": self.interval,
+            "batch_size": self.batch_size,
+        }
+
+
+class Scheduler:
+    def __init__(self):
+        self.jobs = {}
+
+    def add(self, job: PeriodicJob):
+        self.jobs[job.name] = job
+
+    async def _install(self):
+        # Таблица создаётся при старте, в том числе в уже существующей базе, как журнал изменений
+        try:
+            async with engine.begin() as conn:
+                await conn.run_sync(scheduled_jobs.create, checkfirst=True)
+        except Exception as e:
+            logger.warning("Scheduled jobs table check failed: %s", e)
+
+    async def start(self):
+        await self._install()
+        for job in self.jobs.values():
+            job.start()
+
+    async def stop(self):
+        await asyncio.gather(*(job.stop() for job in self.jobs.values()))
+
+
+scheduler = Scheduler()
@@ -0,0 +1,141 @@
+import time
+from contextvars import ContextVar
+
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from sqlalchemy import event
+from starlette.routing import Match
+
+from app.audit import audit_trail
+from app.cache import hierarchy_cache, user_cache
+from app.database import engine
+from app.events import event_bus
+from app.metrics import HistogramFamily, render_histogram, render_metric
+from app.pool import pool_stats
+from app.scheduler import scheduler
+
+request_latency = HistogramFamily(
+    "http_request_duration_seconds", "HTTP request latency by route template", ("method", "route", "status")
+)
+query_latency = HistogramFamily(
+    "db_query_duration_seconds", "SQL statement latency by issuing route", ("route", "operation")
+)
+
+# Шаблон маршрута текущего запроса; по нему SQL-запросы привязываются к обработчику
+current_route = ContextVar("current_route", default="-")
+
+
+def _route_template(scope) -> str:
+    # Метка — шаблон пути ("/management/rooms/rooms/{room_id}"), а не сам путь,
+    # иначе число рядов метрик росло бы с каждым новым id
+    app = scope.get("app")
+    if app is None:
+        return "unmatched"
+    partial = None
+    for route in app.router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+        if match == Match.PARTIAL and partial is None:
+            partial = route.path
+    return partial or "unmatched"
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        route = _route_template(scope)
+        token = current_route.set(route)
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            request_latency.labels(scope["method"], route, str(status_code)).observe(time.perf_counter() - started)
+            current_route.reset(token)
+
+
+def _operation(statement: str) -> str:
+    parts = statement.lstrip().split(None, 1)
+    return parts[0].upper() if parts else "-"
+
+
+@event.listens_for(engine.sync_engine, "before_cursor_execute")
+def _start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+@event.listens_for(engine.sync_engine, "after_cursor_execute")
+def _stop_query_timer(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_started"].pop()
+    query_latency.labels(current_route.get(), _operation(statement)).observe(time.perf_counter() - started)
+
+
+@event.listens_for(engine.sync_engine, "handle_error")
+def _drop_query_timer(exception_context):
+    connection = exception_context.connection
+    if connection is not None and connection.info.get("query_started"):
+        started = connection.info["query_started"].pop()
+        statement = exception_context.statement or ""
+        query_latency.labels(current_route.get(), _operation(statement)).observe(time.perf_counter() - started)
+
+
+router = APIRouter(tags=["Metrics"])
+
+
+# Метрики в текстовом формате Prometheus
+@router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    lines = request_latency.render() + query_latency.render()
+
+    pool = pool_stats.snapshot()
+    if pool is not None:
+        lines += render_metric("db_pool_size", "Configured pool size", "gauge", [({}, pool["size"])])
+        lines += render_metric("db_pool_checked_out", "Connections in use", "gauge", [({}, pool["checked_out"])])
+        lines += render_metric("db_pool_overflow", "Connections above pool size", "gauge", [({}, pool["overflow"])])
+        lines += render_metric("db_pool_overflow_events_total", "Connections opened above pool size", "counter",
+                               [({}, pool["overflow_events"])])
+        lines += render_metric("db_pool_timeouts_total", "Pool checkout timeouts", "counter", [({}, pool["timeouts"])])
+        lines += ["# HELP db_pool_wait_seconds Time spent waiting for a pooled connection",
+                  "# TYPE db_pool_wait_seconds histogram"]
+        lines += render_histogram("db_pool_wait_seconds", {}, pool_stats.wait_time)
+
+    caches = {"hierarchy": hierarchy_cache, "users": user_cache}
+    lines += render_metric("cache_hits_total", "Cache hits", "counter",
+                           [({"cache": name}, cache.hits) for name, cache in caches.items()])
+    lines += render_metric("cache_misses_total", "Cache misses", "counter",
+                           [({"cache": name}, cache.misses) for name, cache in caches.items()])
+    jobs = {name: vars(job) for name, job in scheduler.jobs.items()}
+    for name, key, metric_type, documentation in (
+        ("scheduler_job_runs_total", "runs", "counter", "Completed scheduled job runs"),
+        ("scheduler_job_skipped_total", "skipped", "counter", "Runs skipped: job locked or already run this interval"),
+        ("scheduler_job_failures_total", "failures", "counter", "Failed scheduled job runs"),
+        ("scheduler_job_rows_total", "rows_total", "counter", "Rows processed by scheduled jobs"),
+        ("scheduler_job_last_rows", "last_rows", "gauge", "Rows processed by the last run"),
+        ("scheduler_job_last_duration_seconds", "last_duration", "gauge", "Duration of the last run"),
+    ):
+        lines += render_metric(name, documentation, metric_type,
+                               [({"job": job}, stats[key]) for job, stats in jobs.items()])
+    lines += render_metric("audit_pending", "Audit entries waiting to be written", "gauge",
+                           [({}, audit_trail.pending)])
+    lines += render_metric("audit_written_total", "Audit entries written", "counter", [({}, audit_trail.written)])
+    lines += render_metric("audit_dropped_total", "Audit entries dropped because the queue was full", "counter",
+                           [({}, audit_trail.dropped)])
+    lines += render_metric("audit_failed_total", "Audit entries lost in failed writes", "counter",
+                           [({}, audit_trail.failed)])
+    lines += render_metric("events_subscribers", "Open event stream connections", "gauge",
+                           [({}, event_bus.subscribers)])
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,48 @@
+# Пропускная способность формирования документов о заселении под конкурентной нагрузкой.
+# Запуск из корня проекта: python -m benchmarks.bench_documents --concurrency 32 --renders 500
+import argparse
+import asyncio
+import time
+from datetime import date
+
+from app.room.documents import get_executor, render, render_check_in
+
+SAMPLE = {
+    "full_name": "Иванов Иван Иванович",
+    "date_of_check_in": date(2024, 9, 1),
+    "date_of_check_out": date(2025, 6, 30),
+    "room_number": 412,
+    "block_name": "4Б",
+    "floor_number": 4,
+}
+
+
+async def run(concurrency: int, renders: int):
+    # Прогрев: запуск рабочих процессов и сборка шаблона не должны попадать в замер
+    await asyncio.gather(*(render(render_check_in, SAMPLE) for _ in range(concurrency)))
+
+    queue = asyncio.Queue()
+    for _ in range(renders):
+        queue.put_nowait(SAMPLE)
+
+    async def client():
+        while not queue.empty():
+            await render(render_check_in, queue.get_nowait())
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    print(f"{renders} renders, concurrency {concurrency}: {elapsed:.2f}s, {renders / elapsed:.1f} renders/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк формирования документов .docx")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--renders", type=int, default=500)
+    args = parser.parse_args()
+    asyncio.run(run(args.concurrency, args.renders))
+    get_executor().shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+# Стоимость сериализации ответа со списком жителей: стандартный путь FastAPI (jsonable_encoder + json),
+# проверка по response_model + jsonable_encoder + RowJSONResponse (обычные маршруты) и orjson напрямую
+# по строкам результата, как в list_response больших списков и в потоковой выдаче NDJSON.
+# Запуск из корня проекта: python -m benchmarks.bench_serialization --rows 10000 --repeat 20
+import argparse
+import json
+import random
+import time
+from typing import List
+from datetime import date, timedelta
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import Column, Date, Integer, MetaData, String, Table, create_engine, insert, select
+
+from app.residents.schemas import ResidentRead
+from app.responses import Envelope, RowJSONResponse, list_response
+
+metadata = MetaData()
+
+# Те же колонки, что у app.residents.models.residents, но без внешних ключей и триггеров PostgreSQL
+residents = Table(
+    "residents",
+    metadata,
+    Column("id", Integer, primary_key=True),
+    Column("user_id", Integer),
+    Column("full_name", String),
+    Column("gender", String),
+    Column("citizenship", String),
+    Column("role", String),
+    Column("faculty", String),
+    Column("group_number", String),
+    Column("date_of_check_in", Date),
+    Column("date_of_check_out", Date),
+    Column("room_id", Integer),
+    Column("email", String),
+    Column("status", String),
+)
+
+
+def load_rows(count: int):
+    rng = random.Random(42)
+    engine = create_engine("sqlite://")
+    metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(residents), [{
+            "id": resident_id, "user_id": None, "full_name": f"Житель {resident_id}",
+            "gender": rng.choice(["М", "Ж"]), "citizenship": "Россия", "role": "студент",
+            "faculty": "ИВТ", "group_number": f"ИВТ-{rng.randint(1, 40)}",
+            "date_of_check_in": date(2024, 9, 1) + timedelta(days=rng.randint(0, 30)),
+            "date_of_check_out": None, "room_id": rng.randint(1, 240),
+            "email": f"resident{resident_id}@example.com", "status": "проживает",
+        } for resident_id in range(1, count + 1)])
+    with engine.connect() as conn:
+        return conn.execute(select(residents).order_by(residents.c.id)).mappings().all()
+
+
+def encode_before(rows):
+    # Прежний путь: словарь на каждую строку, jsonable_encoder по всему ответу, затем json.dumps
+    content = {"status": "success", "data": [dict(row) for row in rows], "details": None}
+    return json.dumps(jsonable_encoder(content), ensure_ascii=False).encode("utf-8")
+
+
+def encode_validated(rows):
+    # Как FastAPI с response_model=Envelope[List[ResidentRead]] и default_response_class=RowJSONResponse
+    content = Envelope[List[ResidentRead]].parse_obj({"status": "success", "data": rows, "details": None})
+    return RowJSONResponse(jsonable_encoder(content)).body
+
+
+def encode_after(rows):
+    return list_response(rows).body
+
+
+def measure(encode, rows, repeat: int):
+    encode(rows)
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        encode(rows)
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    return timings[len(timings) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сериализация ответа со списком строк")
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    rows = load_rows(args.rows)
+    expected = json.loads(encode_before(rows))
+    assert expected["data"] == json.loads(encode_after(rows))["data"]
+    assert expected["data"] == json.loads(encode_validated(rows))["data"]
+    assert json.loads(encode_validated(rows)) == json.loads(encode_after(rows))
+
+    before = measure(encode_before, rows, args.repeat)
+    validated = measure(encode_validated, rows, args.repeat)
+    after = measure(encode_after, rows, args.repeat)
+    per_10k = 10000 / args.rows * 1000
+    print(f"{args.rows} rows, median of {args.repeat} runs")
+    print(f"jsonable_encoder + json: {before * per_10k:8.2f} ms per 10k rows")
+    print(f"response_model + orjson: {validated * per_10k:8.2f} ms per 10k rows  ({before / validated:.1f}x)")
+    print(f"orjson list_response:    {after * per_10k:8.2f} ms per 10k rows  ({before / after:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+# Проверка ограничения room_bookings_no_overlap под конкуренцией: N одновременных бронирований
+# одного и того же слота должны дать ровно один ответ 201 и N-1 ответов 409.
+# Запуск на данных benchmarks/seed.py при запущенном приложении:
+# python -m benchmarks.booking_race --base-url http://127.0.0.1:8000 --requests 300 --rounds 5
+import argparse
+import asyncio
+import json
+import random
+import sys
+from collections import Counter
+from datetime import datetime, timedelta
+
+import httpx
+
+from benchmarks.seed import MANIFEST_PATH
+
+
+async def race(client: httpx.AsyncClient, room_id: int, start: datetime, requests: int):
+    body = {"room_id": room_id, "user_id": 1, "start_time": start.isoformat(),
+            "end_time": (start + timedelta(minutes=30)).isoformat()}
+    # Все запросы стартуют одновременно и пересекаются друг с другом
+    gate = asyncio.Event()
+
+    async def attempt():
+        await gate.wait()
+        return await client.post("/bookings/", json=body)
+
+    tasks = [asyncio.create_task(attempt()) for _ in range(requests)]
+    gate.set()
+    responses = await asyncio.gather(*tasks)
+    statuses = Counter(response.status_code for response in responses)
+
+    # Выигравшее бронирование удаляется, чтобы повторный запуск начинался с чистого слота
+    for response in responses:
+        if response.status_code == 201:
+            await client.delete(f"/bookings/{response.json()['data']['id']}")
+    return statuses
+
+
+async def run(args):
+    with open(MANIFEST_PATH, encoding="utf-8") as f:
+        dataset = json.load(f)
+    rng = random.Random(args.seed)
+    limits = httpx.Limits(max_connections=args.requests, max_keepalive_connections=args.requests)
+    failed = 0
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=60) as client:
+        for round_number in range(1, args.rounds + 1):
+            room_id = rng.randint(1, max(dataset["public_rooms"], 1))
+            # Слот далеко в будущем, чтобы не пересекаться с загруженными бронированиями
+            start = datetime(2031, 1, 1) + timedelta(minutes=rng.randint(0, 10 ** 6) * 30)
+            statuses = await race(client, room_id, start, args.requests)
+            ok = statuses == Counter({201: 1, 409: args.requests - 1})
+            failed += not ok
+            print(f"round {round_number}: room {room_id} {start.isoformat()} -> "
+                  f"{dict(sorted(statuses.items()))} {'ok' if ok else 'FAILED'}")
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Одновременные бронирования одного слота")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--requests", type=int, default=300, help="Одновременных запросов в раунде")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    failed = asyncio.run(run(args))
+    if failed:
+        print(f"{failed} of {args.rounds} round(s) did not produce exactly one booking")
+        sys.exit(1)
+    print(f"All {args.rounds} round(s) produced exactly one 201 and {args.requests - 1} x 409")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+# Нагрузочный прогон всех роутеров приложения по данным benchmarks/seed.py.
+# Запуск: python -m benchmarks.load --base-url http://127.0.0.1:8000 --duration 30 --concurrency 32
+# Сравнение с прошлым прогоном: python -m benchmarks.load --compare benchmarks/results/<файл>.json
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import time
+from datetime import datetime, timedelta
+
+import httpx
+
+from benchmarks.seed import MANIFEST_PATH
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+
+def scenarios(dataset):
+    # (имя, метод, функция построения пути и тела, вес) — по нескольку запросов на каждый роутер из app/main.py
+    floors, blocks, rooms = dataset["floors"], dataset["blocks"], dataset["rooms"]
+    residents, bookings = dataset["residents"], dataset["bookings"]
+    public_rooms, comments = dataset["public_rooms"], dataset["comments"]
+    housed = dataset["housed_residents"]
+
+    def pick(rng, count):
+        return rng.randint(1, max(count, 1))
+
+    def booking_body(rng):
+        # Слот далеко в будущем, чтобы не пересекаться с загруженными бронированиями
+        start = datetime(2030, 1, 1) + timedelta(minutes=rng.randint(0, 10 ** 6) * 15)
+        return {"room_id": pick(rng, public_rooms), "user_id": 1,
+                "start_time": start.isoformat(), "end_time": (start + timedelta(minutes=10)).isoformat()}
+
+    return [
+        ("floors.list", "GET", lambda rng: ("/management/floors/floors/", None), 5),
+        ("floors.tree", "GET", lambda rng: ("/management/floors/tree", None), 3),
+        ("floors.blocks", "GET", lambda rng: (f"/management/floors/floors/{pick(rng, floors)}/blocks/", None), 3),
+        ("floors.get", "GET", lambda rng: (f"/management/floors/floors/{pick(rng, floors)}", None), 1),
+        ("blocks.list", "GET", lambda rng: ("/management/blocks/blocks/", None), 3),
+        ("blocks.rooms", "GET", lambda rng: (f"/management/blocks/blocks/{pick(rng, blocks)}/rooms/", None), 3),
+        ("blocks.get", "GET", lambda rng: (f"/management/blocks/blocks/{pick(rng, blocks)}", None), 1),
+        ("rooms.list", "GET", lambda rng: ("/management/rooms/rooms/", None), 3),
+        ("rooms.page", "GET", lambda rng: ("/management/rooms/rooms/?limit=50", None), 3),
+        ("rooms.get", "GET", lambda rng: (f"/management/rooms/rooms/{pick(rng, rooms)}", None), 2),
+        ("management.summary", "GET", lambda rng: ("/management/summary/all/", None), 3),
+        ("management.available", "GET", lambda rng: ("/management/available_rooms/", None), 2),
+        ("management.room_residents", "GET",
+         lambda rng: (f"/management/rooms/{pick(rng, rooms)}/residents", None), 2),
+        ("management.occupancy_on", "GET",
+         lambda rng: (f"/management/occupancy/on?on=2024-09-15&block_id={pick(rng, blocks)}", None), 1),
+        ("management.check_in_document", "GET",
+         lambda rng: (f"/management/residents/{pick(rng, housed)}/check-in-document", None), 1),
+        ("residents.page", "GET", lambda rng: ("/management/residents/residents/?limit=100", None), 3),
+        ("residents.filtered", "GET",
+         lambda rng: ("/management/residents/residents/?limit=100&status=проживает&faculty=ИВТ", None), 2),
+        ("residents.search", "GET",
+         lambda rng: (f"/management/residents/residents/search?q=житель {pick(rng, residents)}", None), 2),
+        ("residents.no_room", "GET", lambda rng: ("/management/residents/residents/no-room", None), 1),
+        ("residents.history", "GET",
+         lambda rng: (f"/management/residents/residents/{pick(rng, residents)}/history", None), 1),
+        ("residents.get", "GET", lambda rng: (f"/management/residents/residents/{pick(rng, residents)}", None), 3),
+        ("comments.page", "GET", lambda rng: ("/comments/?limit=100", None), 2),
+        ("comments.room", "GET", lambda rng: (f"/comments/room/{pick(rng, rooms)}", None), 2),
+        ("comments.get", "GET", lambda rng: (f"/comments/{pick(rng, comments)}", None), 1),
+        ("public_rooms.list", "GET", lambda rng: ("/management/public-rooms/", None), 2),
+        ("public_rooms.types", "GET", lambda rng: ("/management/public-rooms/room_types/", None), 1),
+        ("public_rooms.get", "GET", lambda rng: (f"/management/public-rooms/{pick(rng, public_rooms)}", None), 1),
+        ("bookings.page", "GET", lambda rng: ("/bookings/?limit=100", None), 2),
+        ("bookings.room", "GET", lambda rng: (f"/bookings/room/{pick(rng, public_rooms)}", None), 1),
+        ("bookings.calendar", "GET",
+         lambda rng: ("/bookings/calendar?start=2024-09-02T00:00:00&end=2024-09-09T00:00:00", None), 1),
+        ("bookings.utilization", "GET",
+         lambda rng: ("/bookings/utilization?start=2024-09-01T00:00:00&end=2024-10-01T00:00:00&bucket=day", None), 1),
+        ("bookings.get", "GET", lambda rng: (f"/bookings/{pick(rng, bookings)}", None), 1),
+        ("ratings.page", "GET", lambda rng: ("/management/ratings/ratings/?limit=100", None), 2),
+        ("ratings.get", "GET", lambda rng: (f"/management/ratings/ratings/{pick(rng, residents)}", None), 2),
+        ("ratings.leaderboard", "GET", lambda rng: ("/management/ratings/leaderboard/?limit=50", None), 2),
+        ("ratings.increase", "PATCH",
+         lambda rng: (f"/management/ratings/ratings/{pick(rng, residents)}/increase_achievement/small", None), 1),
+        ("bookings.create", "POST", lambda rng: ("/bookings/", booking_body(rng)), 1),
+        ("comments.create", "POST",
+         lambda rng: ("/comments/", {"room_id": pick(rng, rooms), "text": "benchmark"}), 1),
+        ("users.me", "GET", lambda rng: ("/users/me", None), 1),
+    ]
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+async def run(args):
+    with open(MANIFEST_PATH, encoding="utf-8") as f:
+        dataset = json.load(f)
+    plan = [scenario for scenario in scenarios(dataset) if args.writes or scenario[1] == "GET"]
+    if args.only:
+        plan = [scenario for scenario in plan if scenario[0].startswith(tuple(args.only))]
+    weights = [scenario[3] for scenario in plan]
+    latencies = {scenario[0]: [] for scenario in plan}
+    errors = {scenario[0]: 0 for scenario in plan}
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=30) as client:
+        response = await client.post("/auth/jwt/login",
+                                     data={"username": dataset["email"], "password": dataset["password"]})
+        response.raise_for_status()
+
+        deadline = time.perf_counter() + args.warmup + args.duration
+        measure_from = time.perf_counter() + args.warmup
+
+        async def worker(worker_id):
+            rng = random.Random(args.seed + worker_id)
+            while True:
+                started = time.perf_counter()
+                if started >= deadline:
+                    return
+                name, method, build, _ = rng.choices(plan, weights=weights)[0]
+                path, body = build(rng)
+                try:
+                    response = await client.request(method, path, json=body)
+                    failed = response.status_code >= 500
+                except httpx.HTTPError:
+                    failed = True
+                if started >= measure_from:
+                    latencies[name].append(time.perf_counter() - started)
+                    errors[name] += failed
+
+        await asyncio.gather(*(worker(worker_id) for worker_id in range(args.concurrency)))
+
+    endpoints = {}
+    for name, values in latencies.items():
+        values.sort()
+        endpoints[name] = {
+            "requests": len(values),
+            "errors": errors[name],
+            "throughput_rps": round(len(values) / args.duration, 2),
+            "p50_ms": round(percentile(values, 0.50) * 1000, 2) if values else None,
+            "p95_ms": round(percentile(values, 0.95) * 1000, 2) if values else None,
+            "p99_ms": round(percentile(values, 0.99) * 1000, 2) if values else None,
+        }
+    total = sum(endpoint["requests"] for endpoint in endpoints.values())
+    return {
+        "commit": _git_commit(),
+        "started_at": datetime.utcnow().isoformat(),
+        "base_url": args.base_url,
+        "duration_seconds": args.duration,
+        "concurrency": args.concurrency,
+        "dataset": {key: value for key, value in dataset.items() if key != "password"},
+        "total_requests": total,
+        "throughput_rps": round(total / args.duration, 2),
+        "endpoints": endpoints,
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(report, baseline=None):
+    print(f"commit {report['commit']}: {report['total_requests']} requests, {report['throughput_rps']} req/s")
+    print(f"{'endpoint':34} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}  {'Δp95':>8}")
+    for name, endpoint in sorted(report["endpoints"].items()):
+        delta = ""
+        previous = (baseline or {}).get("endpoints", {}).get(name)
+        if previous and previous.get("p95_ms") and endpoint["p95_ms"]:
+            delta = f"{(endpoint['p95_ms'] / previous['p95_ms'] - 1) * 100:+.1f}%"
+        print(f"{name:34} {endpoint['throughput_rps']:>9} {str(endpoint['p50_ms']):>9} "
+              f"{str(endpoint['p95_ms']):>9} {str(endpoint['p99_ms']):>9} {endpoint['errors']:>7}  {delta:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный прогон API общежития")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--duration", type=float, default=30, help="Длительность замера, секунды")
+    parser.add_argument("--warmup", type=float, default=5, help="Прогрев без замера, секунды")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--writes", action="store_true", help="Включить запросы на запись")
+    parser.add_argument("--only", nargs="*", help="Префиксы имён сценариев, например rooms residents")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Файл результата (по умолчанию benchmarks/results/<время>-<коммит>.json)")
+    parser.add_argument("--compare", help="Прошлый результат для сравнения p95")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{datetime.utcnow():%Y%m%d-%H%M%S}-{report['commit'] or 'unknown'}.json"
+    )
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+    print(f"Saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+# Наполнение локальной БД синтетическим общежитием через COPY.
+# Запуск из корня проекта: python -m benchmarks.seed --floors 10 --blocks 6 --rooms 4 --residents 2000 --reset
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+from datetime import date, datetime, timedelta
+
+import asyncpg
+from fastapi_users.password import PasswordHelper
+from sqlalchemy.ext.asyncio import create_async_engine
+
+# Импорт моделей регистрирует все таблицы в metadata
+import app.auth.models  # noqa: F401
+import app.comments.models  # noqa: F401
+import app.commonRooms.models  # noqa: F401
+import app.ratings.models  # noqa: F401
+import app.residents.models  # noqa: F401
+import app.room.models  # noqa: F401
+from app.config import DB_HOST, DB_NAME, DB_PASS, DB_PORT, DB_USER
+from app.database import DATABASE_URL, metadata
+
+MANIFEST_PATH = os.path.join(os.path.dirname(__file__), "dataset.json")
+BENCH_EMAIL = "bench@example.com"
+BENCH_PASSWORD = "bench-password"
+
+TABLES = ["comments", "room_bookings", "residents_ratings", "residency_history", "residents", "public_rooms",
+          "room_types", "rooms", "blocks", "floors", '"user"', "role"]
+FACULTIES = ["ИВТ", "Экономика", "Юриспруденция", "Филология", "Физика", "Химия", "Медицина"]
+CITIZENSHIPS = ["Россия", "Казахстан", "Беларусь", "Узбекистан", "Китай"]
+STATUSES = ["проживает", "выселен", "в академическом отпуске"]
+ROOM_TYPES = [("Спортзал", "Тренажёры"), ("Учебная комната", "Столы и доска"), ("Прачечная", None), ("Кухня", None)]
+
+
+async def create_schema():
+    engine = create_async_engine(DATABASE_URL)
+    async with engine.begin() as conn:
+        await conn.run_sync(metadata.create_all)
+    await engine.dispose()
+
+
+async def seed(args):
+    rng = random.Random(args.seed)
+    started = time.perf_counter()
+    await create_schema()
+    conn = await asyncpg.connect(user=DB_USER, password=DB_PASS, host=DB_HOST, port=DB_PORT, database=DB_NAME)
+    try:
+        async with conn.transaction():
+            if args.reset:
+                await conn.execute(f"TRUNCATE {', '.join(TABLES)} RESTART IDENTITY CASCADE")
+
+            await conn.copy_records_to_table("role", records=[(1, "admin", None), (2, "user", None)],
+                                             columns=["id", "name", "permissions"])
+            await conn.copy_records_to_table("user", records=[(
+                1, BENCH_EMAIL, "bench", datetime.utcnow(), 1, PasswordHelper().hash(BENCH_PASSWORD),
+                True, True, True,
+            )], columns=["id", "email", "username", "registered_at", "role_id", "hashed_password",
+                         "is_active", "is_superuser", "is_verified"])
+
+            floors = [(floor_id, floor_id) for floor_id in range(1, args.floors + 1)]
+            blocks = []
+            rooms = []
+            for floor_id, floor_number in floors:
+                for index in range(args.blocks):
+                    block_id = len(blocks) + 1
+                    blocks.append((block_id, floor_id, f"{floor_number}{chr(ord('А') + index)}"))
+                    for room_index in range(args.rooms):
+                        room_number = floor_number * 100 + index * args.rooms + room_index + 1
+                        rooms.append((len(rooms) + 1, block_id, room_number, args.capacity, 0))
+            await conn.copy_records_to_table("floors", records=floors, columns=["id", "floor_number"])
+            await conn.copy_records_to_table("blocks", records=blocks, columns=["id", "floor_id", "block_name"])
+            await conn.copy_records_to_table("rooms", records=rooms,
+                                             columns=["id", "block_id", "room_number", "max_capacity",
+                                                      "current_occupancy"])
+
+            room_types = [(index + 1, name, description) for index, (name, description) in enumerate(ROOM_TYPES)]
+            public_rooms = []
+            for floor_id, floor_number in floors:
+                for type_id, name, _ in room_types[:2]:
+                    public_rooms.append((len(public_rooms) + 1, type_id, f"{name} {floor_number}", floor_id, None,
+                                         None, 10))
+            await conn.copy_records_to_table("room_types", records=room_types,
+                                             columns=["id", "type_name", "description"])
+            await conn.copy_records_to_table("public_rooms", records=public_rooms,
+                                             columns=["id", "type_id", "room_name", "floor_id", "block_id",
+                                                      "description", "capacity"])
+
+            # Жители заполняют комнаты по порядку, остаток остаётся без комнаты
+            beds = [room[0] for room in rooms for _ in range(args.capacity)]
+            residents = []
+            ratings = []
+            for resident_id in range(1, args.residents + 1):
+                gender = rng.choice(["М", "Ж"])
+                faculty = rng.choice(FACULTIES)
+                residents.append((
+                    resident_id, None, f"Житель {resident_id}", gender, rng.choice(CITIZENSHIPS), "студент",
+                    faculty, f"{faculty[:3]}-{rng.randint(1, 40)}", date(2024, 9, 1), None,
+                    beds[resident_id - 1] if resident_id <= len(beds) else None,
+                    f"resident{resident_id}@example.com", rng.choice(STATUSES),
+                ))
+                achievement = round(rng.uniform(0, 2), 1)
+                infraction = round(rng.uniform(0, 2), 1)
+                ratings.append((resident_id, resident_id, achievement, infraction,
+                                max(1.0, min(5.0, 3.0 + achievement - infraction))))
+            await conn.copy_records_to_table("residents", records=residents, columns=[
+                "id", "user_id", "full_name", "gender", "citizenship", "role", "faculty", "group_number",
+                "date_of_check_in", "date_of_check_out", "room_id", "email", "status",
+            ])
+            await conn.copy_records_to_table("residents_ratings", records=ratings, columns=[
+                "id", "resident_id", "achievement_score", "infraction_score", "overall_score",
+            ])
+
+            # Бронирования идут подряд часовыми слотами, чтобы не нарушать запрет пересечений
+            bookings = []
+            slot_start = datetime(2024, 9, 1, 8, 0)
+            for booking_id in range(1, args.bookings + 1):
+                public_room_id = (booking_id - 1) % len(public_rooms) + 1
+                slot = (booking_id - 1) // len(public_rooms)
+                start = slot_start + timedelta(hours=slot)
+                bookings.append((booking_id, public_room_id, 1, start, start + timedelta(minutes=50),
+                                 rng.random() < 0.2, start - timedelta(days=1)))
+            await conn.copy_records_to_table("room_bookings", records=bookings, columns=[
+                "id", "room_id", "user_id", "start_time", "end_time", "is_active", "created_at",
+            ])
+
+            comments = [(comment_id, rng.randint(1, len(rooms)), 1, f"Комментарий {comment_id}")
+                        for comment_id in range(1, args.comments + 1)]
+            await conn.copy_records_to_table("comments", records=comments,
+                                             columns=["id", "room_id", "user_id", "text"])
+
+            # Последовательности продолжаются после загруженных явных id
+            for table in TABLES:
+                await conn.execute(
+                    f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+                    f"COALESCE((SELECT max(id) FROM {table}), 0) + 1, false)"
+                )
+    finally:
+        await conn.close()
+
+    manifest = {
+        "floors": len(floors), "blocks": len(blocks), "rooms": len(rooms), "public_rooms": len(public_rooms),
+        "room_types": len(room_types), "residents": len(residents),
+        "housed_residents": min(len(residents), len(beds)), "bookings": len(bookings),
+        "comments": len(comments), "email": BENCH_EMAIL, "password": BENCH_PASSWORD,
+        "seed": args.seed, "generated_at": datetime.utcnow().isoformat(),
+    }
+    with open(MANIFEST_PATH, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    print(f"Seeded {manifest} in {time.perf_counter() - started:.1f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Синтетическое общежитие для нагрузочных тестов")
+    parser.add_argument("--floors", type=int, default=10)
+    parser.add_argument("--blocks", type=int, default=6, help="Блоков на этаже")
+    parser.add_argument("--rooms", type=int, default=4, help="Комнат в блоке")
+    parser.add_argument("--capacity", type=int, default=3, help="Мест в комнате")
+    parser.add_argument("--residents", type=int, default=700)
+    parser.add_argument("--bookings", type=int, default=20000)
+    parser.add_argument("--comments", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--reset", action="store_true", help="Очистить таблицы перед загрузкой")
+    asyncio.run(seed(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()